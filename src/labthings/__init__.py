@@ -5,6 +5,7 @@ from . import extensions, fields, json, marshalling, views
 # Action threads
 from .actions import (
     ActionKilledException,
+    cancel_token,
     current_action,
     update_action_data,
     update_action_progress,
@@ -23,6 +24,9 @@ from .labthing import LabThing
 # Quick-create app+LabThing function
 from .quick import create_app
 
+# Retention limits for Actions and Events
+from .retention import RetentionPolicy
+
 # Schema and field
 from .schema import Schema
 
@@ -48,9 +52,11 @@ __all__ = [
     "CompositeLock",
     "ClientEvent",
     "current_action",
+    "cancel_token",
     "update_action_progress",
     "update_action_data",
     "ActionKilledException",
+    "RetentionPolicy",
     "marshalling",
     "extensions",
     "views",
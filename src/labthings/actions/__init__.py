@@ -5,14 +5,38 @@ __all__ = [
     "ActionKilledException",
 ]
 
-from .pool import Pool, current_action, update_action_data, update_action_progress
-from .thread import ActionKilledException, ActionThread
+from .exceptions import ActionBusy, ActionQueueFull, ActionQueueLimitReached
+from .executor import ActionExecutor
+from .pool import (
+    ConcurrencyPolicy,
+    Pool,
+    cancel_token,
+    current_action,
+    update_action_data,
+    update_action_progress,
+)
+from .record import ActionRecord
+from .results import ResultStore, StoredResult
+from .scheduler import Schedule, Scheduler
+from .thread import ActionKilledException, ActionThread, CancelToken
 
 __all__ = [
     "Pool",
+    "ActionExecutor",
+    "ResultStore",
+    "StoredResult",
+    "Scheduler",
+    "Schedule",
+    "ConcurrencyPolicy",
+    "ActionQueueFull",
+    "ActionBusy",
+    "ActionQueueLimitReached",
     "current_action",
+    "cancel_token",
     "update_action_progress",
     "update_action_data",
     "ActionThread",
+    "ActionRecord",
+    "CancelToken",
     "ActionKilledException",
 ]
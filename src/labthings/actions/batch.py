@@ -0,0 +1,202 @@
+import itertools
+import logging
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from werkzeug.exceptions import HTTPException
+
+from .thread import (
+    ActionKilledException,
+    ActionThread,
+    CancelToken,
+    _current_action_thread,
+    _worker_local,
+)
+
+_LOG = logging.getLogger(__name__)
+
+
+def expand_grid(grid: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a parameter grid into a list of argument dictionaries.
+
+    Every combination of the list values in ``grid`` is returned, in order,
+    with the last parameter varying fastest. Values that are not lists are
+    used unchanged in every combination.
+
+    :param grid: Dictionary of parameter name to list of values
+    :returns: List of argument dictionaries
+
+    """
+    swept = {key: value for key, value in grid.items() if isinstance(value, list)}
+    fixed = {key: value for key, value in grid.items() if key not in swept}
+    return [
+        {**fixed, **dict(zip(swept.keys(), combination))}
+        for combination in itertools.product(*swept.values())
+    ]
+
+
+class BatchItem:
+    """Stands in for the parent ActionThread while one item of a batch runs.
+
+    Progress and data updates from the item are recorded in the item's entry
+    of the parent action's per-item breakdown. Anything else is passed through
+    to the parent action. Outside an action, ``stopping`` is a token that is
+    never cancelled, and anything else raises AttributeError.
+    """
+
+    def __init__(self, batch: "Batch", index: int):
+        self._batch = batch
+        self.index = index
+
+    def update_progress(self, progress: int):
+        """
+        Update the progress of this batch item.
+
+        :param progress: int: Item progress, in percent (0-100)
+
+        """
+        self._batch.update_item(self.index, progress=progress)
+
+    def update_data(self, data: Dict[Any, Any]):
+        """
+        Update the data of this batch item.
+
+        :param data: dict:
+
+        """
+        self._batch.update_item(self.index, data=data)
+
+    @property
+    def stopping(self) -> CancelToken:
+        """CancelToken of the parent action"""
+        return self._batch.stopping
+
+    def __getattr__(self, name: str):
+        if self._batch.parent is None:
+            raise AttributeError(
+                f"Batch item has no attribute '{name}', "
+                "as the batch isn't running in an action"
+            )
+        return getattr(self._batch.parent, name)
+
+
+class Batch:
+    """Runs a function once per item, inside a parent ActionThread.
+
+    The parent action's ``data`` holds a breakdown of every item, keyed by its
+    index, with its ``status``, ``progress``, ``data``, and its ``output`` or
+    ``error`` once finished. Each item's entry is updated separately, so
+    clients can follow the batch with incremental data requests. The parent's
+    progress is the mean progress of all items.
+
+    :param parent: ActionThread the batch runs in. May be None outside actions.
+    :param size: Number of items
+    :param keys: Key of each item in the parent's data. Defaults to the indices.
+
+    """
+
+    def __init__(
+        self,
+        parent: Optional[ActionThread],
+        size: int,
+        keys: Optional[List[str]] = None,
+    ):
+        self.parent: Optional[ActionThread] = parent
+        self.size: int = size
+        self.keys: List[str] = keys or [str(i) for i in range(size)]
+        # Outside an action, nothing can cancel the batch
+        self.stopping: CancelToken = (
+            parent.stopping if parent is not None else CancelToken()
+        )
+        self._items: List[Dict[str, Any]] = [
+            {"status": "pending", "progress": None, "data": {}} for _ in range(size)
+        ]
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent.batch_size = size
+            parent.update_data(
+                {key: dict(item) for key, item in zip(self.keys, self._items)}
+            )
+
+    def status(self, index: int) -> str:
+        """Status of an item
+
+        :param index: Index of the item
+
+        """
+        return self._items[index]["status"]
+
+    def update_item(self, index: int, data: Optional[Dict[Any, Any]] = None, **changes):
+        """Update the entry of an item, and the progress of the parent action
+
+        :param index: Index of the item
+        :param data: Data to merge into the item's data
+        :param **changes: Entry keys to replace
+
+        """
+        with self._lock:
+            # Copy on write, like ActionThread.update_data
+            item = dict(self._items[index], **changes)
+            if data:
+                item["data"] = {**item["data"], **data}
+            self._items[index] = item
+            progress = sum(
+                (
+                    100
+                    if entry["status"] in ("completed", "error", "skipped")
+                    else entry["progress"] or 0
+                )
+                for entry in self._items
+            ) // max(self.size, 1)
+        if self.parent is not None:
+            self.parent.update_data({self.keys[index]: item})
+            self.parent.update_progress(progress)
+
+    def run_item(self, index: int, function: Callable, item: Any, args, kwargs) -> Any:
+        """Run the function for one item, recording its status and output.
+
+        Errors are recorded against the item, and don't stop the batch.
+        Cancelling the parent action does.
+
+        """
+        self.update_item(index, status="running")
+        previous = getattr(_worker_local, "action", None)
+        _worker_local.action = BatchItem(self, index)
+        try:
+            output = function(*args, item, **kwargs)
+        except (ActionKilledException, SystemExit):
+            self.update_item(index, status="cancelled")
+            raise
+        except Exception as e:  # pylint: disable=broad-except
+            if not isinstance(e, HTTPException):
+                _LOG.error(traceback.format_exc())
+            message = e.description if isinstance(e, HTTPException) else str(e)
+            self.update_item(index, status="error", error=message)
+            return None
+        finally:
+            _worker_local.action = previous
+        self.update_item(index, status="completed", progress=100, output=output)
+        return output
+
+
+def run_batch(function: Callable, items: List[Any], *args, **kwargs) -> List[Any]:
+    """Call a function once for each item, collecting the return values.
+
+    Each call is made as ``function(*args, item, **kwargs)``, the same way
+    ``use_args`` passes parsed arguments. Run this as the target of an
+    ActionThread to get a per-item breakdown in the action's data.
+
+    :param function: Function to call
+    :param items: Argument for each call
+    :returns: List of return values, with None for items that failed
+
+    """
+    parent = _current_action_thread()
+    batch = Batch(parent, len(items))
+    outputs = []
+    for index, item in enumerate(items):
+        if parent is not None:
+            parent.stopping.raise_if_cancelled()
+        outputs.append(batch.run_item(index, function, item, args, kwargs))
+    return outputs
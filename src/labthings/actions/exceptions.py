@@ -0,0 +1,50 @@
+from typing import Optional
+
+from werkzeug.exceptions import (
+    Conflict,
+    HTTPException,
+    ServiceUnavailable,
+    TooManyRequests,
+)
+
+
+class _RetryAfterMixin:
+    """Adds a ``Retry-After`` header to an HTTPException"""
+
+    retry_after: int = 1
+
+    def get_headers(self, environ=None):
+        """Get a list of headers, including ``Retry-After``."""
+        return HTTPException.get_headers(self, environ) + [  # type: ignore
+            ("Retry-After", str(self.retry_after))
+        ]
+
+
+class ActionQueueFull(_RetryAfterMixin, ServiceUnavailable):
+    """Raised when an action cannot be queued because the executor queue is full"""
+
+    description = "The action queue is full. Try again later."
+
+    def __init__(self, description: Optional[str] = None, retry_after: int = 1):
+        ServiceUnavailable.__init__(self, description)
+        self.retry_after = retry_after
+
+
+class ActionBusy(_RetryAfterMixin, Conflict):
+    """Raised when an action is already running as many times as it is allowed to"""
+
+    description = "This action is already running. Try again later."
+
+    def __init__(self, description: Optional[str] = None, retry_after: int = 1):
+        Conflict.__init__(self, description)
+        self.retry_after = retry_after
+
+
+class ActionQueueLimitReached(_RetryAfterMixin, TooManyRequests):
+    """Raised when too many invocations of an action are already waiting to run"""
+
+    description = "Too many requests for this action are waiting. Try again later."
+
+    def __init__(self, description: Optional[str] = None, retry_after: int = 1):
+        TooManyRequests.__init__(self, description)
+        self.retry_after = retry_after
@@ -0,0 +1,245 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, List
+
+from .exceptions import ActionQueueFull
+from .thread import ActionThread, _current_action_thread
+
+_LOG = logging.getLogger(__name__)
+
+
+class ActionPriorityQueue(queue.Queue):
+    """Queue of ActionThreads, ordered by priority with aging.
+
+    Higher ``ActionThread.priority`` values are taken first, and actions of
+    equal priority are taken in the order they were queued. While queued, an
+    action's effective priority grows by ``aging_rate`` per second, so that
+    low priority actions are not starved by a stream of higher priority ones.
+
+    Since every queued action ages at the same rate, the ordering of two
+    queued actions never changes, and a heap keyed on
+    ``aging_rate * time_queued - priority`` gives the correct order.
+
+    ``None`` may be queued as a sentinel, and is always taken last.
+
+    :param maxsize: Maximum queue size. Zero or less means unbounded.
+    :param aging_rate: Priority gained per second spent in the queue
+
+    """
+
+    def __init__(self, maxsize: int = 0, aging_rate: float = 1.0):
+        self.aging_rate: float = aging_rate
+        queue.Queue.__init__(self, maxsize=maxsize)
+
+    # pylint: disable=attribute-defined-outside-init
+    def _init(self, maxsize):
+        self.queue: list = []
+        self._counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        if item is None:
+            key = float("inf")
+        else:
+            key = self.aging_rate * time.monotonic() - item.priority
+        heapq.heappush(self.queue, (key, next(self._counter), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[-1]
+
+    def discard_finished(self):
+        """Drop actions that finished (e.g. were cancelled) while queued"""
+        with self.mutex:
+            self.queue = [
+                entry for entry in self.queue if entry[-1] is None or not entry[-1].dead
+            ]
+            heapq.heapify(self.queue)
+            self.not_full.notify_all()
+
+
+class ActionExecutor:
+    """Runs ActionThreads on a bounded set of reusable worker threads.
+
+    Actions submitted to the executor are held in an :class:`ActionPriorityQueue`
+    with status ``pending`` until a worker is free to run them. Workers are
+    started lazily, up to ``max_workers``, and are reused for subsequent actions.
+
+    :param max_workers: Maximum number of worker threads
+    :param max_queue: Maximum number of actions waiting for a worker.
+        Zero or less means the queue is unbounded.
+    :param aging_rate: Priority gained per second by actions waiting in the
+        queue (Default value = 1.0)
+
+    """
+
+    def __init__(self, max_workers: int, max_queue: int = 0, aging_rate: float = 1.0):
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers: int = max_workers
+        self.max_queue: int = max_queue
+        self._queue: ActionPriorityQueue = ActionPriorityQueue(
+            maxsize=max(max_queue, 0), aging_rate=aging_rate
+        )
+        self._workers: List[threading.Thread] = []
+        self._workers_lock = threading.Lock()
+        self._idle_semaphore = threading.Semaphore(0)
+        self._shutdown: bool = False
+
+    @property
+    def workers(self) -> int:
+        """Number of worker threads currently started"""
+        return len(self._workers)
+
+    @property
+    def pending(self) -> int:
+        """Number of actions waiting for a free worker"""
+        return self._queue.qsize()
+
+    def submit(self, thread: ActionThread):
+        """Queue an ActionThread to be run by a worker
+
+        :param thread: ActionThread to run
+        :raises ActionQueueFull: if the queue already holds ``max_queue`` actions
+
+        """
+        if self._shutdown:
+            raise RuntimeError("Cannot submit actions after executor shutdown")
+        thread._executor_managed = True  # pylint: disable=protected-access
+        try:
+            self._queue.put_nowait(thread)
+        except queue.Full:
+            # Make room taken up by actions cancelled while queued, and retry
+            self._queue.discard_finished()
+            try:
+                self._queue.put_nowait(thread)
+            except queue.Full as e:
+                thread._executor_managed = False  # pylint: disable=protected-access
+                raise ActionQueueFull() from e
+        self._adjust_workers()
+
+    def _adjust_workers(self):
+        # Reuse an idle worker if there is one
+        if self._idle_semaphore.acquire(blocking=False):
+            return
+        with self._workers_lock:
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work,
+                    name=f"ActionWorker-{len(self._workers)}",
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            thread = self._queue.get()
+            if thread is None:
+                # Wake up the next worker, then exit
+                self._queue.put(None)
+                return
+            try:
+                thread._run_in_worker()  # pylint: disable=protected-access
+            except BaseException:  # pylint: disable=broad-except
+                # Never let an action (or a late termination) kill the worker
+                _LOG.error(traceback.format_exc())
+            del thread
+            self._idle_semaphore.release()
+
+    def shutdown(self, wait: bool = True):
+        """Stop all worker threads once the queue has been drained
+
+        :param wait: Block until all workers have exited (Default value = True)
+
+        """
+        self._shutdown = True
+        self._queue.put(None)
+        if wait:
+            for worker in list(self._workers):
+                worker.join()
+
+
+class QueuedCall:
+    """A function call waiting in an ActionExecutor's queue, alongside actions.
+
+    Provides the parts of an ActionThread that the executor uses, and passes
+    the outcome of the call to a Future.
+
+    :param future: Future to set the return value or exception of the call on
+    :param function: Function to call
+    :param args: Positional arguments
+    :param kwargs: Keyword arguments
+    :param priority: Position of the call in the queue
+
+    """
+
+    def __init__(
+        self,
+        future: Future,
+        function: Callable,
+        args: tuple,
+        kwargs: dict,
+        priority: int = 0,
+    ):
+        self.future: Future = future
+        self.function: Callable = function
+        self.args: tuple = args
+        self.kwargs: dict = kwargs
+        self.priority: int = priority
+        self._executor_managed: bool = False
+
+    @property
+    def dead(self) -> bool:
+        """Has the call finished, or been cancelled while queued"""
+        return self.future.done()
+
+    def _run_in_worker(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except BaseException as e:  # pylint: disable=broad-except
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class CallExecutor(Executor):
+    """Runs function calls on the worker threads of an ActionExecutor.
+
+    Calls share the workers and queue of the executor with actions, so they
+    count towards its ``max_workers`` and ``max_queue``. Each call is queued
+    with the priority of the action submitting it.
+
+    :param executor: ActionExecutor to run calls on
+
+    """
+
+    def __init__(self, executor: ActionExecutor):
+        self.executor: ActionExecutor = executor
+
+    def submit(  # pylint: disable=arguments-differ
+        self, fn: Callable, *args, **kwargs
+    ) -> Future:
+        """Queue a function call
+
+        :param fn: Function to call
+        :raises ActionQueueFull: if the executor's queue is full
+        :returns: Future of the call's return value
+
+        """
+        action = _current_action_thread()
+        future: Future = Future()
+        call = QueuedCall(
+            future, fn, args, kwargs, priority=getattr(action, "priority", 0)
+        )
+        self.executor.submit(call)  # type: ignore
+        return future
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine
+
+from .thread import ActionThread
+
+
+class EventLoopThread(threading.Thread):
+    """A daemon thread running a single asyncio event loop.
+
+    Coroutine actions and properties all run on this one loop, so many
+    concurrent I/O-bound operations cost one coroutine each, not one thread.
+    """
+
+    def __init__(self, name: str = "LabThingsEventLoop"):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def start(self):
+        """Start the event loop thread, and wait until the loop is running"""
+        threading.Thread.start(self)
+        self._ready.wait()
+
+    def submit(self, coro: Coroutine) -> "Future[Any]":
+        """Schedule a coroutine on the event loop
+
+        :param coro: Coroutine object to run
+        :returns: A :class:`concurrent.futures.Future` for the coroutine's result
+
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_action(self, thread: ActionThread):
+        """Run a coroutine ActionThread as a Task on the event loop
+
+        :param thread: ActionThread with a coroutine function target
+
+        """
+        # pylint: disable=protected-access
+        self.submit(thread._run_coroutine(self.loop))
+
+    def stop(self, wait: bool = True):
+        """Stop the event loop
+
+        :param wait: Block until the thread has exited (Default value = True)
+
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if wait:
+            self.join()
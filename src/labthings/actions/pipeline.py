@@ -0,0 +1,205 @@
+import threading
+from concurrent.futures import Executor, Future, wait
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set
+
+from flask import current_app, has_app_context
+
+from .batch import Batch
+from .exceptions import ActionQueueFull
+from .thread import _current_action_thread, action_log_dispatcher
+
+
+class PipelineStep:
+    """One step of a pipeline.
+
+    Each step calls ``function`` with its arguments: ``args``, plus an
+    argument for each entry of ``inputs``, taken from the output of an
+    earlier step. ``inputs`` maps argument names to a step name, for the
+    step's whole output, or ``"step.key"`` for one key of it.
+
+    A step runs once every step it depends on has completed. It depends on
+    the steps named in ``after`` and ``inputs``. If ``after`` is None, the step
+    also depends on the step before it, so a plain list of steps runs in order.
+    Steps that depend on the same step, and not on each other, run in parallel.
+
+    :param name: Unique name of the step
+    :param function: Function taking a dictionary of arguments, and returning
+        the step's output
+    :param args: Fixed arguments
+    :param inputs: Arguments taken from the outputs of earlier steps
+    :param after: Names of steps that must complete first
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable[[Dict[str, Any]], Any],
+        args: Optional[Mapping[str, Any]] = None,
+        inputs: Optional[Mapping[str, str]] = None,
+        after: Optional[List[str]] = None,
+    ):
+        self.name: str = name
+        self.function = function
+        self.args: Dict[str, Any] = dict(args or {})
+        self.inputs: Dict[str, str] = dict(inputs or {})
+        self.after: Optional[List[str]] = after
+        self.depends: Set[str] = set(after or [])
+        self.depends.update(source.split(".", 1)[0] for source in self.inputs.values())
+
+    def arguments(self, outputs: Mapping[str, Any]) -> Dict[str, Any]:
+        """Build the arguments of the step from the outputs of earlier steps
+
+        :param outputs: Outputs of completed steps, by name
+        :raises KeyError: if an output doesn't have a key named in ``inputs``
+
+        """
+        arguments = dict(self.args)
+        for argument, source in self.inputs.items():
+            name, _, key = source.partition(".")
+            value = outputs[name]
+            arguments[argument] = value[key] if key else value
+        return arguments
+
+
+def check_pipeline(steps: List[PipelineStep]):
+    """Check that steps form a valid pipeline, filling in implicit dependencies
+
+    :param steps: Steps of the pipeline, in order
+    :raises ValueError: if step names are repeated, a step depends on a step
+        that doesn't exist, or dependencies go round in a cycle
+
+    """
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("Step names must be unique")
+    for previous, step in zip([None] + steps[:-1], steps):
+        if step.after is None and previous is not None:
+            step.depends.add(previous.name)
+        missing = step.depends.difference(names)
+        if missing:
+            unknown = ", ".join(sorted(missing))
+            raise ValueError(f"Step {step.name} depends on unknown steps: {unknown}")
+    # Remove steps with no remaining dependencies until none are left
+    remaining = {step.name: set(step.depends) for step in steps}
+    while remaining:
+        ready = [name for name, depends in remaining.items() if not depends]
+        if not ready:
+            raise ValueError(
+                f"Steps depend on each other in a cycle: {', '.join(sorted(remaining))}"
+            )
+        for name in ready:
+            del remaining[name]
+        for depends in remaining.values():
+            depends.difference_update(ready)
+
+
+def run_pipeline(
+    steps: List[PipelineStep], executor: Executor, app=None
+) -> Dict[str, Any]:
+    """Run the steps of a pipeline, collecting their outputs.
+
+    Run this as the target of an ActionThread to get one action for the whole
+    pipeline. Like a batch, the action's data holds an entry for each step,
+    keyed by name, with the step's ``status``, ``progress``, ``data``, and its
+    ``output`` or ``error``. Steps that depend on a step that didn't complete
+    are ``skipped``. Cancelling the pipeline cancels the steps that haven't
+    started, and waits for running steps to finish. Each step runs on a thread of ``executor``, and its log
+    messages are added to the action's log. Steps that ``executor`` has no
+    room to queue fail.
+
+    :param steps: Checked steps of the pipeline (see :func:`check_pipeline`)
+    :param executor: Executor to run steps on
+    :param app: Flask app, whose context the steps run in. Defaults to the
+        current app, if there is one.
+    :returns: Dictionary of step name to output, for steps that completed
+
+    """
+    parent = _current_action_thread()
+    if app is None and has_app_context():
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+    batch = Batch(parent, len(steps), keys=[step.name for step in steps])
+    index = {step.name: i for i, step in enumerate(steps)}
+    outputs: Dict[str, Any] = {}
+    completed: Set[str] = set()
+    failed: Set[str] = set()
+    waiting = list(steps)
+    running: Dict[Future, PipelineStep] = {}
+    # Set whenever a step finishes, or the pipeline is cancelled
+    wake = threading.Event()
+    if parent is not None:
+        parent.stopping.add_callback(wake.set)
+
+    def run_step(step: PipelineStep) -> Any:
+        """Run one step, in the app context of the pipeline"""
+        try:
+            arguments = step.arguments(outputs)
+        except (KeyError, TypeError) as e:
+            batch.update_item(
+                index[step.name], status="error", error=f"Input not found: {e}"
+            )
+            return None
+        # Capture this worker thread's log messages in the pipeline's log
+        log_dispatcher = action_log_dispatcher()
+        if parent is not None:
+            log_dispatcher.register(parent)
+        try:
+            if app is None:
+                return batch.run_item(
+                    index[step.name], step.function, arguments, (), {}
+                )
+            with app.app_context():
+                return batch.run_item(
+                    index[step.name], step.function, arguments, (), {}
+                )
+        finally:
+            if parent is not None:
+                log_dispatcher.unregister(parent)
+
+    try:
+        while waiting or running:
+            if parent is not None:
+                parent.stopping.raise_if_cancelled()
+            for step in list(waiting):
+                if step.depends & failed:
+                    batch.update_item(index[step.name], status="skipped")
+                    failed.add(step.name)
+                    waiting.remove(step)
+                elif step.depends <= completed:
+                    waiting.remove(step)
+                    try:
+                        future = executor.submit(run_step, step)
+                    except ActionQueueFull as e:
+                        batch.update_item(
+                            index[step.name], status="error", error=e.description
+                        )
+                        failed.add(step.name)
+                        continue
+                    future.add_done_callback(lambda _: wake.set())
+                    running[future] = step
+            if not running:
+                continue
+            wake.wait()
+            # Clear before looking, so steps finishing meanwhile wake us again
+            wake.clear()
+            for future in [future for future in running if future.done()]:
+                step = running.pop(future)
+                output = future.result()
+                if batch.status(index[step.name]) == "completed":
+                    outputs[step.name] = output
+                    completed.add(step.name)
+                else:
+                    failed.add(step.name)
+    except BaseException:
+        # Never leave steps running after the pipeline has ended
+        for step in waiting:
+            batch.update_item(index[step.name], status="cancelled")
+        for future, step in running.items():
+            if future.cancel():
+                batch.update_item(index[step.name], status="cancelled")
+        wait(running)
+        raise
+    finally:
+        if parent is not None:
+            parent.stopping.remove_callback(wake.set)
+    return outputs
@@ -1,16 +1,166 @@
+import datetime
+import itertools
 import logging
 import threading
-from typing import Dict
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ..retention import RetentionPolicy
+from .exceptions import ActionBusy, ActionQueueFull, ActionQueueLimitReached
+from .executor import ActionExecutor, ActionPriorityQueue, CallExecutor
+from .loop import EventLoopThread
+from .process import ProcessExecutor
+from .record import ActionRecord
+from .results import ResultStore, _measure
+from .thread import ActionThread, CancelToken, _current_action_thread
+
+
+class ConcurrencyPolicy:
+    """Limits how many invocations of a single action may run at once.
+
+    :param max_concurrent: Maximum number of invocations running at once
+    :param on_busy: What to do with new invocations while ``max_concurrent``
+        are already running. ``"queue"`` holds them as ``pending`` until a
+        running invocation finishes, ``"reject"`` refuses them with a 409 error.
+    :param queue_limit: Maximum number of queued invocations. Further
+        invocations are refused with a 429 error. None means unbounded.
+    :param retry_after: Value of the ``Retry-After`` header sent with
+        refused invocations, in seconds
 
-from ..deque import Deque
-from .thread import ActionThread
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        on_busy: str = "queue",
+        queue_limit: Optional[int] = None,
+        retry_after: int = 1,
+    ):
+        if max_concurrent <= 0:
+            raise ValueError("max_concurrent must be greater than 0")
+        if on_busy not in ("queue", "reject"):
+            raise ValueError(f"on_busy must be 'queue' or 'reject', not {on_busy!r}")
+        self.max_concurrent: int = max_concurrent
+        self.on_busy: str = on_busy
+        self.queue_limit: Optional[int] = queue_limit
+        self.retry_after: int = retry_after
+
+
+class _ActionSlots:
+    """Running count and queued invocations of one action"""
+
+    def __init__(self, aging_rate: float):
+        self.running: int = 0
+        self.pending: ActionPriorityQueue = ActionPriorityQueue(aging_rate=aging_rate)
+        # Invocations run in their caller's thread, waiting for a slot (see `limited`)
+        self.waiting: int = 0
 
 
 class Pool:
-    """ """
+    """Pool of ActionThreads.
+
+    By default every action is started in a new thread. If ``max_workers`` is
+    given, actions are instead run by a bounded set of reusable worker threads,
+    and actions waiting for a free worker are held as ``pending``.
+
+    :param maxlen: Maximum number of actions to retain (Default value = 100)
+    :param max_workers: Maximum number of worker threads. If None, each action
+        gets its own thread (Default value = None)
+    :param max_queue: Maximum number of actions waiting for a worker. Zero
+        means unbounded. Only used with ``max_workers`` (Default value = 0)
+    :param aging_rate: Priority gained per second by queued actions, so that
+        low priority actions are eventually run (Default value = 1.0)
+    :param process_workers: Maximum number of worker processes used by actions
+        run with :meth:`run_in_process`. Defaults to the number of CPUs.
+    :param result_store: Store that keeps the return values of completed
+        actions, spilling large ones to disk. If None, return values are
+        kept in memory on each ActionThread.
+    :param max_cached: Maximum number of completed actions kept for reuse
+        by identical invocations (see ``spawn``) (Default value = 128)
+    :param retention: Limits on the finished actions kept, applied by
+        :meth:`reap`. If None, finished actions are only dropped beyond ``maxlen``.
+    :param compact: Replace each ActionThread with a compact
+        :class:`labthings.actions.record.ActionRecord` once it finishes,
+        so that the thread can be freed (Default value = False)
 
-    def __init__(self, maxlen: int = 100):
-        self.threads = Deque(maxlen=maxlen)
+    """
+
+    def __init__(
+        self,
+        maxlen: int = 100,
+        max_workers: Optional[int] = None,
+        max_queue: int = 0,
+        aging_rate: float = 1.0,
+        process_workers: Optional[int] = None,
+        result_store: Optional[ResultStore] = None,
+        max_cached: int = 128,
+        retention: Optional[RetentionPolicy] = None,
+        compact: bool = False,
+    ):
+        self.maxlen: int = maxlen
+        self.compact: bool = compact
+        self.retention: Optional[RetentionPolicy] = retention
+        # Approximate memory used by each finished action, found when first reaped
+        self._sizes: Dict[str, int] = {}
+        self.aging_rate: float = aging_rate
+        # Ordered map of action ID to ActionThread, oldest first
+        self._registry: "OrderedDict[str, ActionThread]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Secondary indexes of retained actions, by status and by action name
+        self._by_status: Dict[str, Dict[str, ActionThread]] = {}
+        self._by_action: Dict[str, Dict[str, ActionThread]] = {}
+        self._indexed_status: Dict[str, str] = {}
+        # Position of each retained action, in the order they were added
+        self._positions: Dict[str, int] = {}
+        self._position_counter = itertools.count(1)
+        # Incremented whenever retained actions, or their state, change
+        self._version: int = 0
+        self._instance: str = uuid.uuid4().hex[:8]
+        # Running and queued invocations of actions with a ConcurrencyPolicy
+        self._slots: Dict[str, _ActionSlots] = {}
+        # Notified when a slot is freed and no queued ActionThread takes it
+        self._slot_freed = threading.Condition(self._lock)
+        self.executor: Optional[ActionExecutor] = (
+            ActionExecutor(max_workers, max_queue=max_queue, aging_rate=aging_rate)
+            if max_workers
+            else None
+        )
+        # Worker processes for CPU-bound actions, started on first use
+        self.process_executor: ProcessExecutor = ProcessExecutor(
+            max_workers=process_workers
+        )
+        # Event loop for coroutine actions and properties, started on first use
+        self._event_loop: Optional[EventLoopThread] = None
+        # Runs the steps of pipelines, started on first use
+        self._step_executor: Optional[Executor] = None
+        # Return values of completed actions
+        self.results: Optional[ResultStore] = result_store
+        # Running, and recently completed, actions shared by identical invocations
+        self.max_cached: int = max_cached
+        self._inflight: Dict[Hashable, ActionThread] = {}
+        self._cached: "OrderedDict[Hashable, Tuple[float, ActionThread]]" = (
+            OrderedDict()
+        )
+
+    @property
+    def threads(self) -> List[ActionThread]:
+        """Snapshot list of retained ActionThreads, oldest first"""
+        return self.tasks()
 
     def add(self, thread: ActionThread):
         """
@@ -18,7 +168,176 @@ class Pool:
         :param thread: ActionThread:
 
         """
-        self.threads.append(thread)
+        with self._lock:
+            task_id = str(thread.id)
+            self._registry[task_id] = thread
+            self._index(task_id, thread)
+            # Evict the oldest actions beyond our retention limit
+            while len(self._registry) > self.maxlen:
+                evicted_id, evicted = self._registry.popitem(last=False)
+                self._unindex(evicted_id, evicted)
+                self._discard_output(evicted_id)
+            self._version += 1
+        thread.add_change_callback(self._action_changed)
+        if self.results is not None:
+            thread.add_done_callback(self._store_output)
+        if self.compact:
+            thread.add_done_callback(self._compact)
+
+    @property
+    def version(self) -> str:
+        """Tag that changes whenever retained actions, or their state, change"""
+        return f"{self._instance}-{self._version}"
+
+    def _index(self, task_id: str, thread: ActionThread):
+        """Add an action to the secondary indexes. Must hold the lock."""
+        self._positions[task_id] = next(self._position_counter)
+        self._by_action.setdefault(thread.action, {})[task_id] = thread
+        status = thread.status
+        self._by_status.setdefault(status, {})[task_id] = thread
+        self._indexed_status[task_id] = status
+
+    def _unindex(self, task_id: str, thread: ActionThread):
+        """Remove an action from the secondary indexes. Must hold the lock."""
+        self._positions.pop(task_id, None)
+        by_action = self._by_action.get(thread.action, {})
+        by_action.pop(task_id, None)
+        if not by_action:
+            self._by_action.pop(thread.action, None)
+        status = self._indexed_status.pop(task_id, None)
+        self._by_status.get(status, {}).pop(task_id, None)
+        self._sizes.pop(task_id, None)
+
+    def _remove(self, task_id: str, thread: ActionThread):
+        """Stop retaining an action. Must hold the lock."""
+        del self._registry[task_id]
+        self._unindex(task_id, thread)
+        self._discard_output(task_id)
+        self._version += 1
+
+    def _action_changed(self, thread: ActionThread):
+        """Keep the status index and version up to date as an action changes
+
+        :param thread: ActionThread:
+
+        """
+        with self._lock:
+            task_id = str(thread.id)
+            current = self._registry.get(task_id)
+            if current is None:
+                return
+            if current is not thread:
+                # Already compacted, e.g. marked cancelled after finishing
+                current._status = thread.status  # pylint: disable=protected-access
+                current.progress = thread.progress
+                current.version = thread.version
+                thread = current
+            status = thread.status
+            previous = self._indexed_status.get(task_id)
+            if status != previous:
+                self._by_status.get(previous, {}).pop(task_id, None)
+                self._by_status.setdefault(status, {})[task_id] = thread
+                self._indexed_status[task_id] = status
+            self._version += 1
+
+    def query(
+        self,
+        status: Optional[Iterable[str]] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[ActionThread], Optional[int]]:
+        """Find retained actions, oldest first, using the pool's indexes
+
+        :param status: Only include actions with one of these statuses
+        :param action: Only include actions with this name (endpoint)
+        :param since: Only include actions requested at or after this time
+        :param cursor: Only include actions after this position, as returned
+            by a previous query
+        :param limit: Maximum number of actions to return
+        :returns: Tuple of the matching actions, and the cursor to pass to
+            get the next page, or None if there are no more actions
+
+        """
+        with self._lock:
+            if status is None and action is None:
+                candidates: Dict[str, ActionThread] = self._registry
+            elif status is None:
+                candidates = self._by_action.get(action, {})
+            else:
+                candidates = {}
+                for name in status:
+                    candidates.update(self._by_status.get(name, {}))
+                if action is not None:
+                    by_action = self._by_action.get(action, {})
+                    candidates = {
+                        task_id: thread
+                        for task_id, thread in candidates.items()
+                        if task_id in by_action
+                    }
+            entries = sorted(
+                (
+                    (self._positions[task_id], thread)
+                    for task_id, thread in candidates.items()
+                    if cursor is None or self._positions[task_id] > cursor
+                ),
+                key=lambda entry: entry[0],
+            )
+
+        if since is not None:
+            if since.tzinfo is not None:
+                # Request times are naive local times
+                since = since.astimezone().replace(tzinfo=None)
+            entries = [
+                entry
+                for entry in entries
+                if entry[1]._request_time >= since  # pylint: disable=protected-access
+            ]
+        next_cursor = None
+        if limit is not None and len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1][0] if entries else None
+        return [thread for _, thread in entries], next_cursor
+
+    def _store_output(self, thread: ActionThread):
+        """Move a finished action's return value into the result store
+
+        :param thread: ActionThread:
+
+        """
+        thread._store_output(self.results)  # pylint: disable=protected-access
+        with self._lock:
+            # Don't keep results of actions evicted meanwhile
+            if str(thread.id) not in self._registry:
+                self._discard_output(str(thread.id))
+
+    def _compact(self, thread: ActionThread):
+        """Replace a finished action with a compact ActionRecord
+
+        :param thread: ActionThread:
+
+        """
+        record = ActionRecord(thread)
+        task_id = str(thread.id)
+        with self._lock:
+            if self._registry.get(task_id) is not thread:
+                return
+            self._registry[task_id] = record
+            self._by_action[thread.action][task_id] = record
+            self._by_status[self._indexed_status[task_id]][task_id] = record
+            for share_key, (expires, cached) in self._cached.items():
+                if cached is thread:
+                    self._cached[share_key] = (expires, record)
+
+    def _discard_output(self, task_id: str):
+        """Remove the stored return value of an action no longer retained
+
+        :param task_id: ID of the ActionThread
+
+        """
+        if self.results is not None:
+            self.results.discard(task_id)
 
     def start(self, thread: ActionThread):
         """
@@ -26,38 +345,351 @@ class Pool:
         :param thread: ActionThread:
 
         """
+        self._dispatch(thread)
         self.add(thread)
-        thread.start()
 
-    def spawn(self, action: str, function, *args, http_error_lock=None, **kwargs):
+    def _dispatch(self, thread: ActionThread):
+        """Start an ActionThread, either in its own thread or on a worker
+
+        :param thread: ActionThread:
+
+        """
+        if thread.is_coroutine:
+            self.event_loop.run_action(thread)
+        elif self.executor and thread._pooled:  # pylint: disable=protected-access
+            # Raises ActionQueueFull before the action is recorded
+            self.executor.submit(thread)
+        else:
+            thread.start()
+        thread._deferred = False  # pylint: disable=protected-access
+
+    @property
+    def event_loop(self) -> EventLoopThread:
+        """Event loop thread shared by coroutine actions and properties"""
+        with self._lock:
+            if self._event_loop is None:
+                self._event_loop = EventLoopThread()
+                self._event_loop.start()
+            return self._event_loop
+
+    @property
+    def step_executor(self) -> Executor:
+        """Runs the steps of every pipeline. Steps share the pool's worker
+        threads and queue with actions, if it has any, and otherwise run on
+        threads shared by all pipelines."""
+        with self._lock:
+            if self._step_executor is None:
+                if self.executor:
+                    self._step_executor = CallExecutor(self.executor)
+                else:
+                    self._step_executor = ThreadPoolExecutor(
+                        thread_name_prefix="labthings-step"
+                    )
+            return self._step_executor
+
+    def run_coroutine(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the pool's event loop, and wait for its result
+
+        :param coro: Coroutine object to run
+
+        """
+        return self.event_loop.submit(coro).result()
+
+    def spawn(
+        self,
+        action: str,
+        function,
+        *args,
+        http_error_lock=None,
+        concurrency: Optional[ConcurrencyPolicy] = None,
+        priority: int = 0,
+        share_key: Optional[Hashable] = None,
+        cache_ttl: Optional[float] = None,
+        pooled: bool = True,
+        **kwargs,
+    ):
         """
 
         :param function:
         :param *args:
+        :param concurrency: Limits on concurrent invocations of this action.
+            If the action is busy, this may raise ActionBusy or
+            ActionQueueLimitReached before any thread is created.
+        :param priority: Position of the action in queues. Higher values
+            run first. (Default value = 0)
+        :param share_key: Key identifying identical invocations. If an action
+            spawned with the same key is still running (or cached), that
+            ActionThread is returned instead of starting a new one.
+        :param cache_ttl: Time in seconds to keep reusing the action once it
+            has completed, for invocations with the same ``share_key``
+        :param pooled: Run the action on the pool's worker threads, if it has
+            any. Actions that mostly wait for work queued on the same workers,
+            such as pipelines, should run in a thread of their own instead.
         :param **kwargs:
 
         """
+        if share_key is None:
+            return self._spawn(
+                action,
+                function,
+                *args,
+                http_error_lock=http_error_lock,
+                concurrency=concurrency,
+                priority=priority,
+                pooled=pooled,
+                **kwargs,
+            )
+        # Hold the lock until the new action is registered as in flight,
+        # so that identical invocations arriving meanwhile attach to it
+        with self._lock:
+            shared = self._shared_action(share_key)
+            if shared is not None:
+                return shared
+            thread = self._spawn(
+                action,
+                function,
+                *args,
+                http_error_lock=http_error_lock,
+                concurrency=concurrency,
+                priority=priority,
+                pooled=pooled,
+                **kwargs,
+            )
+            self._inflight[share_key] = thread
+        thread.add_done_callback(
+            lambda finished: self._settle_shared(share_key, finished, cache_ttl)
+        )
+        return thread
+
+    def _spawn(
+        self,
+        action: str,
+        function,
+        *args,
+        http_error_lock=None,
+        concurrency: Optional[ConcurrencyPolicy] = None,
+        priority: int = 0,
+        pooled: bool = True,
+        **kwargs,
+    ) -> ActionThread:
+        """Create and start an ActionThread. See ``spawn``"""
+        if concurrency is not None:
+            self._check_capacity(action, concurrency)
         thread = ActionThread(
             action,
             target=function,
             http_error_lock=http_error_lock,
             args=args,
             kwargs=kwargs,
+            priority=priority,
         )
-        self.start(thread)
+        thread._pooled = pooled  # pylint: disable=protected-access
+        if concurrency is None:
+            self.start(thread)
+        else:
+            self._start_limited(action, thread, concurrency)
         return thread
 
-    def kill(self, timeout: int = 5):
+    def _shared_action(self, share_key: Hashable) -> Optional[ActionThread]:
+        """Find a running or cached action for an invocation. Must be called
+        with the lock held.
+
+        :param share_key: Key identifying identical invocations
+
         """
+        thread = self._inflight.get(share_key)
+        if thread is not None and thread.is_alive():
+            return thread
+        cached = self._cached.get(share_key)
+        if cached is not None:
+            expires, thread = cached
+            # Only reuse actions we still retain
+            retained = self._registry.get(str(thread.id))
+            if retained is not None and time.monotonic() < expires:
+                self._cached.move_to_end(share_key)
+                return retained
+            del self._cached[share_key]
+        return None
 
-        :param timeout:  (Default value = 5)
+    def _settle_shared(
+        self, share_key: Hashable, thread: ActionThread, cache_ttl: Optional[float]
+    ):
+        """Stop sharing a finished action, unless it completed and should be cached
+
+        :param share_key: Key identifying identical invocations
+        :param thread: Finished ActionThread
+        :param cache_ttl: Time in seconds to keep reusing a completed action
+
+        """
+        with self._lock:
+            if self._inflight.get(share_key) is thread:
+                del self._inflight[share_key]
+            if cache_ttl and thread.status == "completed":
+                # Cache the compact record, if the action has been compacted
+                thread = self._registry.get(str(thread.id), thread)
+                self._cached[share_key] = (time.monotonic() + cache_ttl, thread)
+                self._cached.move_to_end(share_key)
+                # Evict the least recently used beyond our size limit
+                while len(self._cached) > self.max_cached:
+                    self._cached.popitem(last=False)
+
+    def _check_capacity(self, action: str, policy: ConcurrencyPolicy):
+        """Refuse an invocation if the action is busy and cannot queue it
+
+        :param action: Action name
+        :param policy: ConcurrencyPolicy for the action
 
         """
-        for thread in self.threads:
-            if thread.is_alive():
-                thread.stop(timeout=timeout)
+        with self._lock:
+            slots = self._slots.setdefault(action, _ActionSlots(self.aging_rate))
+            if slots.running < policy.max_concurrent:
+                return
+            if policy.on_busy == "reject":
+                raise ActionBusy(retry_after=policy.retry_after)
+            slots.pending.discard_finished()
+            if policy.queue_limit is not None and (
+                slots.pending.qsize() + slots.waiting >= policy.queue_limit
+            ):
+                raise ActionQueueLimitReached(retry_after=policy.retry_after)
+
+    def _start_limited(
+        self, action: str, thread: ActionThread, policy: ConcurrencyPolicy
+    ):
+        """Start an ActionThread if its action has a free slot, otherwise queue it
+
+        :param action: Action name
+        :param thread: ActionThread:
+        :param policy: ConcurrencyPolicy for the action
 
-    def tasks(self):
+        """
+        with self._lock:
+            # Check again, in case another request took the slot meanwhile
+            self._check_capacity(action, policy)
+            slots = self._slots[action]
+            run_now = slots.running < policy.max_concurrent
+            if run_now:
+                slots.running += 1
+            else:
+                thread._deferred = True  # pylint: disable=protected-access
+                slots.pending.put_nowait(thread)
+        if run_now:
+            thread.add_done_callback(lambda _: self._release_slot(action))
+            try:
+                self._dispatch(thread)
+            except ActionQueueFull:
+                self._release_slot(action)
+                raise
+        self.add(thread)
+
+    def _release_slot(self, action: str):
+        """Free a running slot of an action, and start its next queued invocation
+
+        :param action: Action name
+
+        """
+        with self._lock:
+            slots = self._slots[action]
+            slots.running -= 1
+            slots.pending.discard_finished()
+            if slots.pending.empty():
+                self._slot_freed.notify_all()
+                return
+            thread = slots.pending.get_nowait()
+            slots.running += 1
+        thread.add_done_callback(lambda _: self._release_slot(action))
+        try:
+            self._dispatch(thread)
+        except ActionQueueFull as e:
+            # We can't block here waiting for space, so give up on the action
+            thread._finish_pending(  # pylint: disable=protected-access
+                "error", exception=e
+            )
+
+    def _wake_slot_waiters(self):
+        with self._lock:
+            self._slot_freed.notify_all()
+
+    @contextmanager
+    def limited(
+        self,
+        action: str,
+        policy: Optional[ConcurrencyPolicy],
+        cancel: Optional[CancelToken] = None,
+    ) -> Iterator[None]:
+        """Hold a running slot of an action while it runs in the calling thread.
+
+        Actions run without being spawned, e.g. as steps of a pipeline, count
+        towards the same ConcurrencyPolicy as spawned invocations. If the
+        action is busy, the caller waits for a free slot, after any queued
+        ActionThreads, or is refused as a spawned invocation would be.
+
+        :param action: Action name
+        :param policy: ConcurrencyPolicy for the action. If None, the action
+            runs straight away.
+        :param cancel: CancelToken that stops waiting for a slot
+        :raises ActionBusy: if the action is busy and the policy rejects
+            invocations
+        :raises ActionQueueLimitReached: if too many invocations are waiting
+        :raises ActionKilledException: if cancelled while waiting
+
+        """
+        if policy is None:
+            yield
+            return
+        with self._lock:
+            self._check_capacity(action, policy)
+            slots = self._slots[action]
+            if slots.running >= policy.max_concurrent:
+                slots.waiting += 1
+                try:
+                    if cancel is not None:
+                        cancel.add_callback(self._wake_slot_waiters)
+                    while slots.running >= policy.max_concurrent:
+                        if cancel is not None:
+                            cancel.raise_if_cancelled()
+                        self._slot_freed.wait()
+                finally:
+                    slots.waiting -= 1
+            slots.running += 1
+        try:
+            yield
+        finally:
+            self._release_slot(action)
+
+    def kill(self, timeout: int = 5):
+        """Stop all running actions, in parallel.
+
+        Every action is asked to stop at once, and given until a single shared
+        deadline to do so. Actions still running after that are terminated.
+
+        :param timeout:  (Default value = 5)
+
+        """
+        deadline = time.monotonic() + timeout
+        alive = [thread for thread in self.tasks() if thread.is_alive()]
+
+        # Signal every action first, so they all wind down together
+        for thread in alive:
+            thread.stopping.set()
+        for thread in alive:
+            # pylint: disable=protected-access
+            if not thread._cancel_pending() and thread.is_coroutine:
+                thread._cancel_task()
+
+        for thread in alive:
+            thread.join(max(deadline - time.monotonic(), 0))
+            if not thread.is_alive():
+                thread._status = "cancelled"  # pylint: disable=protected-access
+
+        # Terminate whatever is left, then wait for all of them together
+        stubborn = [thread for thread in alive if thread.is_alive()]
+        for thread in stubborn:
+            logging.warning("Forcefully terminating thread %s", thread)
+            thread.terminate(wait=False)
+        for thread in stubborn:
+            thread.wait_terminated()
+
+    def tasks(self) -> List[ActionThread]:
         """
 
 
@@ -66,7 +698,8 @@ class Pool:
         :rtype: list
 
         """
-        return list(self.threads)
+        with self._lock:
+            return list(self._registry.values())
 
     def states(self):
         """
@@ -77,7 +710,7 @@ class Pool:
         :rtype: dict
 
         """
-        return {str(t.id): t.state for t in self.threads}
+        return {str(t.id): t.state for t in self.tasks()}
 
     def to_dict(self) -> Dict[str, ActionThread]:
         """
@@ -88,10 +721,19 @@ class Pool:
         :rtype: dict
 
         """
-        return {str(t.id): t for t in self.threads}
+        with self._lock:
+            return dict(self._registry)
 
-    def get(self, task_id: str):
-        return self.to_dict().get(task_id, None)
+    def get(self, task_id: str) -> Optional[ActionThread]:
+        """
+
+        :param task_id: ID of the ActionThread
+
+        :returns: ActionThread with a matching ID, or None
+
+        """
+        with self._lock:
+            return self._registry.get(str(task_id))
 
     def discard_id(self, task_id):
         """
@@ -99,29 +741,117 @@ class Pool:
         :param task_id:
 
         """
-        marked_for_discard = set()
-        for task in self.threads:
-            if (str(task.id) == str(task_id)) and task.dead:
-                marked_for_discard.add(task)
-
-        for thread in marked_for_discard:
-            self.threads.remove(thread)
+        with self._lock:
+            task = self._registry.get(str(task_id))
+            if task is not None and task.dead:
+                self._remove(str(task_id), task)
 
     def cleanup(self):
         """ """
-        marked_for_discard = set()
-        for task in self.threads:
-            if task.dead:
-                marked_for_discard.add(task)
+        with self._lock:
+            for task_id, task in list(self._registry.items()):
+                if task.dead:
+                    self._remove(task_id, task)
+
+    def reap(self, now: Optional[datetime.datetime] = None) -> int:
+        """Drop finished actions beyond the limits of the retention policy
+
+        Running and pending actions are never dropped. Actions are aged from
+        when they finished, and sized by their return value (if held in
+        memory) and log messages. Cached results of actions that are no
+        longer retained, or have expired, are dropped too.
 
-        for thread in marked_for_discard:
-            self.threads.remove(thread)
+        :param now: Time to measure ages from. Defaults to the current time.
+        :returns: Number of actions dropped
+
+        """
+        with self._lock:
+            self._reap_cached()
+            if self.retention is None:
+                return 0
+            finished = [
+                (task_id, thread)
+                for task_id, thread in self._registry.items()
+                if thread.status in ("completed", "error", "cancelled")
+            ]
+        entries = [
+            (
+                task_id,
+                thread._end_time,  # pylint: disable=protected-access
+                self._retained_size(task_id, thread),
+            )
+            for task_id, thread in finished
+        ]
+        doomed = self.retention.select(entries, now=now)
+        with self._lock:
+            for task_id in doomed:
+                thread = self._registry.get(task_id)
+                if thread is not None:
+                    self._remove(task_id, thread)
+        if doomed:
+            logging.debug("Reaped %s finished actions", len(doomed))
+        return len(doomed)
+
+    def _retained_size(self, task_id: str, thread: ActionThread) -> int:
+        """Approximate memory, in bytes, used by a finished action"""
+        size = self._sizes.get(task_id)
+        if size is None:
+            stored = thread.stored_output
+            if stored is not None:
+                size = 0 if stored.spilled else stored.size
+            else:
+                measured = _measure(thread.output)
+                size = measured[0] if measured else 0
+            size += sum(len(record.getMessage()) for record in thread.log)
+            with self._lock:
+                if task_id in self._registry:
+                    self._sizes[task_id] = size
+        return size
+
+    def _reap_cached(self):
+        """Drop shared results that expired, or belong to actions no longer
+        retained. Must be called with the lock held."""
+        now = time.monotonic()
+        for share_key, (expires, thread) in list(self._cached.items()):
+            if now >= expires or str(thread.id) not in self._registry:
+                del self._cached[share_key]
 
     def join(self):
         """ """
-        for thread in self.threads:
+        for thread in self.tasks():
             thread.join()
 
+    def shutdown(self, wait: bool = True):
+        """Stop the pool's worker threads and processes, if any, once queued
+        actions have run
+
+        :param wait:  (Default value = True)
+
+        """
+        if self.executor:
+            self.executor.shutdown(wait=wait)
+        self.process_executor.shutdown(wait=wait)
+        with self._lock:
+            event_loop, self._event_loop = self._event_loop, None
+            step_executor, self._step_executor = self._step_executor, None
+        if event_loop is not None:
+            event_loop.stop(wait=wait)
+        if step_executor is not None:
+            step_executor.shutdown(wait=wait)
+
+    def run_in_process(self, function: Callable, *args, **kwargs) -> Any:
+        """Run a function in a worker process, and wait for its return value.
+
+        Call this from inside an ActionThread, to run CPU-bound work without
+        holding the GIL. See :class:`labthings.actions.process.ProcessExecutor`.
+
+        :param function: Picklable function to run
+        :param *args:
+        :param **kwargs:
+
+        """
+        return self.process_executor.run(function, *args, **kwargs)
+
 
 # Operations on the current task
 
@@ -135,10 +865,27 @@ def current_action():
     :returns: :class:`labthings.actions.ActionThread` -- Currently running ActionThread.
 
     """
-    current_action_thread = threading.current_thread()
-    if not isinstance(current_action_thread, ActionThread):
-        return None
-    return current_action_thread
+    return _current_action_thread()
+
+
+def cancel_token():
+    """Return the CancelToken of the ActionThread in which the caller is running.
+
+    Action code can check the token (``cancel_token().cancelled``), raise
+    if cancelled (``cancel_token().raise_if_cancelled()``), or wait on it
+    instead of sleeping (``cancel_token().wait(timeout)``), so that the action
+    stops promptly when cancelled.
+
+    If this function is called from outside an ActionThread, it returns a
+    token that is never cancelled.
+
+    :returns: :class:`labthings.actions.thread.CancelToken`
+
+    """
+    action = current_action()
+    if action is None:
+        return CancelToken()
+    return action.stopping
 
 
 def update_action_progress(progress: int):
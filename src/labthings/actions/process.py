@@ -0,0 +1,267 @@
+import logging
+import multiprocessing
+import queue
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .thread import (
+    ActionKilledException,
+    ActionThread,
+    _current_action_thread,
+    _worker_local,
+)
+
+_LOG = logging.getLogger(__name__)
+
+# Sentinel message marking the end of a process action's messages
+_DONE = ("done", None)
+# Message waking up the relay of messages when the action is asked to stop
+_STOP = ("stop", None)
+
+
+class RemoteCancelToken:
+    """CancelToken interface for a managed Event shared with the parent process"""
+
+    def __init__(self, event):
+        self._event = event
+
+    @property
+    def cancelled(self) -> bool:
+        """Has cancellation been requested"""
+        return self._event.is_set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def set(self):
+        self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        """Raise ActionKilledException if cancellation has been requested
+
+        :raises ActionKilledException: if cancelled
+
+        """
+        if self._event.is_set():
+            raise ActionKilledException("Action was cancelled")
+
+
+class ProcessActionProxy:
+    """Stands in for an ActionThread inside a worker process.
+
+    Progress, data, and log records are sent back to the ActionThread in the
+    parent process over a queue, and cancellation requests from the parent
+    are available through the ``stopping`` event.
+    """
+
+    def __init__(self, action: str, messages, stopping):
+        self.action = action
+        self._messages = messages
+        self.stopping = RemoteCancelToken(stopping)
+
+    @property
+    def stopped(self) -> bool:
+        """Has the action been cancelled"""
+        return self.stopping.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Alias of `stopped`"""
+        return self.stopped
+
+    def update_progress(self, progress: int):
+        """
+        Update the progress of the parent ActionThread.
+
+        :param progress: int: Action progress, in percent (0-100)
+
+        """
+        self._messages.put(("progress", progress))
+
+    def update_data(self, data: Dict[Any, Any]):
+        """
+        Update the data of the parent ActionThread.
+
+        :param data: dict:
+
+        """
+        self._messages.put(("data", data))
+
+
+class QueueLogHandler(logging.Handler):
+    """Sends log records from a worker process to the parent over a queue"""
+
+    def __init__(self, messages, level=logging.INFO):
+        logging.Handler.__init__(self)
+        self.setLevel(level)
+        self.messages = messages
+
+    def emit(self, record):
+        """Send a picklable copy of a log record
+
+        :param record:
+
+        """
+        try:
+            attrs = dict(record.__dict__)
+            attrs["msg"] = record.getMessage()
+            attrs["args"] = None
+            if record.exc_info:
+                attrs["exc_text"] = self.format(record)
+            attrs["exc_info"] = None
+            self.messages.put(("log", attrs))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
+def _run_in_process(
+    action: str, function: Callable, args, kwargs, messages, stopping
+) -> Any:
+    """Entry point for an action function running in a worker process"""
+    proxy = ProcessActionProxy(action, messages, stopping)
+    handler = QueueLogHandler(messages)
+    logging.getLogger().addHandler(handler)
+    _worker_local.action = proxy
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _worker_local.action = None
+        logging.getLogger().removeHandler(handler)
+        messages.put(_DONE)
+
+
+class ProcessExecutor:
+    """Runs action functions in a pool of worker processes.
+
+    CPU-bound actions running in threads hold the GIL, slowing down every other
+    request. Running them in worker processes avoids this, while the
+    ActionThread in the parent process keeps tracking them as usual.
+
+    The function, its arguments, and its return value must be picklable.
+    Cancellation is cooperative: the action should check
+    ``current_action().stopping``. Forcefully terminating the ActionThread marks
+    the action as cancelled, but can not interrupt the worker process.
+
+    :param max_workers: Maximum number of worker processes. Defaults to the
+        number of CPUs.
+    :param mp_context: ``multiprocessing`` context used to start workers.
+        Defaults to the platform default. Python 3.6 always uses the
+        platform default to start workers.
+
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, mp_context=None):
+        self.max_workers: Optional[int] = max_workers
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Start the process pool and message manager, on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._manager = self.mp_context.Manager()
+                if sys.version_info >= (3, 7):
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=self.mp_context
+                    )
+                else:
+                    # Python 3.6 always starts workers with the default context
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor, self._manager
+
+    def run(self, function: Callable, *args, **kwargs) -> Any:
+        """Run a function in a worker process, and wait for its return value.
+
+        If called from inside an ActionThread, progress, data, and log records
+        from the worker process are applied to the ActionThread, and stopping
+        the ActionThread is passed on to the worker process.
+
+        :param function: Picklable function to run
+        :param *args:
+        :param **kwargs:
+
+        """
+        executor, manager = self._start()
+        action = _current_action_thread()
+        messages = manager.Queue()
+        stopping = manager.Event()
+
+        future = executor.submit(
+            _run_in_process,
+            getattr(action, "action", None),
+            function,
+            args,
+            kwargs,
+            messages,
+            stopping,
+        )
+        # The worker sends _DONE itself, but may fail before running the function
+        future.add_done_callback(lambda _: messages.put(_DONE))
+
+        def stop():
+            # Pass cancellation straight on to the worker process
+            stopping.set()
+            messages.put(_STOP)
+
+        if action is not None:
+            action.stopping.add_callback(stop)
+        try:
+            self._relay(action, messages)
+        except ActionKilledException:
+            # Ask the worker process to stop, and stop waiting for it
+            stopping.set()
+            raise
+        finally:
+            # Don't keep the managed Event alive once the function has returned
+            if action is not None:
+                action.stopping.remove_callback(stop)
+        return future.result()
+
+    @staticmethod
+    def _relay(action: Optional[ActionThread], messages):
+        """Apply messages from the worker process until it finishes"""
+        timeout = None
+        while True:
+            try:
+                kind, payload = messages.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if (kind, payload) == _DONE:
+                return
+            if (kind, payload) == _STOP:
+                # While the worker winds down, time out now and then, so that
+                # terminate() can still reach this thread if it never does
+                timeout = 1
+                continue
+            if action is None:
+                continue
+            try:
+                if kind == "progress":
+                    action.update_progress(payload)
+                elif kind == "data":
+                    action.update_data(payload)
+                elif kind == "log":
+                    action.add_log_record(logging.makeLogRecord(payload))
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes
+
+        :param wait: Block until the workers have exited (Default value = True)
+
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._manager.shutdown()
+                self._executor = None
+                self._manager = None
@@ -0,0 +1,230 @@
+import copy
+import datetime
+import logging
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .results import StoredResult
+
+_LOG = logging.getLogger(__name__)
+
+
+def _without_traceback(exception: Optional[Exception]) -> Optional[Exception]:
+    """Copy an exception, leaving out its traceback, which holds every frame
+    of the action, and their locals"""
+    if exception is None:
+        return None
+    try:
+        return copy.copy(exception)
+    except Exception:  # pylint: disable=broad-except
+        return exception
+
+
+class LogEntry:
+    """The parts of a ``logging.LogRecord`` shown in an action's log.
+
+    Unlike the record, this doesn't keep the arguments of the message,
+    or the traceback of an exception, alive.
+    """
+
+    __slots__ = (
+        "name",
+        "message",
+        "levelname",
+        "levelno",
+        "lineno",
+        "filename",
+        "created",
+    )
+
+    def __init__(self, record: logging.LogRecord):
+        self.name: str = record.name
+        self.message: str = record.getMessage()
+        self.levelname: str = record.levelname
+        self.levelno: int = record.levelno
+        self.lineno: int = record.lineno
+        self.filename: str = record.filename
+        created = record.created
+        if not isinstance(created, datetime.datetime):
+            created = datetime.datetime.fromtimestamp(created)
+        self.created: datetime.datetime = created
+
+    def getMessage(self) -> str:  # pylint: disable=invalid-name
+        """Formatted log message, as for ``logging.LogRecord``"""
+        return self.message
+
+
+class ActionRecord:
+    """Compact record of a finished action.
+
+    Once an action has finished, its :class:`labthings.actions.ActionThread`
+    is only needed to describe it. A Pool created with ``compact=True``
+    replaces the thread with one of these records, holding just the
+    attributes serialised by :class:`labthings.schema.ActionSchema`, so that
+    the thread, its locks and events, and its data update history can be
+    freed. Records can be used in place of finished ActionThreads by views
+    and schemas.
+
+    :param thread: The finished ActionThread
+
+    """
+
+    __slots__ = (
+        "action",
+        "_ID",
+        "_status",
+        "progress",
+        "data",
+        "data_seq",
+        "_request_time",
+        "_start_time",
+        "_end_time",
+        "queue_wait",
+        "priority",
+        "version",
+        "batch_size",
+        "log",
+        "input",
+        "_return_value",
+        "_stored_output",
+        "_exception",
+        "_cancelled",
+        "default_stop_timeout",
+        "href",
+        "links",
+        "_change_callbacks",
+    )
+
+    # Only the request that started an action handles its HTTP errors
+    http_error_lock = None
+
+    def __init__(self, thread):
+        self.action: str = thread.action
+        self._ID: uuid.UUID = thread.id
+        self._status: str = thread.status
+        self.progress: Optional[int] = thread.progress
+        self.data: dict = thread.data
+        self.data_seq: int = thread.data_seq
+        # pylint: disable=protected-access
+        self._request_time: datetime.datetime = thread._request_time
+        self._start_time: Optional[datetime.datetime] = thread._start_time
+        self._end_time: Optional[datetime.datetime] = thread._end_time
+        self.queue_wait: Optional[float] = thread.queue_wait
+        self.priority: int = thread.priority
+        self.version: int = thread.version
+        self.batch_size: Optional[int] = thread.batch_size
+        self.log: List[LogEntry] = [
+            record if isinstance(record, LogEntry) else LogEntry(record)
+            for record in thread.log
+        ]
+        self.input: Any = thread.input
+        self._return_value: Any = thread._return_value
+        self._stored_output: Optional[StoredResult] = thread.stored_output
+        self._exception: Optional[Exception] = _without_traceback(thread.exception)
+        self._cancelled: bool = thread.cancelled
+        self.default_stop_timeout: int = thread.default_stop_timeout
+        self.href: Optional[str] = None
+        self.links: Optional[dict] = None
+        self._change_callbacks: List[Callable] = list(thread._change_callbacks)
+
+    def __repr__(self) -> str:
+        return f"<ActionRecord {self.action} {self._ID} ({self._status})>"
+
+    @property
+    def id(self) -> uuid.UUID:
+        """UUID of the action"""
+        return self._ID
+
+    @property
+    def status(self) -> str:
+        """Final status of the action. See ``ActionThread.status``"""
+        return self._status
+
+    @property
+    def output(self) -> Any:
+        """Return value of the action"""
+        value = self._return_value
+        if value is None and self._stored_output is not None:
+            return self._stored_output.load()
+        return value
+
+    @property
+    def stored_output(self) -> Optional[StoredResult]:
+        """Handle on the return value, if it is held by a ResultStore"""
+        return self._stored_output
+
+    @property
+    def exception(self) -> Optional[Exception]:
+        """The Exception that caused the action to fail, without its traceback"""
+        return self._exception
+
+    @property
+    def cancelled(self) -> bool:
+        """Was the action asked to stop"""
+        return self._cancelled
+
+    stopped = cancelled
+
+    @property
+    def dead(self) -> bool:
+        """Records are only made of finished actions"""
+        return True
+
+    @property
+    def is_coroutine(self) -> bool:
+        """Records don't run, as a coroutine or otherwise"""
+        return False
+
+    def is_alive(self) -> bool:
+        """Records are only made of finished actions"""
+        return False
+
+    # These keep the same arguments as ActionThread's methods, so records can
+    # stand in for finished threads
+    # pylint: disable=unused-argument
+    def join(self, timeout: Optional[float] = None):
+        """Return immediately, as the action has finished"""
+
+    def get(self, block: bool = True, timeout: Optional[int] = None):
+        """Return value of the action. See ``ActionThread.get``"""
+        return self.output
+
+    def stop(self, timeout=None, exception=None) -> bool:
+        """Mark the action as cancelled, as ``ActionThread.stop`` does once
+        the action has finished
+
+        :returns: True, as the action is not running
+        """
+        self._cancelled = True
+        self._status = "cancelled"
+        self.version += 1
+        for callback in self._change_callbacks:
+            try:
+                callback(self)
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+        return True
+
+    def wait_for_change(
+        self, since: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Return the version immediately, as a finished action won't change"""
+        return self.version
+
+    def add_done_callback(self, callback: Callable[["ActionRecord"], None]):
+        """Call a function with this record immediately, as the action has finished"""
+        callback(self)
+
+    def data_since(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """Data updates made after a given sequence number.
+
+        The history of updates isn't kept, so clients that haven't seen the
+        latest update get the complete data. See ``ActionThread.data_since``.
+
+        :param since: Sequence number of the last update already seen
+
+        """
+        if since is not None and since >= self.data_seq:
+            return {"seq": self.data_seq, "updates": []}
+        return {"seq": self.data_seq, "data": self.data}
@@ -0,0 +1,324 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import IO, Any, List, Optional
+
+_LOG = logging.getLogger(__name__)
+
+# Default limits, in bytes
+INLINE_LIMIT = 1024 * 1024
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+def _measure(value: Any) -> Optional[tuple]:
+    """Find the size in bytes, and storage kind, of a return value.
+
+    Only values whose size is cheap to find are measured: bytes-like objects,
+    strings, and arrays with an ``nbytes`` attribute (e.g. Numpy arrays).
+
+    :returns: Tuple of size and kind, or None if the value can't be measured
+
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value), "bytes"
+    if isinstance(value, memoryview):
+        return value.nbytes, "bytes"
+    if isinstance(value, str):
+        return len(value), "str"
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int) and hasattr(value, "dtype"):
+        return nbytes, "array"
+    return None
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class StoredResult:
+    """Handle on an action's return value, held by a :class:`ResultStore`.
+
+    The value is either held in memory, or has been spilled to a file. Arrays
+    are spilled as their raw, C-ordered data, described by ``dtype`` and
+    ``shape``, so the file can be served as it is. Spilled arrays are loaded
+    memory-mapped, so only the parts that are used are read. A spilled value
+    that was evicted from the store can no longer be loaded.
+    """
+
+    def __init__(
+        self, store: "ResultStore", key: str, value: Any, size: int, kind: str
+    ):
+        self._store = store
+        self.key: str = key
+        self.size: int = size
+        self.kind: str = kind  # "bytes", "str", or "array"
+        # Needed to read back the raw data of spilled arrays
+        self.dtype: Any = value.dtype if kind == "array" else None
+        self.shape: Optional[tuple] = tuple(value.shape) if kind == "array" else None
+        self._value: Any = value
+        self.path: Optional[str] = None
+        self.expired: bool = False
+        self._cleanup: Optional[weakref.finalize] = None
+
+    @property
+    def spilled(self) -> bool:
+        """Has the value been moved out of memory"""
+        return self.path is not None
+
+    def _spill(self, directory: str):
+        """Write the value to a file in ``directory``, and drop it from memory"""
+        value = self._value
+        if value is None:
+            return
+        if self.kind == "array":
+            import numpy  # pylint: disable=import-outside-toplevel
+
+            if self.dtype.hasobject:
+                raise ValueError("Arrays of Python objects can't be spilled")
+            value = numpy.ascontiguousarray(value)
+        fd, path = tempfile.mkstemp(suffix=".bin", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            if self.kind == "array":
+                value.tofile(f)
+            elif self.kind == "str":
+                f.write(value.encode())
+            else:
+                f.write(value)
+        # Set the path before dropping the value, so readers always find one
+        self.path = path
+        self._cleanup = weakref.finalize(self, _remove, path)
+        self._value = None
+
+    def _expire(self):
+        """Delete the spilled file. The value can no longer be loaded."""
+        self.expired = True
+        if self._cleanup is not None:
+            self._cleanup()
+
+    def load(self) -> Any:
+        """Return the value, reading it back from its file if spilled.
+
+        :returns: The stored value, or None if it has expired
+
+        """
+        value = self._value
+        if value is not None:
+            self._store.touch(self.key)
+            return value
+        if self.expired or self.path is None:
+            return None
+        self._store.touch(self.key)
+        try:
+            if self.kind == "array":
+                import numpy  # pylint: disable=import-outside-toplevel
+
+                if self.size == 0:
+                    # Empty files can't be memory-mapped
+                    return numpy.empty(self.shape, dtype=self.dtype)
+                return numpy.memmap(
+                    self.path, dtype=self.dtype, mode="r", shape=self.shape
+                )
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            # Evicted while we were reading it
+            return None
+        return data.decode() if self.kind == "str" else data
+
+    def open(self) -> Optional[IO[bytes]]:
+        """Open the spilled file for reading, if the value has been spilled
+
+        :returns: Binary file object, or None if not spilled or expired
+
+        """
+        if self.expired or self.path is None:
+            return None
+        try:
+            return open(self.path, "rb")
+        except OSError:
+            return None
+
+
+class ResultStore:
+    """Keeps action return values within a memory budget.
+
+    Small results stay in memory. Results larger than ``inline_limit`` are
+    spilled to temporary files straight away, and once the results held in
+    memory add up to more than ``memory_budget``, the least recently used are
+    spilled too. If ``disk_budget`` is given, the least recently used spilled
+    results are deleted to stay within it, after which they read as None.
+
+    Only results whose size can be found cheaply are managed by the store:
+    ``bytes``, ``str``, and arrays (anything with ``nbytes`` and ``dtype``
+    attributes, e.g. Numpy arrays, which need Numpy installed to be spilled).
+    Other results stay on the ActionThread as usual.
+
+    :param inline_limit: Largest result, in bytes, kept in memory
+    :param memory_budget: Total size, in bytes, of results kept in memory
+    :param disk_budget: Total size, in bytes, of spilled results. None means unbounded.
+    :param directory: Directory for spilled results. Defaults to a new
+        temporary directory, removed when the store is garbage collected.
+
+    """
+
+    def __init__(
+        self,
+        inline_limit: int = INLINE_LIMIT,
+        memory_budget: int = MEMORY_BUDGET,
+        disk_budget: Optional[int] = None,
+        directory: Optional[str] = None,
+    ):
+        self.inline_limit: int = inline_limit
+        self.memory_budget: int = memory_budget
+        self.disk_budget: Optional[int] = disk_budget
+        self._directory: Optional[str] = directory
+        # Ordered map of key to StoredResult, least recently used first
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.memory_used: int = 0
+        self.disk_used: int = 0
+
+    @property
+    def directory(self) -> str:
+        """Directory holding spilled results, created on first use"""
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix="labthings-results-")
+                weakref.finalize(self, shutil.rmtree, self._directory, True)
+            return self._directory
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return str(key) in self._entries
+
+    def put(self, key, value: Any) -> Optional[StoredResult]:
+        """Store a result, spilling it (or older results) to disk if needed
+
+        :param key: Key for the result, usually the action ID
+        :param value: Result to store
+        :returns: StoredResult, or None if the value can't be managed by the store
+
+        """
+        measured = _measure(value)
+        if measured is None:
+            return None
+        size, kind = measured
+        if kind == "array" and not _numpy_available():
+            return None
+        result = StoredResult(self, str(key), value, size, kind)
+
+        if size > self.inline_limit:
+            # Write large results outside the lock
+            self._spill(result)
+
+        with self._lock:
+            self._discard(result.key)
+            self._entries[result.key] = result
+            if result.spilled:
+                self.disk_used += size
+            else:
+                self.memory_used += size
+            # Results held in memory are small, so spilling them here is quick
+            for victim in self._over_memory_budget():
+                self._spill(victim)
+                if victim.spilled:
+                    self.memory_used -= victim.size
+                    self.disk_used += victim.size
+            self._enforce_disk_budget()
+        return result
+
+    def get(self, key) -> Optional[StoredResult]:
+        """
+
+        :param key: Key of the result
+
+        :returns: StoredResult with a matching key, or None
+
+        """
+        with self._lock:
+            return self._entries.get(str(key))
+
+    def touch(self, key):
+        """Mark a result as recently used
+
+        :param key: Key of the result
+
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def discard(self, key):
+        """Remove a result from the store, deleting its file if spilled
+
+        :param key: Key of the result
+
+        """
+        with self._lock:
+            self._discard(str(key))
+
+    def clear(self):
+        """Remove all results from the store"""
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def _discard(self, key: str):
+        result = self._entries.pop(key, None)
+        if result is None:
+            return
+        if result.spilled:
+            if not result.expired:
+                self.disk_used -= result.size
+        else:
+            self.memory_used -= result.size
+        result._expire()  # pylint: disable=protected-access
+
+    def _spill(self, result: StoredResult):
+        try:
+            result._spill(self.directory)  # pylint: disable=protected-access
+        except Exception:  # pylint: disable=broad-except
+            _LOG.exception("Unable to spill result %s to disk", result.key)
+
+    def _over_memory_budget(self) -> List[StoredResult]:
+        """Pick the least recently used in-memory results to spill, so that the
+        rest fit within the memory budget. Must be called with the lock held."""
+        victims = []
+        excess = self.memory_used - self.memory_budget
+        for result in self._entries.values():
+            if excess <= 0:
+                break
+            if not result.spilled:
+                victims.append(result)
+                excess -= result.size
+        return victims
+
+    def _enforce_disk_budget(self):
+        """Delete the least recently used spilled results beyond the disk budget.
+        Must be called with the lock held."""
+        if self.disk_budget is None:
+            return
+        for result in self._entries.values():
+            if self.disk_used <= self.disk_budget:
+                break
+            if result.spilled and not result.expired:
+                _LOG.debug("Evicting result %s from disk", result.key)
+                self.disk_used -= result.size
+                result._expire()  # pylint: disable=protected-access
+
+
+def _numpy_available() -> bool:
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,300 @@
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .thread import ActionThread
+
+_LOG = logging.getLogger(__name__)
+
+OVERRUN_POLICIES = ("skip", "queue", "coalesce")
+
+
+class Schedule:
+    """Starts an action on a fixed period, or once at a deadline.
+
+    Ticks are timed from the monotonic clock, as multiples of the period
+    from the first tick, so that timing errors don't accumulate into drift.
+    If the previous run is still going when a tick is due, the ``overrun``
+    policy decides what happens: ``"skip"`` drops the tick, ``"queue"``
+    starts it as soon as the previous run finishes, and ``"coalesce"`` does
+    the same, but merges any number of late ticks into a single run.
+
+    Schedules are created with :meth:`Scheduler.add`.
+
+    :param start: Function starting a run of the action, returning its ActionThread
+    :param first_due: Monotonic time of the first tick
+    :param period: Time in seconds between ticks. None for a single run.
+    :param count: Maximum number of ticks. None means unlimited.
+    :param overrun: Overrun policy, one of ``"skip"``, ``"queue"`` or ``"coalesce"``
+    :param name: Name of the scheduled action
+
+    """
+
+    def __init__(
+        self,
+        start: Callable[[], ActionThread],
+        first_due: float,
+        period: Optional[float] = None,
+        count: Optional[int] = None,
+        overrun: str = "skip",
+        name: Optional[str] = None,
+    ):
+        if period is not None and period <= 0:
+            raise ValueError("period must be greater than 0")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(
+                f"overrun must be one of {', '.join(OVERRUN_POLICIES)}, not {overrun!r}"
+            )
+        self.id: str = str(uuid.uuid4())
+        self.name: Optional[str] = name
+        self.period: Optional[float] = period
+        self.count: Optional[int] = 1 if period is None else count
+        self.overrun: str = overrun
+        self._start = start
+        self._first_due: float = first_due
+        self._tick: int = 0  # Index of the next tick
+        self._lock = threading.Lock()
+        self.active: bool = True
+        self.runs: int = 0  # Number of runs started
+        self.skipped: int = 0  # Number of ticks dropped
+        self.owed: int = 0  # Number of ticks waiting for the current run to finish
+        self.last_action: Optional[ActionThread] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def next_due(self) -> Optional[float]:
+        """Monotonic time of the next tick, or None if there are no more"""
+        if not self.active or (self.count is not None and self._tick >= self.count):
+            return None
+        return self._first_due + self._tick * (self.period or 0)
+
+    @property
+    def next_run(self) -> Optional[datetime.datetime]:
+        """Local time of the next tick, or None if there are no more"""
+        due = self.next_due
+        if due is None:
+            return None
+        return datetime.datetime.now() + datetime.timedelta(
+            seconds=due - time.monotonic()
+        )
+
+    @property
+    def busy(self) -> bool:
+        """Is the last run of the action still pending or running"""
+        action = self.last_action
+        return action is not None and action.status in ("pending", "running")
+
+    def cancel(self):
+        """Stop scheduling new runs. Runs already started carry on."""
+        with self._lock:
+            self.active = False
+            self.owed = 0
+
+    def _fire(self, now: float):
+        """Handle a due tick, and any ticks missed since. Called by the Scheduler."""
+        with self._lock:
+            due = self.next_due
+            if due is None:
+                return
+            ticks = 1
+            if self.period is not None:
+                # Ticks that passed while we were late count as due now too
+                ticks += int((now - due) // self.period)
+                if self.count is not None:
+                    ticks = min(ticks, self.count - self._tick)
+            self._tick += ticks
+            if self.busy:
+                if self.overrun == "queue":
+                    self.owed += ticks
+                elif self.overrun == "coalesce":
+                    self.owed = 1
+                else:
+                    self.skipped += ticks
+                return
+            if self.overrun == "queue":
+                self.owed += ticks - 1
+            elif self.overrun == "skip":
+                self.skipped += ticks - 1
+        self._run()
+
+    def _run(self):
+        """Start a run of the action"""
+        try:
+            action = self._start()
+        except Exception as e:  # pylint: disable=broad-except
+            _LOG.error(traceback.format_exc())
+            with self._lock:
+                self.last_error = str(e)
+            return
+        with self._lock:
+            self.runs += 1
+            self.last_action = action
+        action.add_done_callback(self._finished)
+
+    def _finished(self, action: ActionThread):
+        """Start any ticks owed, once a run has finished"""
+        with self._lock:
+            if action is not self.last_action or not self.owed or not self.active:
+                return
+            self.owed -= 1
+        self._run()
+
+
+class Scheduler:
+    """Runs :class:`Schedule` ticks from a single background thread.
+
+    The thread sleeps until the earliest tick is due, so idle schedules cost
+    nothing. Actions are started through the schedules' start functions,
+    which usually spawn them in a :class:`labthings.actions.Pool`, reusing
+    its worker threads if it has any.
+
+    Finished schedules are kept, so their last runs can be looked up, but
+    only the most recent ``max_finished`` of them.
+
+    :param max_finished: Maximum number of finished schedules to keep
+        (Default value = 100)
+
+    """
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished: int = max_finished
+        self._schedules: Dict[str, Schedule] = {}
+        # IDs of finished schedules, oldest first
+        self._finished: Deque[str] = deque()
+        # Heap of (due time, sequence number, schedule)
+        self._heap: List[Tuple[float, int, Schedule]] = []
+        self._counter = itertools.count()
+        self._changed = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping: bool = False
+
+    def add(
+        self,
+        start: Callable[[], ActionThread],
+        period: Optional[float] = None,
+        delay: float = 0,
+        at: Optional[datetime.datetime] = None,
+        count: Optional[int] = None,
+        overrun: str = "skip",
+        name: Optional[str] = None,
+    ) -> Schedule:
+        """Schedule an action
+
+        :param start: Function starting a run of the action, returning its ActionThread
+        :param period: Time in seconds between runs. None for a single run.
+        :param delay: Time in seconds before the first run (Default value = 0)
+        :param at: Local time of the first run, instead of ``delay``
+        :param count: Maximum number of runs. None means unlimited.
+        :param overrun: What to do when a run is due while the previous run is
+            still going: ``"skip"``, ``"queue"`` or ``"coalesce"``
+        :param name: Name of the scheduled action
+        :returns: The new Schedule
+
+        """
+        if at is not None:
+            if at.tzinfo is not None:
+                at = at.astimezone().replace(tzinfo=None)
+            delay = (at - datetime.datetime.now()).total_seconds()
+        schedule = Schedule(
+            start,
+            time.monotonic() + max(delay, 0),
+            period=period,
+            count=count,
+            overrun=overrun,
+            name=name,
+        )
+        with self._changed:
+            self._schedules[schedule.id] = schedule
+            self._push(schedule)
+            self._start()
+            self._changed.notify()
+        return schedule
+
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        """
+        :param schedule_id: ID of the schedule
+        :returns: Schedule with a matching ID, or None
+        """
+        with self._changed:
+            return self._schedules.get(str(schedule_id))
+
+    def schedules(self) -> List[Schedule]:
+        """Snapshot list of schedules, including finished ones, oldest first"""
+        with self._changed:
+            return list(self._schedules.values())
+
+    def cancel(self, schedule_id: str) -> Optional[Schedule]:
+        """Cancel a schedule, and forget it
+
+        :param schedule_id: ID of the schedule
+        :returns: The cancelled Schedule, or None if there isn't one with that ID
+
+        """
+        with self._changed:
+            schedule = self._schedules.pop(str(schedule_id), None)
+        if schedule is not None:
+            schedule.cancel()
+        return schedule
+
+    def stop(self, wait: bool = True):
+        """Cancel every schedule, and stop the scheduler thread
+
+        :param wait: Block until the thread has exited (Default value = True)
+
+        """
+        with self._changed:
+            for schedule in self._schedules.values():
+                schedule.cancel()
+            self._stopping = True
+            self._changed.notify()
+            thread = self._thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _push(self, schedule: Schedule):
+        """Queue the next tick of a schedule, or retire it if it has finished.
+        Must hold the lock."""
+        due = schedule.next_due
+        if due is not None:
+            heapq.heappush(self._heap, (due, next(self._counter), schedule))
+            return
+        if schedule.id not in self._schedules:
+            return  # Cancelled, and already forgotten
+        self._finished.append(schedule.id)
+        # Forget the oldest finished schedules beyond our limit
+        while len(self._finished) > self.max_finished:
+            self._schedules.pop(self._finished.popleft(), None)
+
+    def _start(self):
+        """Start the scheduler thread, if it isn't running. Must hold the lock."""
+        self._stopping = False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="labthings-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._stopping:
+                    if not self._heap:
+                        self._changed.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._stopping:
+                    return
+                _, _, schedule = heapq.heappop(self._heap)
+            schedule._fire(time.monotonic())  # pylint: disable=protected-access
+            with self._changed:
+                self._push(schedule)
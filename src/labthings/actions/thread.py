@@ -1,24 +1,128 @@
+import asyncio
 import ctypes
 import datetime
+import inspect
 import logging
 import threading
+import time
 import traceback
 import uuid
-from typing import Any, Callable, Dict, Iterable, Optional
+import weakref
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
 
-from flask import copy_current_request_context, has_request_context, request
-from werkzeug.exceptions import BadRequest, HTTPException
+from flask import copy_current_request_context, has_request_context
+from werkzeug.exceptions import HTTPException
 
 from ..deque import LockableDeque
-from ..utilities import TimeoutTracker
+from ..marshalling.args import request_json
+from .results import ResultStore, StoredResult
 
 _LOG = logging.getLogger(__name__)
 
+# Tracks the ActionThread being executed by a pooled worker thread
+_worker_local = threading.local()
+
+# Maps asyncio Tasks running coroutine actions to their ActionThread
+_coroutine_actions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _current_task() -> Optional["asyncio.Task"]:
+    """Return the asyncio Task running in the current thread, if any"""
+    try:
+        if hasattr(asyncio, "current_task"):
+            return asyncio.current_task()
+        # Python 3.6
+        return asyncio.Task.current_task()  # pylint: disable=no-member
+    except RuntimeError:  # No event loop running in this thread
+        return None
+
+
+def _current_action_thread() -> Optional["ActionThread"]:
+    """Find the ActionThread the caller is running in, if any"""
+    # Actions run by pooled workers are tracked per worker thread
+    worker_action = getattr(_worker_local, "action", None)
+    if worker_action is not None:
+        return worker_action
+    current_thread = threading.current_thread()
+    if isinstance(current_thread, ActionThread):
+        return current_thread
+    # Coroutine actions are tracked per asyncio Task
+    if _coroutine_actions:
+        task = _current_task()
+        if task is not None:
+            return _coroutine_actions.get(task)
+    return None
+
 
 class ActionKilledException(SystemExit):
     """Sibling of SystemExit, but specific to thread termination."""
 
 
+class CancelToken(threading.Event):
+    """An Event that is set when an action is asked to stop.
+
+    Action code can check the token (``cancelled``, ``raise_if_cancelled()``),
+    or block on it (``wait(timeout)``) instead of sleeping, so that it wakes
+    up as soon as the action is cancelled. Other parts of LabThings register
+    callbacks with ``add_callback`` to pass cancellation on without polling.
+    """
+
+    def __init__(self):
+        threading.Event.__init__(self)
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Has cancellation been requested"""
+        return self.is_set()
+
+    def raise_if_cancelled(self):
+        """Raise ActionKilledException if cancellation has been requested
+
+        :raises ActionKilledException: if cancelled
+
+        """
+        if self.is_set():
+            raise ActionKilledException("Action was cancelled")
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Call a function once cancellation is requested.
+        If it already has been, the function is called immediately.
+
+        :param callback: Callable taking no arguments
+
+        """
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        """Stop calling a function once cancellation is requested.
+        Does nothing if the function isn't registered, or has already been called.
+
+        :param callback: Callable previously passed to ``add_callback``
+
+        """
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def set(self):
+        """Request cancellation, and call any registered callbacks"""
+        with self._callbacks_lock:
+            threading.Event.set(self)
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+
+
 class ActionThread(threading.Thread):
     """
     A native thread with extra functionality for tracking progress and thread termination.
@@ -28,10 +132,12 @@ class ActionThread(threading.Thread):
     * `target`, `name`, `args`, `kwargs` and `daemon` are passed to `threading.Thread`
       (though the defualt for `daemon` is changed to `True`)
     * `default_stop_timeout` specifies how long we wait for the `target` function to
-      stop nicely (e.g. by checking the `stopping` Event )
+      stop nicely (e.g. by checking the `stopping` CancelToken)
     * `log_len` gives the number of log entries before we start dumping them
+    * `data_log_len` gives the number of data updates kept for incremental reads
     * `http_error_lock` allows the calling thread to handle some
       errors initially.  See below.
+    * `priority` orders the action in pool queues. Higher values run first.
 
     ## Error propagation
     If the `target` function throws an Exception, by default this will result in:
@@ -70,7 +176,9 @@ class ActionThread(threading.Thread):
         daemon: bool = True,
         default_stop_timeout: int = 5,
         log_len: int = 100,
+        data_log_len: int = 1000,
         http_error_lock: Optional[threading.Lock] = None,
+        priority: int = 0,
     ):
         threading.Thread.__init__(
             self,
@@ -91,10 +199,14 @@ class ActionThread(threading.Thread):
         # Event to track if the task has started
         self.started: threading.Event = threading.Event()
         # Event to track if the user has requested stop
-        self.stopping: threading.Event = threading.Event()
+        self.stopping: CancelToken = CancelToken()
         self.default_stop_timeout: int = default_stop_timeout
         # Allow the calling thread to handle HTTP errors for a short time at the start
         self.http_error_lock = http_error_lock or threading.Lock()
+        # Position in pool queues. Higher values run first.
+        self.priority: int = priority
+        # Number of items, if the action runs a batch of invocations
+        self.batch_size: Optional[int] = None
 
         # Make _target, _args, and _kwargs available to the subclass
         self._target: Optional[Callable] = target
@@ -106,29 +218,46 @@ class ActionThread(threading.Thread):
             f"{self._target}(args={self._args}, kwargs={self._kwargs})"
         )
 
+        # Coroutine functions run as asyncio Tasks rather than in their own thread
+        self._is_coroutine: bool = inspect.iscoroutinefunction(target)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
         # copy_current_request_context allows threads to access flask current_app
-        if has_request_context():
+        # Request contexts can't follow a coroutine between threads, so skip those
+        if has_request_context() and not self._is_coroutine:
             logging.debug("Copying request context to %s", self._target)
             self._target = copy_current_request_context(self._target)
-            try:
-                self.input = request.json
-            except BadRequest:
-                self.input = None
+        if has_request_context():
+            # Shares the body already decoded when parsing the action's arguments
+            self.input = request_json()
         else:
             logging.debug("No request context to copy")
             self.input = None
 
+        # Version counter, incremented whenever the status, progress or data change
+        self._version: int = 0
+        self._changed = threading.Condition()
+        self._change_callbacks: List[Callable[["ActionThread"], None]] = []
+
         # Private state properties
-        self._status: str = "pending"  # Task status
+        self._status = "pending"  # Task status
         self._return_value: Optional[Any] = None  # Return value
+        self._stored_output: Optional[StoredResult] = None  # Return value, if stored
         self._request_time: datetime.datetime = datetime.datetime.now()
+        self._request_clock: float = time.monotonic()  # For precise queue timing
         self._start_time: Optional[datetime.datetime] = None  # Task start time
+        self._queue_wait: Optional[float] = None  # Seconds between request and start
         self._end_time: Optional[datetime.datetime] = None  # Task end time
         self._exception: Optional[Exception] = None  # Propagate exceptions helpfully
 
         # Public state properties
-        self.progress: Optional[int] = None  # Percent progress of the task
+        self.progress = None  # Percent progress of the task
         self.data: dict = {}  # Dictionary of custom data added during the task
+        # Sequence numbered data updates, so clients can fetch just the new ones
+        self._data_seq: int = 0
+        self._data_log: Deque[Tuple[int, dict]] = deque(maxlen=data_log_len)
+        self._data_lock = threading.Lock()
         self._log = LockableDeque(
             None, log_len
         )  # The log will hold dictionary objects with log information
@@ -138,6 +267,16 @@ class ActionThread(threading.Thread):
             threading.Lock()
         )  # Lock obtained while self._target is running
 
+        # Stuff for running on a pooled worker thread instead of our own thread
+        self._executor_managed: bool = False  # Set when submitted to an executor
+        self._deferred: bool = False  # Set while held back by a concurrency policy
+        self._pooled: bool = True  # Cleared to keep the action off pooled workers
+        self._worker: Optional[threading.Thread] = None  # Worker running the action
+        self._claimed: bool = False  # Set once the action has started running
+        self._claim_lock = threading.Lock()
+        self._done: threading.Event = threading.Event()  # Set once finished
+        self._done_callbacks: List[Callable[["ActionThread"], None]] = []
+
     @property
     def id(self) -> uuid.UUID:
         """
@@ -150,13 +289,112 @@ class ActionThread(threading.Thread):
         """
         Return value of the Action function. If the Action is still running, returns None.
         """
-        return self._return_value
+        # The return value is handed to a ResultStore after it's set, so check
+        # it first, and the store second
+        value = self._return_value
+        if value is None and self._stored_output is not None:
+            return self._stored_output.load()
+        return value
+
+    @property
+    def stored_output(self) -> Optional[StoredResult]:
+        """
+        Handle on the return value, if it is held by a ResultStore rather than the
+        thread.
+        """
+        return self._stored_output
+
+    def _store_output(self, store: ResultStore):
+        """Hand a completed action's return value over to a ResultStore
+
+        :param store: ResultStore to keep the return value in
+
+        """
+        if self._status != "completed" or self._return_value is None:
+            return
+        stored = store.put(str(self.id), self._return_value)
+        if stored is not None:
+            # Set the handle before dropping the value, so readers always find one
+            self._stored_output = stored
+            self._return_value = None
 
     @property
     def log(self):
         with self._log as logdeque:
             return list(logdeque)
 
+    @property
+    def _status(self) -> str:
+        return self._status_value
+
+    @_status.setter
+    def _status(self, value: str):
+        self._status_value = value
+        self._notify_change()
+
+    @property
+    def progress(self) -> Optional[int]:
+        """Percent progress of the task"""
+        return self._progress
+
+    @progress.setter
+    def progress(self, value: Optional[int]):
+        changed = value != getattr(self, "_progress", None)
+        self._progress = value
+        if changed:
+            self._notify_change()
+
+    @property
+    def version(self) -> int:
+        """
+        Counter incremented whenever the status, progress, data or log of the action
+        change.
+        """
+        return self._version
+
+    def _notify_change(self):
+        """Increment the version, and wake up anything waiting for a change"""
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+        for callback in self._change_callbacks:
+            try:
+                callback(self)
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+
+    def add_change_callback(self, callback: Callable[["ActionThread"], None]):
+        """
+        Register a function to be called with this action whenever its status,
+        progress or data change.
+
+        :param callback: Callable taking the changed ActionThread
+
+        """
+        self._change_callbacks.append(callback)
+
+    def wait_for_change(
+        self, since: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """
+        Block until the status, progress or data of the action change.
+        Returns straight away once the action has finished, as it won't
+        change any more.
+
+        :param since: Wait until the version is greater than this. Defaults to
+            the current version, i.e. waits for the next change.
+        :param timeout: Maximum time to wait, in seconds. None waits forever.
+        :returns: The current version
+
+        """
+        with self._changed:
+            if since is None:
+                since = self._version
+            self._changed.wait_for(
+                lambda: self._version > since or self._done.is_set(), timeout
+            )
+            return self._version
+
     @property
     def status(self) -> str:
         """
@@ -174,6 +412,21 @@ class ActionThread(threading.Thread):
         """
         return self._status
 
+    @property
+    def is_coroutine(self) -> bool:
+        """
+        Does the action run as a coroutine on an event loop, rather than in a thread.
+        """
+        return self._is_coroutine
+
+    @property
+    def queue_wait(self) -> Optional[float]:
+        """
+        Time in seconds the action waited between being requested and starting
+        to run. None if the action has not started.
+        """
+        return self._queue_wait
+
     @property
     def dead(self) -> bool:
         """
@@ -181,6 +434,51 @@ class ActionThread(threading.Thread):
         """
         return not self.is_alive()
 
+    @property
+    def ident(self) -> Optional[int]:  # type: ignore
+        """
+        Thread identifier of the thread running the action. For actions run by
+        a pooled worker, this is the ident of the worker while the action runs.
+        """
+        if self._executor_managed or self._is_coroutine:
+            worker = self._worker
+            return worker.ident if worker else None
+        return threading.Thread.ident.fget(self)  # type: ignore
+
+    def is_alive(self) -> bool:
+        """
+        Return whether the action is alive. Actions waiting in a queue count
+        as alive, so that they are not discarded before they have run.
+        """
+        if self._executor_managed or self._deferred or self._is_coroutine:
+            return not self._done.is_set()
+        return threading.Thread.is_alive(self)
+
+    def join(self, timeout: Optional[float] = None):
+        """
+        Wait until the action finishes.
+
+        :param timeout: Maximum time to wait, in seconds (Default value = None)
+
+        """
+        if self._executor_managed or self._deferred or self._is_coroutine:
+            self._done.wait(timeout)
+        else:
+            threading.Thread.join(self, timeout)
+
+    def add_done_callback(self, callback: Callable[["ActionThread"], None]):
+        """
+        Register a function to be called with this action once it finishes.
+        If the action has already finished, the function is called immediately.
+
+        :param callback: Callable taking the finished ActionThread
+
+        """
+        if self._done.is_set():
+            callback(self)
+        else:
+            self._done_callbacks.append(callback)
+
     @property
     def stopped(self) -> bool:
         """Has the thread been cancelled"""
@@ -213,10 +511,73 @@ class ActionThread(threading.Thread):
 
         """
         # Store data to be used before task finishes (eg for real-time plotting)
-        self.data.update(data)
+        with self._data_lock:
+            # Copy on write, so that readers never see a half-updated dict
+            merged = dict(self.data)
+            merged.update(data)
+            self._data_seq += 1
+            self._data_log.append((self._data_seq, dict(data)))
+            self.data = merged
+        self._notify_change()
+
+    @property
+    def data_seq(self) -> int:
+        """
+        Sequence number of the latest data update.
+        """
+        return self._data_seq
+
+    def data_since(self, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Data updates made after a given sequence number.
+
+        Returns a dictionary with the latest sequence number as ``seq``, and
+        either ``updates``, a list of ``{"seq": ..., "data": ...}`` updates
+        newer than ``since``, or ``data``, the complete data, if ``since`` is
+        None or older than the updates still kept.
+
+        :param since: Sequence number of the last update already seen
+
+        """
+        with self._data_lock:
+            seq = self._data_seq
+            if since is not None and (
+                since >= seq or (self._data_log and self._data_log[0][0] <= since + 1)
+            ):
+                return {
+                    "seq": seq,
+                    "updates": [
+                        {"seq": n, "data": update}
+                        for n, update in self._data_log
+                        if n > since
+                    ],
+                }
+            return {"seq": seq, "data": self.data}
+
+    def add_log_record(self, record: logging.LogRecord):
+        """
+        Append a log record to the action's log.
+
+        :param record: logging.LogRecord:
+
+        """
+        with self._log as logdeque:
+            logdeque.append(record)
+        self._notify_change()
 
     def run(self):
         """Overrides default threading.Thread run() method"""
+        if self._is_coroutine:
+            # Started as a plain thread, so give the coroutine its own event loop
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(self._run_coroutine(loop))
+            finally:
+                loop.close()
+            return
+        # Skip actions that were cancelled before they started
+        if not self._claim():
+            return
         logging.debug((self._args, self._kwargs))
         try:
             if self._target:
@@ -226,6 +587,138 @@ class ActionThread(threading.Thread):
             # Avoid a refcycle if the thread is running a function with
             # an argument that has a member that points to the thread.
             del self._target, self._args, self._kwargs
+            self._finish()
+
+    def _finish(self):
+        """Mark the action as finished, and notify any done callbacks"""
+        self._worker = None
+        self._done.set()
+        # Wake up waiters again, now that every attribute is final
+        self._notify_change()
+        callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+
+    def _claim(self) -> bool:
+        """Mark the action as started. Returns False if it was already
+        started, or cancelled while still pending."""
+        with self._claim_lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+        return True
+
+    def _run_in_worker(self):
+        """Run the action in the calling thread. Used by pooled worker threads.
+
+        If the action was cancelled while waiting in the queue, it is skipped.
+        """
+        self._worker = threading.current_thread()
+        _worker_local.action = self
+        try:
+            self.run()
+        finally:
+            _worker_local.action = None
+            self._worker = None
+
+    async def _run_coroutine(self, loop: asyncio.AbstractEventLoop):
+        """Run a coroutine action, recording its `status` and return value.
+        Happens inside an asyncio Task on ``loop``.
+
+        :param loop: Event loop the action is running on
+
+        """
+        if not self._claim():
+            return
+        self._loop = loop
+        self._worker = threading.current_thread()
+        self._task = _current_task()
+        if self._task is not None:
+            _coroutine_actions[self._task] = self
+
+        # Capture just this coroutine's log messages
+        log_dispatcher = action_log_dispatcher()
+        log_dispatcher.register(self, task=self._task)
+
+        self._status = "running"
+        self._start_time = datetime.datetime.now()
+        self._queue_wait = time.monotonic() - self._request_clock
+        self.started.set()
+        try:
+            self._return_value = await self._target(*self._args, **self._kwargs)
+            self._status = "completed"
+        except (asyncio.CancelledError, ActionKilledException, SystemExit) as e:
+            logging.error(repr(e))
+            self._status = "cancelled"
+            self.progress = None
+        except HTTPException as e:
+            self._exception = e
+            if self.http_error_lock.acquire(blocking=False):
+                self.http_error_lock.release()
+                logging.error(
+                    "An HTTPException occurred in an action coroutine, but "
+                    "the parent request was no longer waiting for it."
+                )
+                logging.error(traceback.format_exc())
+        except Exception as e:  # pylint: disable=broad-except
+            # There's no thread to raise into, so just record the error
+            self._exception = e
+            logging.error(traceback.format_exc())
+        finally:
+            self._end_time = datetime.datetime.now()
+            log_dispatcher.unregister(self, task=self._task)
+            if self._exception:
+                self._return_value = str(self._exception)
+                self._status = "error"
+            if self._task is not None:
+                _coroutine_actions.pop(self._task, None)
+            self._task = None
+            del self._target, self._args, self._kwargs
+            self._finish()
+
+    def _cancel_task(self) -> bool:
+        """Cancel the asyncio Task of a running coroutine action
+
+        :returns: True if a cancellation was requested
+
+        """
+        task, loop = self._task, self._loop
+        if task is None or loop is None:
+            return False
+        loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def _cancel_pending(self) -> bool:
+        """Cancel an action that is still waiting to start.
+
+        :returns: True if the action was cancelled before it started running
+
+        """
+        return self._finish_pending("cancelled")
+
+    def _finish_pending(
+        self, status: str, exception: Optional[Exception] = None
+    ) -> bool:
+        """Finish an action that has not started running, without running it.
+
+        :param status: Final status of the action
+        :param exception: Exception to record as the reason (Default value = None)
+        :returns: True if the action had not yet started
+
+        """
+        if not self._claim():
+            return False
+        self._status = status
+        self._end_time = datetime.datetime.now()
+        if exception is not None:
+            self._exception = exception
+            self._return_value = str(exception)
+        del self._target, self._args, self._kwargs
+        self._finish()
+        return True
 
     def _thread_proc(self, f: Callable):
         """Wraps the target function to handle recording `status` and `return` to `state`.
@@ -245,11 +738,12 @@ class ActionThread(threading.Thread):
             nonlocal self
 
             # Capture just this thread's log messages
-            handler = ThreadLogHandler(self, self._log)
-            logging.getLogger().addHandler(handler)
+            log_dispatcher = action_log_dispatcher()
+            log_dispatcher.register(self)
 
             self._status = "running"
             self._start_time = datetime.datetime.now()
+            self._queue_wait = time.monotonic() - self._request_clock
             self.started.set()
             try:
                 self._return_value = f(*args, **kwargs)
@@ -277,8 +771,7 @@ class ActionThread(threading.Thread):
                 raise e
             finally:
                 self._end_time = datetime.datetime.now()
-                logging.getLogger().removeHandler(handler)  # Stop logging this thread
-                # If we don't remove the handler, it's a memory leak.
+                log_dispatcher.unregister(self)  # Stop logging this thread
                 if self._exception:
                     self._return_value = str(self._exception)
                     self._status = "error"
@@ -296,7 +789,7 @@ class ActionThread(threading.Thread):
             if self.is_alive():
                 raise TimeoutError
         self.join(timeout=timeout)
-        return self._return_value
+        return self.output
 
     def _async_raise(self, exc_type):
         """
@@ -348,29 +841,51 @@ class ActionThread(threading.Thread):
             return False
         return True
 
-    def terminate(self, exception=ActionKilledException) -> bool:
+    def terminate(self, exception=ActionKilledException, wait: bool = True) -> bool:
         """
 
         :param exception:  (Default value = ActionKilledException)
         :raises which: should cause the thread to exit silently
+        :param wait: Block until the thread function has exited (Default value = True)
 
         """
         _LOG.warning("Terminating thread %s", self)
         if not (self.is_alive() or self._is_thread_proc_running()):
             logging.debug("Cannot kill thread that is no longer running.")
             return False
+        if self._is_coroutine:
+            # Never raise into the event loop thread. Cancel the Task instead.
+            if not self._cancel_task():
+                return self._cancel_pending()
+            if wait:
+                self._done.wait()
+            return True
         self._async_raise(exception)
 
         # Wait (block) for the thread to finish closing. If the threaded function has cleanup code in a try-except,
         # this pause allows it to finish running before the main thread can continue.
-        while self._is_thread_proc_running():
-            pass
+        if wait:
+            self.wait_terminated()
 
         # Set state to stopped
         self._status = "cancelled"
         self.progress = None
         return True
 
+    def wait_terminated(self, timeout: Optional[float] = None) -> bool:
+        """Block until the thread function has exited after `terminate`.
+
+        :param timeout: Maximum time to wait in seconds. None waits forever.
+        :returns: True if the thread function has exited
+
+        """
+        # _thread_proc holds this lock while running, so acquiring it
+        # blocks (without spinning) until the function has exited.
+        if self._running_lock.acquire(timeout=-1 if timeout is None else timeout):
+            self._running_lock.release()
+            return True
+        return False
+
     def stop(self, timeout=None, exception=ActionKilledException) -> bool:
         """Sets the threads internal stopped event, waits for timeout seconds for the
         thread to stop nicely, then forcefully kills the thread.
@@ -384,15 +899,19 @@ class ActionThread(threading.Thread):
             timeout = self.default_stop_timeout
 
         self.stopping.set()
-        timeout_tracker = TimeoutTracker(timeout)
-        # While the timeout hasn't expired
-        while not timeout_tracker.stopped:
-            # If the thread has stopped
-            if not self.is_alive():
-                # Break
-                self._status = "cancelled"
-                return True
-        # If the timeout tracker stopped before the thread died, kill it
+        # Actions still waiting for a pooled worker can be cancelled immediately
+        if self._cancel_pending():
+            return True
+        # Coroutine actions are cancelled through their asyncio Task
+        if self._is_coroutine and self._cancel_task():
+            self._done.wait(timeout)
+            return self._done.is_set()
+        # Wait for the thread to stop nicely
+        self.join(timeout)
+        if not self.is_alive():
+            self._status = "cancelled"
+            return True
+        # If the timeout expired before the thread died, kill it
         logging.warning("Forcefully terminating thread %s", self)
         return self.terminate(exception=exception)
 
@@ -435,6 +954,9 @@ class ThreadLogHandler(logging.Handler):
         """
         if self.thread is None:
             return 1
+        if self.thread.is_coroutine:
+            # Coroutine actions share the event loop thread, so check the Task
+            return 1 if _current_action_thread() is self.thread else 0
         if threading.get_ident() == self.thread.ident:
             return 1
         return 0
@@ -448,3 +970,84 @@ class ThreadLogHandler(logging.Handler):
         with self.dest as logdeque:
             logdeque.append(record)
         # TODO: think about whether any of the keys are security flaws
+
+
+class ActionLogDispatcher(logging.Handler):
+    """A single root log handler, capturing log records for every running action.
+
+    Rather than adding a filtered handler per action, which every log call
+    would have to check, actions register the thread (or asyncio Task) they
+    run in. Each record is then routed to its action's log with a single
+    dictionary lookup, however many actions are running.
+
+    Use :func:`action_log_dispatcher` to get the process-wide instance.
+    """
+
+    def __init__(self, level=logging.INFO):
+        logging.Handler.__init__(self)
+        self.setLevel(level)
+        # Actions capturing logs, by the ident of the thread they run in
+        self._threads: Dict[int, ActionThread] = {}
+        # Coroutine actions capturing logs, by their asyncio Task
+        self._tasks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def register(self, action: ActionThread, task: Optional["asyncio.Task"] = None):
+        """Start capturing log records for an action.
+
+        :param action: ActionThread to capture records for
+        :param task: asyncio Task of a coroutine action. If None, records
+            logged by the calling thread are captured.
+
+        """
+        if task is not None:
+            self._tasks[task] = action
+        else:
+            self._threads[threading.get_ident()] = action
+
+    def unregister(self, action: ActionThread, task: Optional["asyncio.Task"] = None):
+        """Stop capturing log records for an action.
+
+        :param action: ActionThread to stop capturing records for
+        :param task: asyncio Task of a coroutine action, as passed to `register`
+
+        """
+        if task is not None:
+            if self._tasks.get(task) is action:
+                del self._tasks[task]
+        elif self._threads.get(threading.get_ident()) is action:
+            del self._threads[threading.get_ident()]
+
+    def emit(self, record):
+        """Append a log record to the log of the action that logged it
+
+        :param record:
+
+        """
+        action = self._threads.get(record.thread or threading.get_ident())
+        if action is None and self._tasks:
+            task = _current_task()
+            action = self._tasks.get(task) if task is not None else None
+        if action is not None:
+            action.add_log_record(record)
+
+
+_log_dispatcher: Optional[ActionLogDispatcher] = None
+_log_dispatcher_lock = threading.Lock()
+
+
+def action_log_dispatcher() -> ActionLogDispatcher:
+    """Return the process-wide ActionLogDispatcher, making sure it is
+    attached to the root logger. Safe to call any number of times.
+
+    :returns: :class:`ActionLogDispatcher`
+
+    """
+    global _log_dispatcher  # pylint: disable=global-statement
+    with _log_dispatcher_lock:
+        if _log_dispatcher is None:
+            _log_dispatcher = ActionLogDispatcher()
+        root = logging.getLogger()
+        # Re-attach if logging was reconfigured since
+        if _log_dispatcher not in root.handlers:
+            root.addHandler(_log_dispatcher)
+        return _log_dispatcher
@@ -1,15 +1,25 @@
-from flask import abort
+from typing import Optional
+
+from flask import Response, abort, request, send_file
+from marshmallow import ValidationError
+from werkzeug.urls import url_encode
 
 from .. import fields
 from ..find import current_labthing
-from ..marshalling import use_args
+from ..marshalling import sparse_schema, use_args
 from ..schema import ActionSchema
 from ..views import View, described_operation
 
+# Shared schema instances, so that restricted copies for `?fields=` are reused
+_action_schema = ActionSchema()
+_action_list_schema = ActionSchema(many=True)
+
 
 class ActionQueueView(View):
     """List of all actions from the session"""
 
+    max_limit: int = 1000  # Largest page of actions a GET request may return
+
     @described_operation
     def get(self):
         """Action queue
@@ -18,14 +28,89 @@ class ActionQueueView(View):
         the server was started, including ones that have completed and
         actions that are still running.  Each entry includes links to
         manage and inspect that action.
+
+        The list can be filtered by `status`, `action` name, and
+        request time (`since`). With a `limit`, the list is split
+        into pages, and the next page is linked from a `Link`
+        header with `rel="next"`. The `ETag` of the response
+        changes whenever any action changes.
         """
-        return ActionSchema(many=True).dump(current_labthing().actions.threads)
+        pool = current_labthing().actions
+        etag = pool.version
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+        status = request.args.get("status")
+        since = request.args.get("since")
+        if since is not None:
+            try:
+                since = fields.DateTime().deserialize(since)
+            except ValidationError as e:
+                return abort(400, description=f"Invalid since: {e.messages[0]}")
+        limit = request.args.get("limit", type=int)
+        if limit is not None:
+            limit = min(max(limit, 1), self.max_limit)
+
+        tasks, cursor = pool.query(
+            status=status.split(",") if status else None,
+            action=request.args.get("action"),
+            since=since,
+            cursor=request.args.get("cursor", type=int),
+            limit=limit,
+        )
+        headers = {"ETag": f'"{etag}"'}
+        if cursor is not None:
+            args = request.args.to_dict()
+            args["cursor"] = cursor
+            headers["Link"] = f'<{request.base_url}?{url_encode(args)}>; rel="next"'
+        return sparse_schema(_action_list_schema).dump(tasks), 200, headers
+
+    get.parameters = [
+        {
+            "name": "status",
+            "in": "query",
+            "description": "Only list actions with these statuses, comma-separated",
+            "required": False,
+            "schema": {"type": "string"},
+            "example": "pending,running",
+        },
+        {
+            "name": "action",
+            "in": "query",
+            "description": "Only list actions with this name",
+            "required": False,
+            "schema": {"type": "string"},
+        },
+        {
+            "name": "since",
+            "in": "query",
+            "description": "Only list actions requested at or after this time",
+            "required": False,
+            "schema": {"type": "string", "format": "date-time"},
+        },
+        {
+            "name": "limit",
+            "in": "query",
+            "description": "Maximum number of actions to list",
+            "required": False,
+            "schema": {"type": "integer"},
+        },
+        {
+            "name": "cursor",
+            "in": "query",
+            "description": "Continue the list from a previous page",
+            "required": False,
+            "schema": {"type": "integer"},
+        },
+    ]
 
     get.responses = {
         "200": {
             "description": "List of Action objects",
             "content": {"application/json": {"schema": ActionSchema(many=True)}},
-        }
+        },
+        "304": {"description": "No actions have changed"},
+        "400": {"description": "Invalid query parameter"},
     }
 
 
@@ -50,6 +135,8 @@ class ActionObjectView(View):
 
     parameters = [TASK_ID_PARAMETER]
 
+    max_wait: float = 30  # Longest time, in seconds, a GET request may wait
+
     @described_operation
     def get(self, task_id):
         """Show the status of an Action
@@ -57,15 +144,43 @@ class ActionObjectView(View):
         A `GET` request will return the current status
         of an action, including logs.  For completed
         actions, it will include the return value.
+
+        With a `wait` parameter, the request waits (up to
+        `wait` seconds) until the status, progress or data
+        of the action change, before returning. Pass the
+        `version` of the last response as `since` to wait
+        for changes after that response.
         """
-        task_dict = current_labthing().actions.to_dict()
+        task = current_labthing().actions.get(task_id)
 
-        if task_id not in task_dict:
+        if task is None:
             return abort(404)  # 404 Not Found
 
-        task = task_dict.get(task_id)
+        wait = request.args.get("wait", type=float)
+        if wait is not None:
+            task.wait_for_change(
+                since=request.args.get("since", type=int),
+                timeout=min(max(wait, 0), self.max_wait),
+            )
 
-        return ActionSchema().dump(task)
+        return sparse_schema(_action_schema).dump(task)
+
+    get.parameters = [
+        {
+            "name": "wait",
+            "in": "query",
+            "description": "Wait up to this many seconds for the action to change",
+            "required": False,
+            "schema": {"type": "number"},
+        },
+        {
+            "name": "since",
+            "in": "query",
+            "description": "Wait for changes after this action version",
+            "required": False,
+            "schema": {"type": "integer"},
+        },
+    ]
 
     get.responses = {
         "200": {
@@ -83,14 +198,12 @@ class ActionObjectView(View):
         A `DELETE` request will stop a running action.
         """
         timeout = args.get("timeout", None)
-        task_dict = current_labthing().actions.to_dict()
+        task = current_labthing().actions.get(task_id)
 
-        if task_id not in task_dict:
+        if task is None:
             return abort(404)  # 404 Not Found
-
-        task = task_dict.get(task_id)
         task.stop(timeout=timeout)
-        return ActionSchema().dump(task)
+        return sparse_schema(_action_schema).dump(task)
 
     delete.responses = {
         "200": {
@@ -99,3 +212,163 @@ class ActionObjectView(View):
         },
         "404": {"description": "Action not found"},
     }
+
+
+# Raw representations offered for each kind of return value, besides JSON
+RAW_OUTPUT_MIMETYPES = {
+    "bytes": "application/octet-stream",
+    "array": "application/octet-stream",
+    "str": "text/plain",
+}
+
+
+def _output_kind(task) -> Optional[str]:
+    """Find which raw representation, if any, suits an action's return value"""
+    if task.stored_output is not None:
+        return task.stored_output.kind
+    output = task.output
+    if isinstance(output, (bytes, bytearray, memoryview)):
+        return "bytes"
+    if isinstance(output, str):
+        return "str"
+    if hasattr(output, "dtype") and hasattr(output, "tobytes"):
+        return "array"
+    return None
+
+
+def _etag_suffix(mimetype: str) -> str:
+    return mimetype.split(";")[0].replace("/", "-")
+
+
+def _set_array_headers(response: Response, dtype, shape):
+    """Add the metadata needed to rebuild an array from its raw data"""
+    response.headers["X-Array-Dtype"] = str(dtype)
+    response.headers["X-Array-Shape"] = ",".join(str(n) for n in shape)
+
+
+class ActionOutputView(View):
+    """Return value of a particular action.
+
+    The return value is sent as JSON, or in a raw binary or text
+    representation if requested with an ``Accept`` header. Return
+    values of completed actions support ``Range`` requests, so that
+    large results can be downloaded in parts, or resumed.
+    """
+
+    parameters = [TASK_ID_PARAMETER]
+
+    @described_operation
+    def get(self, task_id):
+        """Return value of an Action
+
+        A `GET` request will return just the return value of
+        an action, without the rest of the action description.
+        Large return values are only available here.
+        """
+        task = current_labthing().actions.get(task_id)
+
+        if task is None:
+            return abort(404)  # 404 Not Found
+
+        stored = task.stored_output
+        if stored is not None and stored.expired:
+            return abort(410)  # 410 Gone, evicted from the result store
+
+        kind = _output_kind(task)
+        offered = list(self.representations)
+        if kind is not None:
+            offered.append(RAW_OUTPUT_MIMETYPES[kind])
+        mimetype = request.accept_mimetypes.best_match(offered, default=offered[0])
+
+        if mimetype in self.representations:
+            response = self.representations[mimetype](task.output, 200, {})
+            response.headers["Content-Type"] = mimetype
+        elif stored is not None and stored.spilled:
+            # Stream spilled files straight from disk, reading only the range asked for
+            try:
+                response = send_file(stored.path, mimetype=mimetype, conditional=True)
+            except OSError:
+                return abort(410)  # Evicted while we were finding it
+            if kind == "array":
+                # Spilled arrays are stored as their raw C-ordered data
+                _set_array_headers(response, stored.dtype, stored.shape)
+            # Advertise range support on full responses too
+            response.headers["Accept-Ranges"] = "bytes"
+            return response
+        else:
+            response = self._raw_response(task.output, kind, mimetype)
+
+        # Finished return values never change, so can be cached and resumed
+        if task.status == "completed":
+            response.set_etag(f"{task.id}-{_etag_suffix(mimetype)}")
+            response.last_modified = task._end_time  # pylint: disable=protected-access
+            response.make_conditional(
+                request, accept_ranges=True, complete_length=response.content_length
+            )
+            response.headers["Accept-Ranges"] = "bytes"
+        return response
+
+    get.responses = {
+        "200": {
+            "description": "Action return value",
+            "content": {
+                "application/json": {},
+                "application/octet-stream": {},
+                "text/plain": {},
+            },
+        },
+        "206": {"description": "Part of the action return value"},
+        "404": {"description": "Action not found"},
+        "410": {"description": "Action return value no longer available"},
+    }
+
+    @staticmethod
+    def _raw_response(output, kind: str, mimetype: str) -> Response:
+        """Build a raw binary or text response for a return value"""
+        if output is None:
+            return abort(410)  # Evicted from the result store
+        if kind == "str":
+            return Response(output.encode(), mimetype=mimetype)
+        if kind == "array":
+            # C-ordered array data, with enough metadata to rebuild the array
+            response = Response(output.tobytes(), mimetype=mimetype)
+            _set_array_headers(response, output.dtype, output.shape)
+            return response
+        return Response(bytes(output), mimetype=mimetype)
+
+
+class ActionDataView(View):
+    """Data added by a particular action while it runs."""
+
+    parameters = [TASK_ID_PARAMETER]
+
+    @described_operation
+    def get(self, task_id):
+        """Data updates of an Action
+
+        A `GET` request will return the data added by the action
+        so far, and its latest sequence number as `seq`. Pass the
+        `seq` of the last response as `since` to get only newer
+        updates, as a list of `updates`. If those updates are no
+        longer kept, the complete `data` is returned instead.
+        """
+        task = current_labthing().actions.get(task_id)
+
+        if task is None:
+            return abort(404)  # 404 Not Found
+
+        return task.data_since(request.args.get("since", type=int))
+
+    get.parameters = [
+        {
+            "name": "since",
+            "in": "query",
+            "description": "Only return data updates after this sequence number",
+            "required": False,
+            "schema": {"type": "integer"},
+        }
+    ]
+    get.responses = {
+        "200": {"description": "Action data, or data updates"},
+        "404": {"description": "Action not found"},
+    }
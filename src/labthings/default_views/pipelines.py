@@ -0,0 +1,74 @@
+from flask import abort
+
+from .. import fields
+from ..find import current_labthing
+from ..marshalling import sparse_schema, use_args
+from ..schema import ActionSchema, Schema
+from ..views import View, described_operation
+
+# Shared schema instances, so that restricted copies for `?fields=` are reused
+_action_schema = ActionSchema()
+_action_list_schema = ActionSchema(many=True)
+
+PipelineStepSchema = Schema.from_dict(
+    {
+        "name": fields.String(),
+        "action": fields.String(required=True),
+        "args": fields.Dict(),
+        "inputs": fields.Dict(keys=fields.String(), values=fields.String()),
+        "after": fields.List(fields.String()),
+    },
+    name="PipelineStepSchema",
+)
+
+
+class PipelineListView(View):
+    """Chains of Actions, run on the server as a single Action"""
+
+    @described_operation
+    def get(self):
+        """List pipelines
+
+        This endpoint returns the Actions running, or that ran,
+        a pipeline.
+        """
+        tasks, _ = current_labthing().actions.query(action="pipeline")
+        return sparse_schema(_action_list_schema).dump(tasks)
+
+    get.responses = {
+        "200": {
+            "description": "List of Action objects",
+            "content": {"application/json": {"schema": ActionSchema(many=True)}},
+        }
+    }
+
+    @described_operation
+    @use_args({"steps": fields.List(fields.Nested(PipelineStepSchema), required=True)})
+    def post(self, args):
+        """Run a pipeline
+
+        A `POST` request starts a single Action that runs each of
+        `steps` in turn. Each step names an `action`, and may give
+        fixed `args`, and `inputs` mapping argument names to the
+        output of an earlier step (`"step"`) or to one of its keys
+        (`"step.key"`). Steps run after the step before them, or
+        after the steps listed in `after`, so that steps after the
+        same step run in parallel. The Action's output holds the
+        output of each step, and its data the progress of each step.
+        """
+        try:
+            task = current_labthing().run_pipeline(args["steps"])
+        except KeyError as e:
+            return abort(404, description=f"No action named {e}")
+        except ValueError as e:
+            return abort(400, description=str(e))
+        return sparse_schema(_action_schema).dump(task), 201
+
+    post.responses = {
+        "201": {
+            "description": "Action object running the pipeline",
+            "content": {"application/json": {"schema": ActionSchema}},
+        },
+        "400": {"description": "Steps don't form a valid pipeline"},
+        "404": {"description": "Action not found"},
+    }
@@ -0,0 +1,135 @@
+from flask import abort
+from marshmallow import ValidationError
+
+from .. import fields
+from ..find import current_labthing
+from ..marshalling import sparse_schema, use_args
+from ..schema import ScheduleSchema, validate
+from ..views import View, described_operation
+
+# Shared schema instances, so that restricted copies for `?fields=` are reused
+_schedule_schema = ScheduleSchema()
+_schedule_list_schema = ScheduleSchema(many=True)
+
+# Shortest period, in seconds, of schedules created over HTTP, so that clients
+# can't keep an action running almost continuously
+MIN_PERIOD = 1.0
+
+
+class ScheduleListView(View):
+    """Periodic and delayed runs of Actions"""
+
+    @described_operation
+    def get(self):
+        """List schedules
+
+        This endpoint returns a list of all Action schedules,
+        including ones that have finished.
+        """
+        return sparse_schema(_schedule_list_schema).dump(
+            current_labthing().scheduler.schedules()
+        )
+
+    get.responses = {
+        "200": {
+            "description": "List of Schedule objects",
+            "content": {"application/json": {"schema": ScheduleSchema(many=True)}},
+        }
+    }
+
+    @described_operation
+    @use_args(
+        {
+            "action": fields.String(required=True),
+            "args": fields.Raw(),
+            "period": fields.Float(validate=validate.Range(min=MIN_PERIOD)),
+            "delay": fields.Float(validate=validate.Range(min=0)),
+            "at": fields.DateTime(),
+            "count": fields.Integer(validate=validate.Range(min=1)),
+            "overrun": fields.String(
+                validate=validate.OneOf(["skip", "queue", "coalesce"])
+            ),
+        }
+    )
+    def post(self, args):
+        """Schedule an Action
+
+        A `POST` request starts the Action named by `action`, with
+        arguments `args`, every `period` seconds (at least 1). Without a
+        `period`, the Action runs once. The first run starts after `delay`
+        seconds, or at time `at`, or straight away. `count` limits
+        the number of runs, and `overrun` decides what happens when
+        a run is due while the previous run is still going: `skip`
+        it, `queue` it, or `coalesce` any number of late runs into one.
+        """
+        labthing = current_labthing()
+        action = args.pop("action")
+        arguments = args.pop("args", None)
+        try:
+            schedule = labthing.schedule(action, arguments, **args)
+        except KeyError:
+            return abort(404, description=f"No action named {action}")
+        except ValidationError as e:
+            return abort(422, description=f"Invalid args: {e.messages}")
+        return _schedule_schema.dump(schedule), 201
+
+    post.responses = {
+        "201": {
+            "description": "Schedule object",
+            "content": {"application/json": {"schema": ScheduleSchema}},
+        },
+        "404": {"description": "Action not found"},
+        "422": {"description": "Invalid schedule or arguments"},
+    }
+
+
+SCHEDULE_ID_PARAMETER = {
+    "name": "schedule_id",
+    "in": "path",
+    "description": "The unique ID of the schedule",
+    "required": True,
+    "schema": {"type": "string"},
+    "example": "eeae7ae9-0c0d-45a4-9ef2-7b84bb67a1d1",
+}
+
+
+class ScheduleView(View):
+    """Manage a particular schedule.
+
+    GET will return the state of the schedule.
+    DELETE will cancel it. Runs already started carry on.
+    """
+
+    parameters = [SCHEDULE_ID_PARAMETER]
+
+    @described_operation
+    def get(self, schedule_id):
+        """Show the state of a schedule"""
+        schedule = current_labthing().scheduler.get(schedule_id)
+        if schedule is None:
+            return abort(404)  # 404 Not Found
+        return sparse_schema(_schedule_schema).dump(schedule)
+
+    get.responses = {
+        "200": {
+            "description": "Schedule object",
+            "content": {"application/json": {"schema": ScheduleSchema}},
+        },
+        "404": {"description": "Schedule not found"},
+    }
+
+    @described_operation
+    def delete(self, schedule_id):
+        """Cancel a schedule"""
+        schedule = current_labthing().scheduler.cancel(schedule_id)
+        if schedule is None:
+            return abort(404)  # 404 Not Found
+        return _schedule_schema.dump(schedule)
+
+    delete.responses = {
+        "200": {
+            "description": "Schedule object that was cancelled",
+            "content": {"application/json": {"schema": ScheduleSchema}},
+        },
+        "404": {"description": "Schedule not found"},
+    }
@@ -33,6 +33,15 @@ class SerializedExceptionHandler:
 
         status_code = error.code if isinstance(error, HTTPException) else 500
 
+        # Keep extra headers (e.g. Retry-After), but serialise the body ourselves
+        headers = {}
+        if isinstance(error, HTTPException):
+            headers = {
+                key: value
+                for key, value in error.get_headers()
+                if key.lower() != "content-type"
+            }
+
         response = {
             "code": status_code,
             "message": escape(message),
@@ -40,7 +49,7 @@ class SerializedExceptionHandler:
             or getattr(getattr(error, "__class__", None), "__name__", None)
             or None,
         }
-        return (response, status_code)
+        return (response, status_code, headers)
 
     def init_app(self, app):
         """
@@ -1,32 +1,50 @@
 import logging
 import uuid
 import weakref
+from functools import partial
 from json import JSONEncoder
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
 
 from apispec import APISpec
 from apispec_webframeworks.flask import FlaskPlugin
 from flask import Flask, url_for
 
 from .actions.pool import Pool
+from .actions.pipeline import PipelineStep, check_pipeline, run_pipeline
+from .actions.results import ResultStore
+from .actions.scheduler import Schedule, Scheduler
+from .actions.thread import ActionThread, action_log_dispatcher
 from .apispec import FlaskLabThingsPlugin, MarshmallowPlugin
-from .default_views.actions import ActionObjectView, ActionQueueView
+from .default_views.actions import (
+    ActionDataView,
+    ActionObjectView,
+    ActionOutputView,
+    ActionQueueView,
+)
 from .default_views.docs import SwaggerUIView, docs_blueprint
 from .default_views.events import LoggingEventView
 from .default_views.extensions import ExtensionList
+from .default_views.pipelines import PipelineListView
 from .default_views.root import RootView
+from .default_views.schedules import ScheduleListView, ScheduleView
 from .extensions import BaseExtension
 from .httperrorhandler import SerializedExceptionHandler
 from .json.encoder import LabThingsJSONEncoder
 from .logging import LabThingLogger
 from .names import (
+    ACTION_DATA_ENDPOINT,
     ACTION_ENDPOINT,
     ACTION_LIST_ENDPOINT,
+    ACTION_OUTPUT_ENDPOINT,
     EXTENSION_LIST_ENDPOINT,
     EXTENSION_NAME,
     LOG_EVENT_ENDPOINT,
+    PIPELINE_LIST_ENDPOINT,
+    SCHEDULE_ENDPOINT,
+    SCHEDULE_LIST_ENDPOINT,
 )
 from .representations import DEFAULT_REPRESENTATIONS
+from .retention import Reaper, RetentionPolicy
 from .td import ThingDescription
 from .utilities import clean_url_string, snake_to_camel
 from .views import ActionView, EventView, PropertyView, View
@@ -62,6 +80,27 @@ class LabThing:
     :param external_links: Use external links in Thing Description where possible
     :type external_links: bool
     :param json_encoder: JSON encoder class for the app
+    :param action_workers: Maximum number of worker threads used to run Actions.
+        If None, each Action is started in a new thread.
+    :type action_workers: int
+    :param action_queue_size: Maximum number of Actions waiting for a free worker.
+        Zero means unbounded. Only used with ``action_workers``.
+    :type action_queue_size: int
+    :param result_store: Store for the return values of completed Actions,
+        which spills large return values to disk. Defaults to a
+        :class:`labthings.actions.ResultStore` with default limits.
+    :type result_store: ResultStore
+    :param action_retention: Limits on the finished Actions kept, applied
+        in the background every ``reap_interval`` seconds.
+    :type action_retention: RetentionPolicy
+    :param event_retention: Limits on the Events kept, for Event views that
+        don't set their own ``retention``.
+    :type event_retention: RetentionPolicy
+    :param reap_interval: Time in seconds between applying retention limits
+    :type reap_interval: float
+    :param compact_actions: Replace finished Actions with compact records,
+        freeing their threads, so that more of them can be retained
+    :type compact_actions: bool
     """
 
     def __init__(
@@ -76,6 +115,13 @@ class LabThing:
         format_flask_exceptions: bool = True,
         external_links: bool = True,
         json_encoder=LabThingsJSONEncoder,
+        action_workers: Optional[int] = None,
+        action_queue_size: int = 0,
+        result_store: Optional[ResultStore] = None,
+        action_retention: Optional[RetentionPolicy] = None,
+        event_retention: Optional[RetentionPolicy] = None,
+        reap_interval: float = 60,
+        compact_actions: bool = False,
     ):
         if id_ is None:
             self.id = f"{title}:{uuid.uuid4()}".replace(" ", "")
@@ -92,7 +138,16 @@ class LabThing:
             str, BaseExtension
         ] = {}  # Dictionary of LabThings extension objects
 
-        self.actions = Pool()  # Pool of threads for Actions
+        self.actions = Pool(
+            max_workers=action_workers,
+            max_queue=action_queue_size,
+            result_store=result_store if result_store is not None else ResultStore(),
+            retention=action_retention,
+            compact=compact_actions,
+        )  # Pool of threads for Actions
+        self.event_retention: Optional[RetentionPolicy] = event_retention
+        # Periodic and delayed Actions, started from a thread of its own
+        self.scheduler: Scheduler = Scheduler()
 
         self.views: List[Tuple] = []  # List of View classes
         self._property_views: Dict[
@@ -121,6 +176,14 @@ class LabThing:
         # Logging handler
         self.log_handler: LabThingLogger = LabThingLogger(self)
         logging.getLogger().addHandler(self.log_handler)
+        # Single handler capturing the logs of every Action
+        action_log_dispatcher()
+
+        # Background thread applying retention limits to Actions and Events
+        self.reaper: Reaper = Reaper(interval=reap_interval)
+        self.reaper.add(self.reap)
+        if action_retention or event_retention:
+            self.reaper.start()
 
         # Representation formatter map
         self.representations: Dict[str, Callable] = DEFAULT_REPRESENTATIONS
@@ -268,6 +331,21 @@ class LabThing:
         self.add_view(ActionQueueView, "/actions", endpoint=ACTION_LIST_ENDPOINT)
         self.add_root_link(ActionQueueView, "actions")
         self.add_view(ActionObjectView, "/actions/<task_id>", endpoint=ACTION_ENDPOINT)
+        self.add_view(
+            ActionOutputView,
+            "/actions/<task_id>/output",
+            endpoint=ACTION_OUTPUT_ENDPOINT,
+        )
+        self.add_view(
+            ActionDataView, "/actions/<task_id>/data", endpoint=ACTION_DATA_ENDPOINT
+        )
+        self.add_view(PipelineListView, "/pipelines", endpoint=PIPELINE_LIST_ENDPOINT)
+        self.add_root_link(PipelineListView, "pipelines")
+        self.add_view(ScheduleListView, "/schedules", endpoint=SCHEDULE_LIST_ENDPOINT)
+        self.add_root_link(ScheduleListView, "schedules")
+        self.add_view(
+            ScheduleView, "/schedules/<schedule_id>", endpoint=SCHEDULE_ENDPOINT
+        )
         # Add event routes
         self.add_view(LoggingEventView, "/events/logging", endpoint=LOG_EVENT_ENDPOINT)
 
@@ -440,6 +518,8 @@ class LabThing:
         resource_class_kwargs = kwargs.pop("resource_class_kwargs", {})
 
         view.endpoint = endpoint
+        # Build request parsers and marshallers once, rather than per request
+        view.build_dispatch_chains()
         resource_func = view.as_view(
             endpoint, *resource_class_args, **resource_class_kwargs
         )
@@ -467,6 +547,81 @@ class LabThing:
         if issubclass(view, EventView):
             self.thing_description.event(flask_rules, view)
             self._event_views[view.endpoint] = view
+            # Limits set on the view itself also need the reaper running
+            if view.retention is not None:
+                self.reaper.start()
+
+    def schedule(
+        self,
+        action: Union[str, Type[ActionView]],
+        arguments: Any = None,
+        **kwargs,
+    ) -> Schedule:
+        """Start an Action periodically, or after a delay
+
+        Runs are started by :attr:`scheduler`, with the same arguments each time.
+        See :meth:`labthings.actions.Scheduler.add` for the timing options.
+
+        :param action: ActionView class, or the endpoint of a registered one
+        :param arguments: Arguments, as they would be sent in a request body
+        :param **kwargs: Options passed to :meth:`labthings.actions.Scheduler.add`
+        :raises KeyError: if no Action is registered with the endpoint
+        :raises ValidationError: if the arguments are invalid
+        :returns: The new Schedule
+
+        """
+        view = self._action_views[action] if isinstance(action, str) else action
+        # Check the arguments now, rather than on every run
+        if view.args:
+            view.dispatch_chain("POST").load({} if arguments is None else arguments)
+        start = partial(view.invoke, arguments, self.actions, self.app)
+        return self.scheduler.add(start, name=view.endpoint, **kwargs)
+
+    def run_pipeline(self, steps: List[Dict[str, Any]]) -> ActionThread:
+        """Run a pipeline of Actions, as a single Action
+
+        Each step is a dictionary with the endpoint of a registered Action as
+        ``action``, and optionally its fixed ``args``, its ``inputs`` taken from
+        the outputs of earlier steps, the ``after`` steps it waits for, and a
+        ``name`` (defaulting to the Action endpoint).
+        See :class:`labthings.actions.pipeline.PipelineStep`.
+
+        :param steps: List of steps
+        :raises KeyError: if no Action is registered with a step's endpoint
+        :raises ValueError: if the steps don't form a valid pipeline
+        :returns: ActionThread running the pipeline
+
+        """
+        pipeline = []
+        for step in steps:
+            view = self._action_views[step["action"]]
+            pipeline.append(
+                PipelineStep(
+                    step.get("name") or step["action"],
+                    partial(view.call, pool=self.actions),
+                    args=step.get("args"),
+                    inputs=step.get("inputs"),
+                    after=step.get("after"),
+                )
+            )
+        check_pipeline(pipeline)
+        return self.actions.spawn(
+            "pipeline",
+            run_pipeline,
+            pipeline,
+            self.actions.step_executor,
+            app=self.app,
+            # Steps run on the pool's workers, so don't hold one while waiting
+            pooled=False,
+        )
+
+    def reap(self):
+        """Drop finished Actions and Events beyond their retention limits"""
+        self.actions.reap()
+        for action_view in self._action_views.values():
+            action_view.reap(self.actions)
+        for event_view in set(self._event_views.values()):
+            event_view.reap(self.event_retention)
 
     def emit(self, event_type: str, data: dict):
         """Find a matching event type if one exists, and emit some data to it
@@ -1,4 +1,5 @@
 from .args import use_args
-from .marshalling import marshal_with
+from .compiled import compile_schema
+from .marshalling import marshal_with, sparse_schema
 
-__all__ = ["use_args", "marshal_with"]
+__all__ = ["use_args", "marshal_with", "sparse_schema", "compile_schema"]
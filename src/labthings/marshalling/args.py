@@ -1,16 +1,50 @@
 import logging
 from functools import update_wrapper, wraps
-from typing import Callable, Mapping, Union
+from typing import Any, Callable, Mapping, Union
 
 from flask import abort, request
 from marshmallow.exceptions import ValidationError
 from webargs import flaskparser
+from webargs.core import missing
 
 from ..fields import Field
 from ..schema import FieldSchema, Schema
 
 
+def request_json() -> Any:
+    """JSON body of the current request.
+
+    The body is decoded by Flask the first time it is asked for, and cached on
+    the request, so every reader of the body (argument parsing, recording an
+    action's input) shares one decode.
+
+    :returns: Decoded body, or None if the request has no valid JSON body
+
+    """
+    return request.get_json(silent=True)
+
+
+class CachedJSONParser(flaskparser.FlaskParser):
+    """FlaskParser reading JSON bodies through :func:`request_json`,
+    rather than decoding the body again for every parse"""
+
+    def _raw_load_json(self, req):
+        if not flaskparser.is_json_request(req):
+            return missing
+        data = req.get_json(silent=True)
+        if data is None:
+            # Invalid JSON, or a literal null, is left to webargs to report
+            return super()._raw_load_json(req)
+        return data
+
+
+parser = CachedJSONParser()
+
+
 def use_body(schema: Field, **_) -> Callable:
+    # Built once, rather than for every request
+    deserialize = schema.deserialize
+
     def inner(f: Callable):
         # Wrapper function
         @wraps(f)
@@ -22,7 +56,7 @@ def use_body(schema: Field, **_) -> Callable:
 
             """
             # Get data from request
-            data = request.get_json(silent=True) or request.data or None
+            data = request_json() or request.data or None
 
             # If no data is there
             if not data:
@@ -37,7 +71,7 @@ def use_body(schema: Field, **_) -> Callable:
             # Serialize data if it exists
             if data:
                 try:
-                    data = FieldSchema(schema).deserialize(data)
+                    data = deserialize(data)
                 except ValidationError as e:
                     logging.error(e)
                     return abort(400)
@@ -59,9 +93,39 @@ class use_args:
         if isinstance(schema, Field):
             self.wrapper = use_body(schema, **kwargs)
         else:
-            self.wrapper = flaskparser.use_args(schema, **kwargs)
+            self.wrapper = parser.use_args(schema, **kwargs)
 
     def __call__(self, f: Callable):
         # Wrapper function
         update_wrapper(self.wrapper, f)
         return self.wrapper(f)
+
+
+def args_loader(
+    schema: Union[Schema, Field, Mapping[str, Field]]
+) -> Callable[[Any], Any]:
+    """Build a function deserializing arguments the way `use_args` would, from
+    data instead of a request. The schema is only built once, however many
+    times the function is called.
+
+    :param schema: Schema, Field, or dictionary of Fields for the arguments
+    :returns: Function taking data, and returning the deserialized arguments.
+        It raises ValidationError if the data is invalid.
+
+    """
+    if isinstance(schema, Field):
+        return FieldSchema(schema).deserialize
+    if isinstance(schema, Mapping):
+        schema = Schema.from_dict(dict(schema))()
+    return schema.load
+
+
+def load_args(schema: Union[Schema, Field, Mapping[str, Field]], data: Any) -> Any:
+    """Deserialize arguments the way `use_args` would, from data instead of a request
+
+    :param schema: Schema, Field, or dictionary of Fields for the arguments
+    :param data: Data to deserialize
+    :raises ValidationError: if the data is invalid
+
+    """
+    return args_loader(schema)(data)
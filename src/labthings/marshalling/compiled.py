@@ -0,0 +1,255 @@
+import datetime
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from marshmallow import Schema as _Schema
+from marshmallow import fields as _fields
+from marshmallow import missing
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.utils import get_value
+
+from ..fields import Bytes
+from ..schema import FieldSchema
+
+__all__ = ["compile_schema", "compile_field"]
+
+# Serialises a single value, as a field's `_serialize` method would
+ValueSerializer = Callable[[Any], Any]
+
+
+def _identity(value):
+    return value
+
+
+def _field_default(field: _fields.Field):
+    """Value used for a field when the attribute is missing"""
+    try:
+        return field.dump_default
+    except AttributeError:  # marshmallow < 3.13
+        return field.default
+
+
+def _number_serializer(field: _fields.Number) -> ValueSerializer:
+    num_type = field.num_type
+    if field.as_string:
+        return lambda value: None if value is None else str(num_type(value))
+    return lambda value: None if value is None else num_type(value)
+
+
+def _string_serializer(_) -> ValueSerializer:
+    def serialize(value):
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return str(value)
+
+    return serialize
+
+
+def _boolean_serializer(field: _fields.Boolean) -> ValueSerializer:
+    truthy, falsy = field.truthy, field.falsy
+
+    def serialize(value):
+        if value is None:
+            return None
+        try:
+            if value in truthy:
+                return True
+            if value in falsy:
+                return False
+        except TypeError:
+            pass
+        return bool(value)
+
+    return serialize
+
+
+def _datetime_serializer(field: _fields.DateTime) -> ValueSerializer:
+    data_format = field.format or field.DEFAULT_FORMAT
+    format_func = field.SERIALIZATION_FUNCS.get(data_format)
+
+    def serialize(value: datetime.datetime):
+        if value is None:
+            return None
+        if format_func:
+            return format_func(value)
+        return value.strftime(data_format)
+
+    return serialize
+
+
+def _value_serializer(
+    field: _fields.Field, compiling: Set[type]
+) -> Optional[ValueSerializer]:
+    """Build a function serialising values as the field would, if it's a field
+    we know how to serialise. Subclasses may override how values are
+    serialised, so only exact field types are matched.
+
+    :param field: Bound marshmallow field
+    :param compiling: Classes of the schemas being compiled, to stop at
+        schemas nested in themselves
+    :returns: Value serializer, or None to fall back to the field itself
+
+    """
+    kind = type(field)
+    if kind in (_fields.Raw, Bytes):
+        # Neither changes values when serialising
+        return _identity
+    if kind in (_fields.Integer, _fields.Float):
+        return _number_serializer(field)
+    if kind is _fields.String:
+        return _string_serializer(field)
+    if kind is _fields.Boolean:
+        return _boolean_serializer(field)
+    if kind is _fields.DateTime:
+        return _datetime_serializer(field)
+    if kind is _fields.List:
+        inner = _value_serializer(field.inner, compiling)
+        if inner is None:
+            return None
+        return lambda value: None if value is None else [inner(v) for v in value]
+    if kind is _fields.Nested:
+        schema = field.schema
+        if type(schema) in compiling:
+            return None
+        dump = _compile_schema(schema, compiling)
+        many = bool(schema.many or field.many)
+        return lambda value: None if value is None else dump(value, many=many)
+    return None
+
+
+def _has_dump_hooks(schema: _Schema) -> bool:
+    """Does a schema have pre_dump or post_dump processors"""
+    for tag, hooks in getattr(schema, "_hooks", {}).items():
+        # Older versions of marshmallow key hooks by (tag, pass_many)
+        name = tag[0] if isinstance(tag, tuple) else tag
+        if hooks and name in (PRE_DUMP, POST_DUMP):
+            return True
+    return False
+
+
+def _compile_schema(schema: _Schema, compiling: Set[type]) -> Callable:
+    """Compile a schema, or find its compiled dump function.
+    See :func:`compile_schema`"""
+    # Schemas overriding marshmallow's private _serialize are left to marshmallow,
+    # and compiled functions are cached on the schema
+    # pylint: disable=protected-access
+    compiled = schema.__dict__.get("_compiled_dump")
+    if compiled is not None:
+        return compiled
+
+    if isinstance(schema, FieldSchema):
+        compiled = _compile_field_schema(schema, compiling)
+    elif (
+        type(schema).dump is not _Schema.dump
+        or type(schema)._serialize is not _Schema._serialize
+        or _has_dump_hooks(schema)
+    ):
+        # Processors and overrides can do anything, so leave them to marshmallow
+        compiled = schema.dump
+    else:
+        compiled = _compile_fields(schema, compiling | {type(schema)})
+    schema._compiled_dump = compiled
+    return compiled
+
+
+def _compile_field_schema(schema: FieldSchema, compiling: Set[type]) -> Callable:
+    """Compile the dump function of a single field"""
+    field = schema.field
+    serializer = _value_serializer(field, compiling)
+    if serializer is None or not field._CHECK_ATTRIBUTE:  # pylint: disable=W0212
+        return schema.dump
+    default = _field_default(field)
+
+    # Takes `many` like schema.dump, though a single field has no use for it
+    def dump(  # pylint: disable=unused-argument
+        value: Any, many: Optional[bool] = None
+    ):
+        if value is missing:
+            value = default() if callable(default) else default
+            if value is missing:
+                return value
+        return serializer(value)
+
+    return dump
+
+
+def _compile_fields(schema: _Schema, compiling: Set[type]) -> Callable:
+    """Compile the dump function of a schema without processors"""
+    if type(schema).get_attribute is _Schema.get_attribute:
+        accessor = get_value
+    else:
+        accessor = schema.get_attribute
+    dict_class = schema.dict_class
+    schema_many = schema.many
+
+    # Tuples of output key, value serializer (or None to call the field
+    # itself), attribute to read, default value, and field
+    entries: List[Tuple[str, Optional[ValueSerializer], str, Any, _fields.Field]] = []
+    for attr_name, field in schema.dump_fields.items():
+        key = field.data_key if field.data_key is not None else attr_name
+        serializer = None
+        # Fields that don't read an attribute (e.g. Method) serialise themselves
+        if field._CHECK_ATTRIBUTE:  # pylint: disable=W0212
+            serializer = _value_serializer(field, compiling)
+        if serializer is None:
+            entries.append((key, None, attr_name, missing, field))
+        else:
+            attribute = field.attribute if field.attribute is not None else attr_name
+            entries.append((key, serializer, attribute, _field_default(field), field))
+
+    def serialize(obj: Any):
+        ret = dict_class()
+        for key, serializer, attribute, default, field in entries:
+            if serializer is None:
+                value = field.serialize(attribute, obj, accessor=accessor)
+                if value is missing:
+                    continue
+            else:
+                value = accessor(obj, attribute, missing)
+                if value is missing:
+                    value = default() if callable(default) else default
+                    if value is missing:
+                        continue
+                value = serializer(value)
+            ret[key] = value
+        return ret
+
+    def dump(obj: Any, many: Optional[bool] = None):
+        many = schema_many if many is None else bool(many)
+        if many and obj is not None:
+            return [serialize(item) for item in obj]
+        return serialize(obj)
+
+    return dump
+
+
+def compile_schema(schema: _Schema) -> Callable:
+    """Build a function serialising objects as ``schema.dump`` would.
+
+    Common fields (``Integer``, ``Float``, ``String``, ``Boolean``, ``List``,
+    ``Nested``, ``DateTime``, ``Raw`` and ``Bytes``) are serialised by
+    specialised functions, built once, rather than going through marshmallow
+    for every value. Other fields are serialised by the fields themselves.
+    Schemas with ``pre_dump`` or ``post_dump`` processors, or that override
+    ``dump``, are left to marshmallow entirely.
+
+    The compiled function is kept on the schema, so each schema instance is
+    only compiled once.
+
+    :param schema: Schema instance
+    :returns: Function taking an object (and optionally ``many``), and
+        returning the serialised data
+
+    """
+    return _compile_schema(schema, set())
+
+
+def compile_field(field: _fields.Field) -> Callable:
+    """Build a function serialising values as a single field
+
+    :param field: Marshmallow field
+    :returns: Function taking a value, and returning the serialised value
+
+    """
+    return compile_schema(FieldSchema(field))
@@ -1,13 +1,19 @@
+import inspect
+import threading
+import weakref
+from collections import OrderedDict
 from collections.abc import Mapping
 from functools import wraps
-from typing import Callable, Dict, Optional, Tuple, Union
+from typing import Callable, Dict, FrozenSet, Optional, Tuple, Union
 
+from flask import abort, has_request_context, request
 from marshmallow import Schema as _Schema
 from werkzeug.wrappers import Response as ResponseBase
 
 from ..fields import Field
 from ..schema import FieldSchema, Schema
 from ..utilities import unpack
+from .compiled import compile_schema
 
 
 def schema_to_converter(
@@ -17,22 +23,103 @@ def schema_to_converter(
     which takes a value as an argument and returns
     marshalled data
 
+    Converters are compiled (see :func:`compile_schema`), and keep the
+    schema they were built from as their ``schema`` attribute.
+
     :param schema: Input schema
 
     """
     if isinstance(schema, Mapping):
-        # Please ignore the pylint disable below,
-        # GeneratedSchema definitely does have a `dump` member
-        # pylint: disable=no-member
-        return Schema.from_dict(schema)().dump
+        schema = Schema.from_dict(schema)()
     # Case of schema as a single Field
     elif isinstance(schema, Field):
-        return FieldSchema(schema).dump
-    # Case of schema as a Schema
-    elif isinstance(schema, _Schema):
-        return schema.dump
-    else:
+        schema = FieldSchema(schema)
+    # Anything else must be a Schema
+    elif not isinstance(schema, _Schema):
         return None
+    dump = compile_schema(schema)
+
+    def converter(value):
+        return dump(value)
+
+    converter.schema = schema  # type: ignore
+    return converter
+
+
+# Restricted copies of each schema, by requested fieldset, most recently used last
+_sparse_schemas: "weakref.WeakKeyDictionary[_Schema, OrderedDict]" = (
+    weakref.WeakKeyDictionary()
+)
+_sparse_lock = threading.Lock()
+# Number of restricted copies kept for each schema
+MAX_SPARSE_SCHEMAS = 32
+
+
+def requested_fieldset() -> Tuple[Optional[FrozenSet[str]], FrozenSet[str]]:
+    """Read the `fields` and `exclude` query parameters of the current request
+
+    Both are comma-separated lists of field names, as they appear in responses.
+
+    :returns: Tuple of the fields to include (None for all), and fields to exclude
+
+    """
+    if not has_request_context():
+        return None, frozenset()
+    only = request.args.get("fields")
+    exclude = request.args.get("exclude")
+    return (
+        frozenset(filter(None, only.split(","))) if only is not None else None,
+        frozenset(filter(None, exclude.split(","))) if exclude else frozenset(),
+    )
+
+
+def sparse_schema(schema: _Schema) -> _Schema:
+    """Restrict a schema to the fields requested in the current request
+
+    Fields are selected with the `fields` and `exclude` query parameters,
+    using marshmallow's `only` and `exclude`. Restricted schemas are cached,
+    so each fieldset is only built once per schema.
+
+    :param schema: Schema instance
+    :returns: Restricted schema, or the original schema if no fieldset was requested
+
+    """
+    only, exclude = requested_fieldset()
+    if (only is None and not exclude) or isinstance(schema, FieldSchema):
+        return schema
+    key = (only, exclude)
+    with _sparse_lock:
+        cached = _sparse_schemas.setdefault(schema, OrderedDict())
+        if key in cached:
+            cached.move_to_end(key)
+            return cached[key]
+    restricted = _restrict(schema, only, exclude)
+    with _sparse_lock:
+        cached[key] = restricted
+        while len(cached) > MAX_SPARSE_SCHEMAS:
+            cached.popitem(last=False)
+    return restricted
+
+
+def _restrict(
+    schema: _Schema, only: Optional[FrozenSet[str]], exclude: FrozenSet[str]
+) -> _Schema:
+    """Build a copy of a schema limited to fields, given by their data keys"""
+    names = {field.data_key or name: name for name, field in schema.fields.items()}
+    unknown = sorted((only or frozenset()).union(exclude).difference(names))
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    kwargs = {"context": schema.context} if schema.context else {}
+    return schema.__class__(
+        only=[names[key] for key in only] if only is not None else schema.only,
+        exclude=set(schema.exclude).union(names[key] for key in exclude),
+        many=schema.many,
+        load_only=schema.load_only,
+        dump_only=schema.dump_only,
+        partial=schema.partial,
+        unknown=schema.unknown,
+        **kwargs,
+    )
 
 
 def marshal(response: Union[Tuple, ResponseBase], converter: Callable):
@@ -52,21 +139,53 @@ def marshal(response: Union[Tuple, ResponseBase], converter: Callable):
 
 
 class marshal_with:
-    def __init__(self, schema: Union[Schema, Field, Dict[str, Union[Field, type]]]):
+    def __init__(
+        self,
+        schema: Union[Schema, Field, Dict[str, Union[Field, type]]],
+        sparse: bool = False,
+    ):
         """Decorator to format the return of a function with a Marshmallow schema
 
         :param schema: Marshmallow schema, field, or dict of Fields, describing
                 the format of data to be returned by a View
+        :param sparse: Only include the fields selected by the `fields` and
+                `exclude` query parameters of the request, if given. Off by
+                default, as views may use these parameters themselves.
 
         """
         self.schema = schema
+        self.sparse = sparse
         self.converter = schema_to_converter(self.schema)
 
+    def request_converter(self) -> Callable:
+        """Converter for the fieldset requested in the current request"""
+        schema = getattr(self.converter, "schema", None)
+        if not self.sparse or not isinstance(schema, _Schema):
+            return self.converter
+        restricted = sparse_schema(schema)
+        if restricted is schema:
+            return self.converter
+        return compile_schema(restricted)
+
     def __call__(self, f: Callable):
+        # Views decorate their methods for each request, so pick the fieldset now,
+        # while the request is available (it isn't on the event loop)
+        converter = self.request_converter() if has_request_context() else None
+
+        # Coroutine functions need a coroutine wrapper, to marshal the awaited result
+        if inspect.iscoroutinefunction(f):
+
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                resp = await f(*args, **kwargs)
+                return marshal(resp, converter or self.request_converter())
+
+            return async_wrapper
+
         # Wrapper function
         @wraps(f)
         def wrapper(*args, **kwargs):
             resp = f(*args, **kwargs)
-            return marshal(resp, self.converter)
+            return marshal(resp, converter or self.request_converter())
 
         return wrapper
@@ -1,7 +1,12 @@
 TASK_ENDPOINT = "labthing_task"
 TASK_LIST_ENDPOINT = "labthing_task_list"
 ACTION_ENDPOINT = "labthing_action"
+ACTION_OUTPUT_ENDPOINT = "labthing_action_output"
+ACTION_DATA_ENDPOINT = "labthing_action_data"
 ACTION_LIST_ENDPOINT = "labthing_task_action"
+PIPELINE_LIST_ENDPOINT = "labthing_pipeline_list"
+SCHEDULE_LIST_ENDPOINT = "labthing_schedule_list"
+SCHEDULE_ENDPOINT = "labthing_schedule"
 EXTENSION_LIST_ENDPOINT = "labthing_extension_list"
 EXTENSION_NAME = "flask-labthings"
 LOG_EVENT_ENDPOINT = "logging"
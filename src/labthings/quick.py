@@ -1,3 +1,5 @@
+from typing import Optional
+
 from flask import Flask
 from flask_cors import CORS
 
@@ -15,6 +17,8 @@ def create_app(
     handle_errors: bool = True,
     handle_cors: bool = True,
     flask_kwargs: dict = None,
+    action_workers: Optional[int] = None,
+    action_queue_size: int = 0,
 ):
     """Quick-create a LabThings-enabled Flask app
 
@@ -44,6 +48,12 @@ def create_app(
     :param handle_errors: bool:  (Default value = True)
     :param handle_cors: bool:  (Default value = True)
     :param flask_kwargs: dict:  (Default value = None)
+    :param action_workers: Maximum number of worker threads used to run Actions.
+            If None, each Action is started in a new thread.
+    :type action_workers: int
+    :param action_queue_size: Maximum number of Actions waiting for a free
+            worker. Zero means unbounded.
+    :type action_queue_size: int
     :returns: (Flask app object, LabThings object)
 
     """
@@ -71,6 +81,8 @@ def create_app(
         version=str(version),
         format_flask_exceptions=handle_errors,
         external_links=external_links,
+        action_workers=action_workers,
+        action_queue_size=action_queue_size,
     )
 
     return app, labthing
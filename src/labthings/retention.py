@@ -0,0 +1,139 @@
+import datetime
+import logging
+import threading
+import traceback
+import weakref
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+_LOG = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    """Limits on how many finished actions, or events, are kept around.
+
+    Entries are dropped oldest first, once they are older than ``max_age``,
+    or while there are more than ``max_count`` of them, or while their total
+    size is more than ``max_bytes``. Limits left as None are not applied.
+
+    :param max_count: Maximum number of entries to keep
+    :param max_age: Maximum age, in seconds, of entries to keep
+    :param max_bytes: Maximum total size, in bytes, of entries to keep
+
+    """
+
+    def __init__(
+        self,
+        max_count: Optional[int] = None,
+        max_age: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.max_count: Optional[int] = max_count
+        self.max_age: Optional[float] = max_age
+        self.max_bytes: Optional[int] = max_bytes
+
+    def select(
+        self,
+        entries: Sequence[Tuple[Any, Optional[datetime.datetime], int]],
+        now: Optional[datetime.datetime] = None,
+    ) -> List[Any]:
+        """Pick the entries to drop
+
+        :param entries: Sequence of (key, timestamp, size) tuples, oldest first
+        :param now: Time to measure ages from. Defaults to the current time.
+        :returns: List of keys of entries to drop, oldest first
+
+        """
+        now = now or datetime.datetime.now()
+        count = len(entries)
+        total = sum(size for _, _, size in entries)
+        doomed = []
+        for key, timestamp, size in entries:
+            too_old = (
+                self.max_age is not None
+                and timestamp is not None
+                and (now - timestamp).total_seconds() > self.max_age
+            )
+            too_many = self.max_count is not None and count > self.max_count
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if too_old or too_many or too_big:
+                doomed.append(key)
+                count -= 1
+                total -= size
+        return doomed
+
+
+class Reaper:
+    """Background thread calling cleanup functions every ``interval`` seconds.
+
+    Bound methods are held by weak reference, so that the reaper doesn't keep
+    their objects alive. The thread exits once they have all been collected.
+
+    :param interval: Time in seconds between cleanups (Default value = 60)
+
+    """
+
+    def __init__(self, interval: float = 60):
+        self.interval: float = interval
+        self._functions: List[Callable[[], Optional[Callable]]] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, function: Callable):
+        """Call a function on every cleanup
+
+        :param function: Function taking no arguments
+
+        """
+        if hasattr(function, "__self__"):
+            ref: Callable[[], Optional[Callable]] = weakref.WeakMethod(function)
+        else:
+            ref = lambda: function  # noqa: E731
+        with self._lock:
+            self._functions.append(ref)
+
+    def start(self):
+        """Start the reaper thread, if it isn't already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="labthings-reaper", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the reaper thread
+
+        :param timeout: Time in seconds to wait for the thread to exit
+
+        """
+        self._stopping.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def run_once(self) -> bool:
+        """Call every cleanup function once
+
+        :returns: False if all the cleanup functions have been garbage collected
+
+        """
+        with self._lock:
+            self._functions = [ref for ref in self._functions if ref() is not None]
+            functions = [ref() for ref in self._functions]
+        for function in functions:
+            if function is None:
+                continue
+            try:
+                function()
+            except Exception:  # pylint: disable=broad-except
+                _LOG.error(traceback.format_exc())
+        return bool(functions)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            if not self.run_once():
+                return
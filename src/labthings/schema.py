@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
+import weakref
 from datetime import datetime
 from typing import Any, Dict, Optional, Union
 
 from flask import url_for
-from marshmallow import Schema, pre_dump, pre_load, validate
+from marshmallow import Schema, missing, post_dump, pre_dump, pre_load, validate
 from werkzeug.routing import BuildError
 
 from . import fields
-from .names import ACTION_ENDPOINT, EXTENSION_LIST_ENDPOINT
+from .names import (
+    ACTION_DATA_ENDPOINT,
+    ACTION_ENDPOINT,
+    ACTION_OUTPUT_ENDPOINT,
+    EXTENSION_LIST_ENDPOINT,
+    SCHEDULE_ENDPOINT,
+)
 from .utilities import description_from_view, view_class_from_endpoint
 
 __all__ = ["Schema", "pre_load", "pre_dump", "validate", "FuzzySchemaType"]
@@ -50,9 +58,7 @@ class FieldSchema(Schema):
         :returns: Serialized data
 
         """
-        obj = type("obj", (object,), {"value": value})
-
-        return self.field.serialize("value", obj)
+        return self.field.serialize("value", {"value": value})
 
     # We disable pylint unused-argument so we can keep the same signature as the base class
     # pylint: disable=unused-argument
@@ -98,8 +104,14 @@ class ActionSchema(Schema):
     )
     progress = fields.Integer()
     data = fields.Raw()
+    data_seq = fields.Integer(data_key="dataSeq")
     _request_time = fields.DateTime(data_key="timeRequested")
+    _start_time = fields.DateTime(data_key="timeStarted")
     _end_time = fields.DateTime(data_key="timeCompleted")
+    queue_wait = fields.Float(data_key="queueWait")
+    priority = fields.Integer()
+    version = fields.Integer()
+    batch_size = fields.Integer(data_key="batchSize")
     log = fields.List(fields.Nested(LogRecordSchema()))
 
     input = fields.Raw()
@@ -116,6 +128,10 @@ class ActionSchema(Schema):
         :param **kwargs:
 
         """
+        # Building links is relatively slow, so skip it if they're excluded
+        if "href" not in self.dump_fields and "links" not in self.dump_fields:
+            return data
+
         # Add Mozilla format href
         try:
             url = url_for(ACTION_ENDPOINT, task_id=data.id, _external=True)
@@ -129,11 +145,75 @@ class ActionSchema(Schema):
                 "href": url,
                 "mimetype": "application/json",
                 **description_from_view(view_class_from_endpoint(ACTION_ENDPOINT)),
-            }
+            },
+            "output": {
+                "href": _output_url(data),
+                **description_from_view(
+                    view_class_from_endpoint(ACTION_OUTPUT_ENDPOINT)
+                ),
+            },
+            "data": {
+                "href": _data_url(data),
+                "mimetype": "application/json",
+                **description_from_view(view_class_from_endpoint(ACTION_DATA_ENDPOINT)),
+            },
         }
 
         return data
 
+    def get_attribute(self, obj, attr, default):
+        # Don't load spilled outputs back into memory, they're linked to instead.
+        # Batch outputs are lists of already marshalled outputs, added as-is.
+        if attr == "output" and (_is_spilled(obj) or _is_batch(obj)):
+            return missing
+        return Schema.get_attribute(self, obj, attr, default)
+
+    @post_dump(pass_original=True)
+    def add_unserialized_output(self, data, original, **_):
+        """Replace spilled outputs with a link to the output resource,
+        and add batch outputs without serializing them again
+
+        :param data:
+        :param original:
+        :param **kwargs:
+
+        """
+        if "output" not in self.dump_fields:
+            return data
+        if _is_spilled(original):
+            data["output"] = {
+                "href": _output_url(original),
+                "size": original.stored_output.size,
+            }
+        elif _is_batch(original):
+            data["output"] = original.output
+        return data
+
+
+def _is_batch(action) -> bool:
+    """Does an action run a batch of invocations"""
+    return getattr(action, "batch_size", None) is not None
+
+
+def _is_spilled(action) -> bool:
+    """Has an action's return value been moved out of memory"""
+    stored = getattr(action, "stored_output", None)
+    return stored is not None and stored.spilled
+
+
+def _output_url(action) -> Optional[str]:
+    try:
+        return url_for(ACTION_OUTPUT_ENDPOINT, task_id=action.id, _external=True)
+    except BuildError:
+        return None
+
+
+def _data_url(action) -> Optional[str]:
+    try:
+        return url_for(ACTION_DATA_ENDPOINT, task_id=action.id, _external=True)
+    except BuildError:
+        return None
+
 
 def nest_if_needed(schema):
     """Convert a schema, dict, or field into a field."""
@@ -194,6 +274,91 @@ def build_action_schema(
     return type(name, (base_class,), class_attrs)
 
 
+# Generated action schemas, by ActionView class and then by `many`
+_action_schemas: "weakref.WeakKeyDictionary[type, Dict[bool, tuple]]" = (
+    weakref.WeakKeyDictionary()
+)
+_action_schemas_lock = threading.Lock()
+
+
+def action_schema_for(view: type, many: bool = False) -> ActionSchema:
+    """Memoised schema describing the actions of an ActionView.
+
+    The schema class is built with :func:`build_action_schema` on first use,
+    and only built again if the view's ``schema`` or ``args`` are replaced.
+    This avoids creating a new class, and marshmallow class registry entry,
+    each time actions are listed or described.
+
+    :param view: ActionView class
+    :param many: Describe a list of actions (Default value = False)
+    :returns: Schema instance
+
+    """
+    output_schema = getattr(view, "schema", None)
+    input_schema = getattr(view, "args", None)
+    with _action_schemas_lock:
+        cached = _action_schemas.setdefault(view, {}).get(many)
+    if cached is not None and cached[0] is output_schema and cached[1] is input_schema:
+        return cached[2]
+    schema = build_action_schema(output_schema, input_schema)(many=many)
+    with _action_schemas_lock:
+        _action_schemas.setdefault(view, {})[many] = (
+            output_schema,
+            input_schema,
+            schema,
+        )
+    return schema
+
+
+class ScheduleSchema(Schema):
+    """Represents a periodic or delayed Action schedule"""
+
+    id = fields.String()
+    name = fields.String(data_key="action")
+    period = fields.Float(allow_none=True)
+    count = fields.Integer(allow_none=True)
+    overrun = fields.String(
+        validate=validate.OneOf(["skip", "queue", "coalesce"]),
+    )
+    active = fields.Boolean()
+    runs = fields.Integer()
+    skipped = fields.Integer()
+    next_run = fields.DateTime(data_key="nextRun", allow_none=True)
+    last_error = fields.String(data_key="lastError", allow_none=True)
+
+    href = fields.String()
+    links = fields.Dict()
+
+    @pre_dump
+    def generate_links(self, data, **_):
+        """
+
+        :param data:
+        :param **kwargs:
+
+        """
+        try:
+            url = url_for(SCHEDULE_ENDPOINT, schedule_id=data.id, _external=True)
+        except BuildError:
+            url = None
+        data.href = url
+        data.links = {"self": {"href": url, "mimetype": "application/json"}}
+
+        last_action = data.last_action
+        if last_action is not None:
+            try:
+                action_url = url_for(
+                    ACTION_ENDPOINT, task_id=last_action.id, _external=True
+                )
+            except BuildError:
+                action_url = None
+            data.links["lastAction"] = {
+                "href": action_url,
+                "mimetype": "application/json",
+            }
+        return data
+
+
 class EventSchema(Schema):
     event = fields.String()
     timestamp = fields.DateTime()
@@ -4,7 +4,7 @@ from flask import has_request_context, request
 
 from .find import current_labthing
 from .json.schemas import rule_to_params, rule_to_path, schema_to_json
-from .schema import build_action_schema
+from .schema import action_schema_for
 from .utilities import ResourceURL, get_docstring
 from .views import ActionView, EventView, PropertyView, View
 
@@ -263,9 +263,7 @@ class ThingDescription:
             action_description["@type"] = semtype
 
         # Add schema to prop description
-        action_description["output"] = schema_to_json(
-            build_action_schema(view.schema, view.args)()
-        )
+        action_description["output"] = schema_to_json(action_schema_for(view))
 
         return action_description
 
@@ -1,20 +1,31 @@
 import datetime
+import inspect
+import json
 import threading
 from collections import OrderedDict
-from typing import Callable, Dict, List, Optional, Set, cast
+from functools import partial, wraps
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, cast
 
 from flask import request
 from flask.views import MethodView
 from typing_extensions import Protocol
-from werkzeug.exceptions import HTTPException
+from marshmallow.exceptions import ValidationError
+from werkzeug.exceptions import BadRequest, HTTPException, UnprocessableEntity
 from werkzeug.wrappers import Response as ResponseBase
 
-from ..actions.pool import Pool
+from .. import fields
+from ..actions.batch import expand_grid, run_batch
+from ..actions.pool import ConcurrencyPolicy, Pool, current_action
+from ..actions.thread import ActionThread
+from ..actions.results import _measure
 from ..deque import Deque
 from ..find import current_labthing, find_extension
-from ..marshalling import marshal_with, use_args
+from ..marshalling import marshal_with, sparse_schema, use_args
+from ..marshalling.args import args_loader, request_json
+from ..marshalling.marshalling import marshal
 from ..representations import DEFAULT_REPRESENTATIONS
-from ..schema import ActionSchema, EventSchema, FuzzySchemaType, build_action_schema
+from ..retention import RetentionPolicy
+from ..schema import ActionSchema, EventSchema, FuzzySchemaType, action_schema_for
 from ..utilities import unpack
 
 __all__ = ["MethodView", "View", "ActionView", "PropertyView", "op", "builder"]
@@ -22,6 +33,13 @@ __all__ = ["MethodView", "View", "ActionView", "PropertyView", "op", "builder"]
 # Type alias for convenience
 OptionalSchema = Optional[FuzzySchemaType]
 
+# Shared schema instances, so that restricted copies for `?fields=` are reused
+_action_schema = ActionSchema()
+_event_list_schema = EventSchema(many=True)
+
+# Held while adding, removing or swapping actions in the deque of an ActionView
+_deque_lock = threading.Lock()
+
 
 class DescribedOperation(Protocol):
     summary: str
@@ -35,6 +53,78 @@ def described_operation(func: Callable) -> DescribedOperation:
     return cast(DescribedOperation, func)
 
 
+def _collect_args(*args, **kwargs):
+    return args, kwargs
+
+
+class DispatchChain:
+    """Request parser and response marshaller for one HTTP method of a view
+
+    Chains are built once per view class and method (see
+    :meth:`View.dispatch_chain`), rather than wrapping the view method with
+    `use_args` and `marshal_with` on every request.
+
+    :param args_schema: Schema for the arguments parsed from the request
+    :param schema: Schema for marshalling the response
+    :param sparse: Only include the fields selected by the `fields` and
+        `exclude` query parameters of the request
+
+    """
+
+    def __init__(
+        self,
+        args_schema: OptionalSchema = None,
+        schema: OptionalSchema = None,
+        sparse: bool = False,
+    ):
+        self.parser: Optional[Callable] = (
+            use_args(args_schema)(_collect_args) if args_schema else None
+        )
+        # Deserializes arguments given as data, rather than in a request
+        self.loader: Optional[Callable[[Any], Any]] = (
+            args_loader(args_schema) if args_schema else None
+        )
+        self.marshaller: Optional[marshal_with] = (
+            marshal_with(schema, sparse=sparse) if schema else None
+        )
+        # Values of the view attributes the chain was built from
+        self.sources: tuple = ()
+
+    def parse(self, *args, **kwargs) -> Tuple[tuple, dict]:
+        """Parse arguments from the current request, as `use_args` would
+
+        :returns: Tuple of positional and keyword arguments for the view method
+
+        """
+        if self.parser is None:
+            return args, kwargs
+        return self.parser(*args, **kwargs)
+
+    def load(self, data: Any) -> Any:
+        """Deserialize arguments from data, e.g. an item of a batch request,
+        as `parse` would from a request
+
+        :raises ValidationError: if the data is invalid
+
+        """
+        if self.loader is None:
+            return data
+        return self.loader(data)
+
+    def marshal(self, response):
+        """Marshal the return value of the view method"""
+        if self.marshaller is None:
+            return response
+        return marshal(response, self.marshaller.request_converter())
+
+    def wrap(self, meth: Callable) -> Callable:
+        """Wrap the view method to marshal its return value when called,
+        e.g. in an action thread"""
+        if self.marshaller is None:
+            return meth
+        return self.marshaller(meth)
+
+
 class View(MethodView):
     """A LabThing Resource class should make use of functions
     get(), put(), post(), and delete(), corresponding to HTTP methods.
@@ -52,6 +142,7 @@ class View(MethodView):
     # Internal
     _cls_tags: Set[str] = set()  # Class tags that shouldn't be removed
     _opmap: Dict[str, str] = {}  # Mapping of Thing Description ops to class methods
+    _dispatch_sources: Tuple[str, ...] = ()  # Attributes DispatchChains are built from
 
     # Name of parent extension, if one exists.
     # This is only used for extension development where Views are added to the extension.
@@ -62,10 +153,9 @@ class View(MethodView):
         MethodView.__init__(self, *args, **kwargs)
 
         # Set the default representations
+        labthing = current_labthing()
         self.representations = (
-            current_labthing().representations
-            if current_labthing()
-            else DEFAULT_REPRESENTATIONS
+            labthing.representations if labthing else DEFAULT_REPRESENTATIONS
         )
 
     @property
@@ -102,6 +192,59 @@ class View(MethodView):
 
         return meth
 
+    @classmethod
+    def _build_dispatch_chain(  # pylint: disable=unused-argument
+        cls, method: str
+    ) -> DispatchChain:
+        """Build the DispatchChain for an HTTP method of this view. Plain views
+        neither parse arguments nor marshal responses, whatever the method.
+
+        :param method: HTTP method, in upper case
+
+        """
+        return DispatchChain()
+
+    @classmethod
+    def dispatch_chain(cls, method: str) -> DispatchChain:
+        """DispatchChain for an HTTP method of this view, built on first use,
+        and built again if the attributes it is built from (e.g. ``args`` or
+        ``schema``) are replaced
+
+        :param method: HTTP method, in upper case
+
+        """
+        # Look in this class only, so that subclasses build their own chains
+        chains = cls.__dict__.get("_dispatch_chains")
+        if chains is None:
+            chains = {}
+            cls._dispatch_chains = chains
+        sources = tuple(getattr(cls, name, None) for name in cls._dispatch_sources)
+        chain = chains.get(method)
+        if chain is None or any(
+            old is not new for old, new in zip(chain.sources, sources)
+        ):
+            chain = cls._build_dispatch_chain(method)
+            chain.sources = sources
+            chains[method] = chain
+        return chain
+
+    @classmethod
+    def build_dispatch_chains(cls):
+        """Build the DispatchChains for every HTTP method of this view now,
+        rather than on their first requests"""
+        cls._dispatch_chains = {}
+        for method in cls.methods or ():
+            cls.dispatch_chain(method)
+
+    @staticmethod
+    def _current_pool() -> Pool:
+        """Find the action pool of the current LabThing, or the emergency pool"""
+        labthing = current_labthing()
+        if labthing:
+            return labthing.actions
+        # Shared by every view, though it is kept on ActionView
+        return ActionView._emergency_pool  # pylint: disable=protected-access
+
     def dispatch_request(self, *args, **kwargs):
         """
 
@@ -111,6 +254,12 @@ class View(MethodView):
         """
         meth = self._find_request_method()
 
+        # Run coroutine methods on the shared event loop
+        if inspect.iscoroutinefunction(meth):
+            return self.represent_response(
+                self._current_pool().run_coroutine(meth(*args, **kwargs))
+            )
+
         # Generate basic response
         return self.represent_response(meth(*args, **kwargs))
 
@@ -136,6 +285,17 @@ class View(MethodView):
         return response
 
 
+def _in_app_context(app, function: Callable) -> Callable:
+    """Wrap a function to run in the context of a Flask app"""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
 class ActionView(View):
     """ """
 
@@ -161,6 +321,23 @@ class ActionView(View):
         int
     ] = None  # Time in seconds to wait for the action thread to end after a stop request before terminating it forcefully
 
+    # Concurrency limits
+    max_concurrent: Optional[int] = None  # Maximum number of simultaneous runs
+    on_busy: str = "queue"  # "queue" or "reject" requests beyond max_concurrent
+    queue_limit: Optional[int] = None  # Maximum number of queued requests
+    retry_after: int = 1  # Retry-After header (seconds) sent with rejections
+
+    # Scheduling
+    priority: int = 0  # Queue position. Requests may override with ?priority=
+    executor: str = "thread"  # "thread", or "process" to run CPU-bound actions
+
+    # Batch invocation
+    max_batch: int = 1000  # Maximum number of items in one ?batch request
+
+    # Sharing identical invocations. Only used if the action is safe or idempotent.
+    dedupe: bool = True  # Attach identical requests to a running invocation
+    cache_ttl: Optional[float] = None  # Seconds to reuse results of safe actions
+
     # Internal
     _opmap: Dict[str, str] = {
         "invokeaction": "post"
@@ -178,6 +355,67 @@ class ActionView(View):
         """
         cls._deque = Deque()  # Action queue
 
+    @classmethod
+    def reap(cls, pool: Pool):
+        """Forget actions of this view that the pool no longer retains
+
+        :param pool: Pool the actions of this view are run in
+
+        """
+        with _deque_lock:
+            for task in list(cls._deque):
+                if pool.get(task.id) is None:
+                    cls._deque.remove(task)
+
+    @classmethod
+    def _track(cls, task: ActionThread, pool: Pool):
+        """Log an action to the view's deque. If the pool compacts finished
+        actions, the action is swapped for its record once it finishes.
+
+        :param task: ActionThread of the action
+        :param pool: Pool the action runs in
+
+        """
+        with _deque_lock:
+            cls._deque.append(task)
+        if pool.compact:
+            task.add_done_callback(lambda finished: cls._swap_record(finished, pool))
+
+    @classmethod
+    def _swap_record(cls, task: ActionThread, pool: Pool):
+        """Replace a finished action in the view's deque with the pool's record"""
+        record = pool.get(task.id)
+        if record is None or record is task:
+            return
+        with _deque_lock:
+            for i, entry in enumerate(cls._deque):
+                if entry is task:
+                    cls._deque[i] = record
+                    return
+
+    _dispatch_sources = ("args", "schema")
+
+    @classmethod
+    def _build_dispatch_chain(cls, method: str) -> DispatchChain:
+        """Parse `args` from the body of POST requests, and marshal the
+        action's return value with `schema`. Fieldsets select the fields of
+        action descriptions, rather than of the return value."""
+        if method != "POST":
+            return DispatchChain()
+        return DispatchChain(cls.args, cls.schema, sparse=False)
+
+    @classmethod
+    def concurrency_policy(cls) -> Optional[ConcurrencyPolicy]:
+        """Build the ConcurrencyPolicy for this action, if it is limited"""
+        if cls.max_concurrent is None:
+            return None
+        return ConcurrencyPolicy(
+            cls.max_concurrent,
+            on_busy=cls.on_busy,
+            queue_limit=cls.queue_limit,
+            retry_after=cls.retry_after,
+        )
+
     @described_operation
     @classmethod
     def get(cls):
@@ -189,8 +427,9 @@ class ActionView(View):
         action descriptions for each time the action has been run, including whether they
         have completed, and any return values.
         """
-        queue_schema = build_action_schema(cls.schema, cls.args)(many=True)
-        return queue_schema.dump(cls._deque)
+        queue_schema = action_schema_for(cls, many=True)
+        # Dump a snapshot, as other requests may append to the deque meanwhile
+        return sparse_schema(queue_schema).dump(list(cls._deque))
 
     def dispatch_request(self, *args, **kwargs):
         """
@@ -205,32 +444,53 @@ class ActionView(View):
         if request.method != "POST":
             return View.dispatch_request(self, *args, **kwargs)
 
-        # Inject request arguments if an args schema is defined
-        if self.args:
-            meth = use_args(self.args)(meth)
+        # Try to find a pool on the current LabThing, but fall back to Views emergency pool
+        pool = self._current_pool()
+        batch = "batch" in request.args
+        share = self.dedupe and (self.safe or self.idempotent) and not batch
+
+        if batch:
+            # Parse every item now, so that no item runs if any are invalid
+            items = self._parse_batch_items(meth)
+            if self.executor == "process":
+                meth = partial(pool.run_in_process, meth)
+        else:
+            # Parse and validate arguments now, so that invalid requests are
+            # refused before any action is created. This also suits process
+            # and coroutine actions, which can't see the request, and shared
+            # invocations, which are matched on their parsed arguments.
+            args, kwargs = self.dispatch_chain("POST").parse(*args, **kwargs)
+            if self.executor == "process":
+                meth = partial(pool.run_in_process, meth)
 
         # Marhal response if a response schema is defined
-        if self.schema:
-            meth = marshal_with(self.schema)(meth)
-
-        # Try to find a pool on the current LabThing, but fall back to Views emergency pool
-        pool = (
-            current_labthing().actions if current_labthing() else self._emergency_pool
-        )
+        meth = self.dispatch_chain("POST").wrap(meth)
+        # Run every item of a batch in one action
+        if batch:
+            meth = partial(run_batch, meth, items)
         # We pass in this lock to tell the Action thread that we'll deal
         # with HTTP errors in this thread
         error_lock = threading.RLock()
         with error_lock:
             # Make a task out of the views `post` method
             task = pool.spawn(
-                self.endpoint, meth, *args, http_error_lock=error_lock, **kwargs
+                self.endpoint,
+                meth,
+                *args,
+                http_error_lock=error_lock,
+                concurrency=self.concurrency_policy(),
+                priority=request.args.get("priority", self.priority, type=int),
+                share_key=self._share_key(args, kwargs) if share else None,
+                cache_ttl=self.cache_ttl if self.safe else None,
+                **kwargs,
             )
             # Optionally override the threads default_stop_timeout
             if self.default_stop_timeout is not None:
                 task.default_stop_timeout = self.default_stop_timeout
 
-            # Log the action to the view's deque
-            self._deque.append(task)
+            # Log the action to the view's deque, unless we attached to an existing one
+            if task.http_error_lock is error_lock:
+                self._track(task, pool)
 
             # Wait up to 2 second for the action to complete or error
             try:
@@ -249,7 +509,138 @@ class ActionView(View):
         if task.exception and isinstance(task.exception, HTTPException):
             raise task.exception
 
-        return self.represent_response((ActionSchema().dump(task), 201))
+        return self.represent_response((sparse_schema(_action_schema).dump(task), 201))
+
+    @classmethod
+    def _prepare(cls, arguments, pool: Pool) -> Tuple[Callable, tuple]:
+        """Bind the action's method, and parse arguments, outside of a request
+
+        :param arguments: Arguments, as they would be sent in a request body
+        :param pool: Pool the action will run in
+        :raises ValidationError: if the arguments are invalid
+        :returns: Tuple of the method to call, and its positional arguments
+
+        """
+        view = cls()
+        meth = view.post  # pylint: disable=no-member
+        chain = cls.dispatch_chain("POST")
+        args = ()
+        if cls.args:
+            args = (chain.load({} if arguments is None else arguments),)
+        meth = chain.wrap(meth)
+        if cls.executor == "process":
+            meth = partial(pool.run_in_process, meth)
+        return meth, args
+
+    @classmethod
+    def invoke(
+        cls, arguments=None, pool: Optional[Pool] = None, app=None
+    ) -> ActionThread:
+        """Start the action without an HTTP request, e.g. from a schedule
+
+        :param arguments: Arguments, as they would be sent in a request body
+        :param pool: Pool to run the action in. Defaults to the pool of the
+            current LabThing.
+        :param app: Flask app, whose context the action runs in
+        :raises ValidationError: if the arguments are invalid
+        :returns: ActionThread of the new action
+
+        """
+        pool = pool or cls._current_pool()
+        meth, args = cls._prepare(arguments, pool)
+        if app is not None and not inspect.iscoroutinefunction(meth):
+            meth = _in_app_context(app, meth)
+        task = pool.spawn(
+            cls.endpoint,
+            meth,
+            *args,
+            concurrency=cls.concurrency_policy(),
+            priority=cls.priority,
+        )
+        if cls.default_stop_timeout is not None:
+            task.default_stop_timeout = cls.default_stop_timeout
+        cls._track(task, pool)
+        return task
+
+    @classmethod
+    def call(cls, arguments=None, pool: Optional[Pool] = None) -> Any:
+        """Run the action in the current thread, e.g. as a step of a pipeline
+
+        The action's concurrency limits apply, as they would to a request.
+
+        :param arguments: Arguments, as they would be sent in a request body
+        :param pool: Pool to run coroutine and process actions with. Defaults
+            to the pool of the current LabThing.
+        :raises ValidationError: if the arguments are invalid
+        :raises ActionBusy: if the action is busy, and refuses new invocations
+        :raises ActionQueueLimitReached: if too many invocations are waiting
+        :returns: Marshalled return value of the action
+
+        """
+        pool = pool or cls._current_pool()
+        meth, args = cls._prepare(arguments, pool)
+        # Stop waiting for a slot if the calling action is cancelled
+        caller = current_action()
+        cancel = caller.stopping if caller is not None else None
+        with pool.limited(cls.endpoint, cls.concurrency_policy(), cancel=cancel):
+            if inspect.iscoroutinefunction(meth):
+                return pool.run_coroutine(meth(*args))
+            return meth(*args)
+
+    def _share_key(self, args, kwargs) -> Optional[str]:
+        """Key identifying identical invocations of this action
+
+        Only arguments that are plain JSON data are compared. Other objects'
+        string representations may leave out their state (or truncate it, as
+        Numpy arrays do), so different invocations could get the same key.
+
+        :param args: Positional arguments, including parsed request arguments
+        :param kwargs: Keyword arguments
+        :returns: Key string, or None if the arguments can't be compared
+
+        """
+        try:
+            return json.dumps([self.endpoint, args, kwargs], sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+
+    def _parse_batch_items(self, meth: Callable) -> List:
+        """Validate the arguments of every item in a batch request.
+
+        The request body is either a list of arguments, one per item, or an
+        object whose list values are swept over as a grid.
+
+        :param meth: View method the items will be passed to
+        :returns: List of parsed arguments
+
+        """
+        if inspect.iscoroutinefunction(meth):
+            raise BadRequest("Coroutine actions can't be invoked as a batch")
+        if not self.args:
+            raise BadRequest("Actions without arguments can't be invoked as a batch")
+        body = request_json()
+        if isinstance(body, dict) and not isinstance(self.args, fields.Field):
+            items = expand_grid(body)
+        elif isinstance(body, list):
+            items = body
+        else:
+            raise BadRequest(
+                "Batch requests need a list of inputs, or a parameter grid"
+            )
+        if len(items) > self.max_batch:
+            raise BadRequest(f"Batch requests are limited to {self.max_batch} items")
+
+        # Load every item with the same schema, built once for the view
+        load = self.dispatch_chain("POST").load
+        parsed, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                parsed.append(load(item))
+            except ValidationError as e:
+                errors[index] = e.messages
+        if errors:
+            raise UnprocessableEntity(f"Invalid batch items: {errors}")
+        return parsed
 
 
 class PropertyView(View):
@@ -270,6 +661,15 @@ class PropertyView(View):
     }  # Mapping of Thing Description ops to class methods
     _cls_tags = {"properties"}
 
+    _dispatch_sources = ("schema",)
+
+    @classmethod
+    def _build_dispatch_chain(cls, method: str) -> DispatchChain:
+        """Parse values written with PUT and POST requests, and marshal
+        every response, with `schema`"""
+        args_schema = cls.schema if method in ("PUT", "POST") else None
+        return DispatchChain(args_schema, cls.schema, sparse=True)
+
     def dispatch_request(self, *args, **kwargs):
         """
 
@@ -278,18 +678,20 @@ class PropertyView(View):
 
         """
         meth = self._find_request_method()
+        chain = self.dispatch_chain(request.method)
 
-        # POST and PUT methods can be used to write properties
-        # In all other cases, ignore arguments
-        if request.method in ("PUT", "POST") and self.schema:
-            meth = use_args(self.schema)(meth)
+        # Parse written values before calling the method. The request isn't
+        # available to coroutine methods, which run on the event loop.
+        args, kwargs = chain.parse(*args, **kwargs)
 
-        # All methods should serialise properties
-        if self.schema:
-            meth = marshal_with(self.schema)(meth)
+        # Run coroutine methods on the shared event loop
+        if inspect.iscoroutinefunction(meth):
+            response = self._current_pool().run_coroutine(meth(*args, **kwargs))
+        else:
+            response = meth(*args, **kwargs)
 
-        # Generate basic response
-        return self.represent_response(meth(*args, **kwargs))
+        # All methods should serialise properties
+        return self.represent_response(chain.marshal(response))
 
 
 class EventView(View):
@@ -302,6 +704,9 @@ class EventView(View):
     # Spec overrides
     content_type = "application/json"  # Input contentType
 
+    # Limits on the events kept, applied by `reap`
+    retention: Optional[RetentionPolicy] = None
+
     # Internal
     _opmap = {
         "subscribeevent": "get"
@@ -315,7 +720,7 @@ class EventView(View):
         """
         Default method for GET requests. Returns the action queue (including already finished actions) for this action
         """
-        return EventSchema(many=True).dump(cls._deque)
+        return sparse_schema(_event_list_schema).dump(cls._deque)
 
     @classmethod
     def emit(cls, data):
@@ -329,3 +734,31 @@ class EventView(View):
             else:
                 d["data"] = data
         cls._deque.append(d)
+
+    @classmethod
+    def reap(cls, retention: Optional[RetentionPolicy] = None) -> int:
+        """Drop the oldest events beyond the limits of a retention policy
+
+        Events are sized by their data, if it is bytes, a string, or an array.
+
+        :param retention: Policy to apply, if the view doesn't set `retention`
+        :returns: Number of events dropped
+
+        """
+        retention = cls.retention or retention
+        if retention is None:
+            return 0
+        events = list(cls._deque)
+        entries = []
+        for event in events:
+            measured = _measure(event.get("data"))
+            size = measured[0] if measured else 0
+            entries.append((event, event.get("timestamp"), size))
+        dropped = 0
+        # Events are only added on the right, so the oldest are dropped from the left
+        for event in retention.select(entries):
+            if not cls._deque or cls._deque[0] is not event:
+                continue  # Already pushed out by newer events
+            cls._deque.popleft()
+            dropped += 1
+        return dropped
@@ -1,10 +1,12 @@
 import json
 import logging
+import threading
 import time
 
 import pytest
 
-from labthings import LabThing
+from labthings import LabThing, current_action, fields
+from labthings.schema import Schema
 from labthings.views import ActionView
 
 
@@ -72,3 +74,299 @@ def test_action_validate(thing_with_some_views, client):
     assert r.get_json()["status"] == "completed"
     r = client.post("/ActionWithValidation", data=json.dumps({"test_arg": "three"}))
     assert r.status_code in [422]
+
+
+def test_action_validate_before_spawn(thing_with_some_views, client):
+    """Invalid arguments are refused without creating an action"""
+    r = client.post("/ActionWithValidation", data=json.dumps({"test_arg": "three"}))
+    assert r.status_code == 422
+    assert thing_with_some_views.actions.tasks() == []
+    assert client.get("/ActionWithValidation").get_json() == []
+
+
+def test_action_queue_full(app, client):
+    thing = LabThing(app, action_workers=1, action_queue_size=1)
+    release = threading.Event()
+
+    class BlockingAction(ActionView):
+        wait_for = 0
+
+        def post(self):
+            release.wait()
+
+    thing.add_view(BlockingAction, "/BlockingAction")
+
+    try:
+        assert client.post("/BlockingAction").status_code == 201
+        thing.actions.tasks()[0].started.wait()
+        assert client.post("/BlockingAction").status_code == 201
+        r = client.post("/BlockingAction")
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        thing.actions.join()
+        thing.actions.shutdown()
+
+
+def test_action_concurrency_reject(thing, client):
+    release = threading.Event()
+
+    class ExclusiveAction(ActionView):
+        wait_for = 0
+        max_concurrent = 1
+        on_busy = "reject"
+        retry_after = 2
+
+        def post(self):
+            release.wait()
+
+    thing.add_view(ExclusiveAction, "/ExclusiveAction")
+
+    try:
+        assert client.post("/ExclusiveAction").status_code == 201
+        r = client.post("/ExclusiveAction")
+        assert r.status_code == 409
+        assert r.headers["Retry-After"] == "2"
+        assert len(ExclusiveAction._deque) == 1
+    finally:
+        release.set()
+        thing.actions.join()
+
+
+def test_action_concurrency_queue(thing, client):
+    release = threading.Event()
+
+    class QueuedAction(ActionView):
+        wait_for = 0
+        max_concurrent = 1
+        queue_limit = 1
+
+        def post(self):
+            release.wait()
+
+    thing.add_view(QueuedAction, "/QueuedAction")
+
+    try:
+        assert client.post("/QueuedAction").status_code == 201
+        r = client.post("/QueuedAction")
+        assert r.status_code == 201
+        assert r.get_json()["status"] == "pending"
+        assert client.post("/QueuedAction").status_code == 429
+    finally:
+        release.set()
+        thing.actions.join()
+
+
+def test_action_priority(app, client):
+    thing = LabThing(app, action_workers=1)
+    release = threading.Event()
+
+    class BlockingAction(ActionView):
+        wait_for = 0
+
+        def post(self):
+            release.wait()
+
+    class UrgentAction(ActionView):
+        wait_for = 0
+        priority = 10
+
+        def post(self):
+            return "urgent"
+
+    thing.add_view(BlockingAction, "/BlockingAction")
+    thing.add_view(UrgentAction, "/UrgentAction")
+
+    try:
+        client.post("/BlockingAction")
+        thing.actions.tasks()[0].started.wait()
+        assert client.post("/BlockingAction").get_json()["priority"] == 0
+        assert client.post("/UrgentAction").get_json()["priority"] == 10
+        r = client.post("/BlockingAction?priority=20")
+        assert r.get_json()["priority"] == 20
+    finally:
+        release.set()
+        thing.actions.join()
+        thing.actions.shutdown()
+
+    action = client.get(r.get_json()["href"]).get_json()
+    assert action["queueWait"] >= 0
+    assert action["timeStarted"]
+
+
+def test_action_batch(thing, client):
+    class ExposeAction(ActionView):
+        args = {
+            "exposure": fields.Integer(required=True),
+            "gain": fields.Integer(missing=1),
+        }
+        schema = fields.Integer()
+
+        def post(self, args):
+            current_action().update_data({"seen": args["exposure"]})
+            if args["exposure"] < 0:
+                raise ValueError("Negative exposure")
+            return args["exposure"] * args["gain"]
+
+    thing.add_view(ExposeAction, "/ExposeAction")
+
+    r = client.post(
+        "/ExposeAction?batch",
+        data=json.dumps([{"exposure": 1}, {"exposure": -1}, {"exposure": 3}]),
+    )
+    assert r.status_code == 201
+    thing.actions.join()
+    action = client.get(r.get_json()["href"]).get_json()
+    assert len(thing.actions.tasks()) == 1
+    assert action["status"] == "completed"
+    assert action["batchSize"] == 3
+    assert action["progress"] == 100
+    assert action["output"] == [1, None, 3]
+    assert action["data"]["0"]["status"] == "completed"
+    assert action["data"]["0"]["data"] == {"seen": 1}
+    assert action["data"]["1"]["status"] == "error"
+    assert action["data"]["1"]["error"] == "Negative exposure"
+
+
+def test_action_batch_grid(thing, client):
+    class GridAction(ActionView):
+        args = {"x": fields.Integer(), "y": fields.Integer()}
+
+        def post(self, args):
+            return [args["x"], args["y"]]
+
+    thing.add_view(GridAction, "/GridAction")
+
+    r = client.post("/GridAction?batch", data=json.dumps({"x": [1, 2], "y": [3, 4]}))
+    thing.actions.join()
+    action = client.get(r.get_json()["href"]).get_json()
+    assert action["output"] == [[1, 3], [1, 4], [2, 3], [2, 4]]
+
+
+def test_action_batch_builds_schema_once(thing, client, monkeypatch):
+    class GridAction(ActionView):
+        args = {"x": fields.Integer(), "y": fields.Integer()}
+
+        def post(self, args):
+            return args["x"] * args["y"]
+
+    thing.add_view(GridAction, "/GridAction")
+
+    from_dict = Schema.from_dict
+    built = []
+    monkeypatch.setattr(
+        Schema, "from_dict", lambda *a, **kw: built.append(1) or from_dict(*a, **kw)
+    )
+    grid = {"x": list(range(10)), "y": list(range(10))}
+    r = client.post("/GridAction?batch", data=json.dumps(grid))
+    thing.actions.join()
+    assert len(client.get(r.get_json()["href"]).get_json()["output"]) == 100
+    # Schemas were built when the view was registered, not per item
+    assert built == []
+
+
+def test_action_batch_invalid(thing, client):
+    ran = []
+
+    class StrictAction(ActionView):
+        args = {"x": fields.Integer(required=True)}
+
+        def post(self, args):
+            ran.append(args)
+
+    thing.add_view(StrictAction, "/StrictAction")
+
+    r = client.post("/StrictAction?batch", data=json.dumps([{"x": 1}, {"x": "a"}]))
+    assert r.status_code == 422
+    assert "1" in r.get_json()["message"]
+    assert client.post("/StrictAction?batch", data=json.dumps(5)).status_code == 400
+    # Nothing runs if any item is invalid
+    assert ran == [] and thing.actions.tasks() == []
+
+
+def test_action_dedupe_inflight(thing, client):
+    release = threading.Event()
+
+    class MoveAction(ActionView):
+        idempotent = True
+        wait_for = 0
+        args = {"x": fields.Integer()}
+
+        def post(self, args):
+            release.wait()
+            return args["x"]
+
+    thing.add_view(MoveAction, "/MoveAction")
+
+    try:
+        first = client.post("/MoveAction", data=json.dumps({"x": 1})).get_json()
+        second = client.post("/MoveAction", data=json.dumps({"x": 1})).get_json()
+        other = client.post("/MoveAction", data=json.dumps({"x": 2})).get_json()
+    finally:
+        release.set()
+        thing.actions.join()
+
+    # Identical invocations attach to the running action
+    assert first["id"] == second["id"]
+    assert first["id"] != other["id"]
+    assert len(thing.actions.tasks()) == 2
+    assert len(client.get("/MoveAction").get_json()) == 2
+
+
+def test_action_dedupe_needs_json_args(thing, client):
+    class Opaque:
+        def __init__(self, value):
+            self.value = value
+
+        def __repr__(self):
+            return "<Opaque>"
+
+    class OpaqueField(fields.String):
+        def _deserialize(self, value, attr, data, **kwargs):
+            return Opaque(value)
+
+    class MeasureAction(ActionView):
+        safe = True
+        cache_ttl = 60
+        args = {"x": OpaqueField()}
+
+        def post(self, args):
+            return args["x"].value
+
+    thing.add_view(MeasureAction, "/MeasureAction")
+
+    first = client.post("/MeasureAction", data=json.dumps({"x": "a"})).get_json()
+    second = client.post("/MeasureAction", data=json.dumps({"x": "b"})).get_json()
+    # Arguments that aren't JSON data can't be compared, so aren't shared
+    assert second["id"] != first["id"]
+    assert [first["output"], second["output"]] == ["a", "b"]
+
+
+def test_action_memoize_safe(thing, client):
+    class MeasureAction(ActionView):
+        safe = True
+        cache_ttl = 60
+
+        def post(self):
+            return time.monotonic()
+
+    class UncachedAction(ActionView):
+        safe = True
+
+        def post(self):
+            return time.monotonic()
+
+    thing.add_view(MeasureAction, "/MeasureAction")
+    thing.add_view(UncachedAction, "/UncachedAction")
+
+    first = client.post("/MeasureAction").get_json()
+    second = client.post("/MeasureAction").get_json()
+    assert first["status"] == "completed"
+    assert second["id"] == first["id"]
+    assert second["output"] == first["output"]
+
+    # Without a cache_ttl, completed results are not reused
+    first = client.post("/UncachedAction").get_json()
+    second = client.post("/UncachedAction").get_json()
+    assert second["id"] != first["id"]
@@ -1,7 +1,14 @@
+import logging
+import threading
 import time
 
+import pytest
+
+from labthings import fields
 from labthings.actions import current_action
 from labthings.find import current_labthing
+from labthings.schema import Schema
+from labthings.views import ActionView
 
 
 def test_docs(thing, thing_client, schemas_path):
@@ -31,6 +38,70 @@ def test_actions_list(thing_client):
         assert str(task_obj.id) in ids
 
 
+def test_actions_list_filters(thing_client):
+    actions = current_labthing().actions
+    task_objs = [actions.spawn("task_func", lambda: None) for _ in range(3)]
+    other = actions.spawn("other_func", lambda: None)
+    actions.join()
+
+    with thing_client as c:
+        response = c.get("/actions?action=task_func&status=completed,error&limit=2")
+        ids = [t["id"] for t in response.json]
+        assert ids == [str(t.id) for t in task_objs[:2]]
+        next_url = response.headers["Link"].split(">")[0].lstrip("<")
+        response = c.get(next_url)
+        assert [t["id"] for t in response.json] == [str(task_objs[2].id)]
+        assert "Link" not in response.headers
+
+        assert c.get("/actions?status=running").json == []
+        response = c.get("/actions?since=2000-01-01T00:00:00")
+        assert str(other.id) in [t["id"] for t in response.json]
+        assert c.get("/actions?since=3000-01-01T00:00:00").json == []
+        assert c.get("/actions?since=yesterday").status_code == 400
+
+
+def test_actions_list_etag(thing_client):
+    actions = current_labthing().actions
+    actions.spawn("task_func", lambda: None).join()
+
+    with thing_client as c:
+        etag = c.get("/actions").headers["ETag"]
+        headers = {"Accept": "application/json", "If-None-Match": etag}
+        assert c.get("/actions", headers=headers).status_code == 304
+        actions.spawn("task_func", lambda: None).join()
+        assert c.get("/actions", headers=headers).status_code == 200
+
+
+def test_actions_list_etag_log(thing_client):
+    logged = threading.Event()
+    resume = threading.Event()
+
+    def task_func():
+        logging.warning("first")
+        logged.wait(5)
+        logging.warning("second")
+        resume.wait(5)
+
+    actions = current_labthing().actions
+    task_obj = actions.spawn("task_func", task_func)
+    try:
+        deadline = time.monotonic() + 5
+        while not task_obj.log and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with thing_client as c:
+            etag = c.get("/actions").headers["ETag"]
+            headers = {"Accept": "application/json", "If-None-Match": etag}
+            logged.set()
+            while len(task_obj.log) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # The list includes each action's log, so a new record changes it
+            assert c.get("/actions", headers=headers).status_code == 200
+    finally:
+        logged.set()
+        resume.set()
+        task_obj.join()
+
+
 def test_action_representation(thing_client):
     def task_func():
         pass
@@ -43,6 +114,22 @@ def test_action_representation(thing_client):
         assert response
 
 
+def test_action_representation_fields(thing_client):
+    task_obj = current_labthing().actions.spawn("task_func", lambda: None)
+    task_obj.join()
+    task_id = str(task_obj.id)
+
+    with thing_client as c:
+        response = c.get(f"/actions/{task_id}?fields=status,progress").json
+        assert response == {"status": "completed", "progress": None}
+        response = c.get(f"/actions/{task_id}?exclude=log,links,output").json
+        assert "log" not in response and "links" not in response
+        assert response["id"] == task_id
+        response = c.get("/actions?fields=id").json
+        assert {"id": task_id} in response
+        assert c.get(f"/actions/{task_id}?fields=nonsense").status_code == 400
+
+
 def test_action_representation_missing(thing_client):
     with thing_client as c:
         assert c.get("/actions/missing_id").status_code == 404
@@ -91,3 +178,285 @@ def test_action_terminate(thing_client):
 def test_action_kill_missing(thing_client):
     with thing_client as c:
         assert c.delete("/actions/missing_id").status_code == 404
+
+
+def test_action_output_spilled(thing_client):
+    labthing = current_labthing()
+    labthing.actions.results.inline_limit = 10
+
+    task_obj = labthing.actions.spawn("task_func", lambda: "x" * 100)
+    task_obj.join()
+    task_id = str(task_obj.id)
+
+    with thing_client as c:
+        response = c.get(f"/actions/{task_id}").json
+        # Large outputs are linked to, rather than included
+        assert response["output"]["size"] == 100
+        assert response["output"]["href"].endswith(f"/actions/{task_id}/output")
+        assert response["links"]["output"]["href"] == response["output"]["href"]
+
+        assert c.get(f"/actions/{task_id}/output").json == "x" * 100
+
+
+def test_action_output_missing(thing_client):
+    with thing_client as c:
+        assert c.get("/actions/missing_id/output").status_code == 404
+
+
+def test_action_output_raw_range(thing_client):
+    task_obj = current_labthing().actions.spawn("task_func", lambda: b"0123456789")
+    task_obj.join()
+    url = f"/actions/{task_obj.id}/output"
+
+    with thing_client as c:
+        response = c.get(url, headers={"Accept": "application/octet-stream"})
+        assert response.status_code == 200
+        assert response.data == b"0123456789"
+        assert response.headers["Accept-Ranges"] == "bytes"
+        etag = response.headers["ETag"]
+
+        response = c.get(
+            url,
+            headers={
+                "Accept": "application/octet-stream",
+                "Range": "bytes=2-5",
+                "If-Range": etag,
+            },
+        )
+        assert response.status_code == 206
+        assert response.data == b"2345"
+        assert response.headers["Content-Range"] == "bytes 2-5/10"
+
+
+def test_action_output_spilled_range(thing_client):
+    labthing = current_labthing()
+    labthing.actions.results.inline_limit = 10
+
+    task_obj = labthing.actions.spawn("task_func", lambda: "abc" * 100)
+    task_obj.join()
+    url = f"/actions/{task_obj.id}/output"
+
+    with thing_client as c:
+        response = c.get(url, headers={"Accept": "text/plain", "Range": "bytes=-3"})
+        assert response.status_code == 206
+        assert response.data == b"abc"
+        assert response.mimetype == "text/plain"
+
+
+def test_action_output_spilled_array_range(thing_client):
+    numpy = pytest.importorskip("numpy")
+    labthing = current_labthing()
+    labthing.actions.results.inline_limit = 10
+    array = numpy.arange(12, dtype="<i4").reshape(3, 4)
+
+    task_obj = labthing.actions.spawn("task_func", lambda: array)
+    task_obj.join()
+    assert task_obj.stored_output.spilled
+    url = f"/actions/{task_obj.id}/output"
+
+    with thing_client as c:
+        headers = {"Accept": "application/octet-stream"}
+        response = c.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.data == array.tobytes()
+        assert response.headers["X-Array-Dtype"] == "int32"
+        assert response.headers["X-Array-Shape"] == "3,4"
+
+        response = c.get(url, headers={**headers, "Range": "bytes=4-11"})
+        assert response.status_code == 206
+        assert response.data == array.tobytes()[4:12]
+        assert response.headers["X-Array-Shape"] == "3,4"
+
+
+def test_action_long_poll(thing_client):
+    def task_func():
+        current_action().stopping.wait()
+
+    task_obj = current_labthing().actions.spawn("task_func", task_func)
+    task_obj.started.wait()
+    task_id = str(task_obj.id)
+
+    with thing_client as c:
+        version = c.get(f"/actions/{task_id}").json["version"]
+
+        # Times out, with nothing changed
+        response = c.get(f"/actions/{task_id}?wait=0.05&since={version}").json
+        assert response["version"] == version
+        assert response["status"] == "running"
+
+        # Returns as soon as the action finishes
+        threading.Timer(0.05, task_obj.stopping.set).start()
+        start = time.monotonic()
+        response = c.get(f"/actions/{task_id}?wait=5&since={version}").json
+        assert time.monotonic() - start < 2
+        assert response["version"] > version
+
+
+def test_action_long_poll_finished(thing_client):
+    task_obj = current_labthing().actions.spawn("task_func", lambda: 1)
+    task_obj.join()
+
+    with thing_client as c:
+        # Finished actions won't change, so there's nothing to wait for
+        start = time.monotonic()
+        response = c.get(f"/actions/{task_obj.id}?wait=5").json
+        assert time.monotonic() - start < 1
+        assert response["status"] == "completed"
+
+
+def test_action_data_since(thing_client):
+    def task_func():
+        current_action().update_data({"x": [1, 2]})
+        current_action().update_data({"y": 3})
+
+    task_obj = current_labthing().actions.spawn("task_func", task_func)
+    task_obj.join()
+    task_id = str(task_obj.id)
+
+    with thing_client as c:
+        response = c.get(f"/actions/{task_id}/data").json
+        assert response == {"seq": 2, "data": {"x": [1, 2], "y": 3}}
+        assert c.get(f"/actions/{task_id}").json["dataSeq"] == 2
+
+        response = c.get(f"/actions/{task_id}/data?since=1").json
+        assert response == {"seq": 2, "updates": [{"seq": 2, "data": {"y": 3}}]}
+
+        assert c.get("/actions/missing_id/data").status_code == 404
+
+
+def test_schedules(thing, thing_client):
+    class ScheduledAction(ActionView):
+        args = {"n": fields.Int(required=True)}
+
+        def post(self, args):
+            current_labthing()  # Runs in the app context
+            return args["n"] * 2
+
+    thing.add_view(ScheduledAction, "/scheduled", endpoint="scheduled")
+
+    with thing_client as c:
+        response = c.post("/schedules", json={"action": "scheduled", "args": {"n": 2}})
+        assert response.status_code == 201
+        schedule = response.json
+        assert schedule["action"] == "scheduled"
+        assert schedule["period"] is None
+
+        assert [s["id"] for s in c.get("/schedules").json] == [schedule["id"]]
+        deadline = time.monotonic() + 2
+        while c.get(schedule["href"]).json["runs"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        action_href = c.get(schedule["href"]).json["links"]["lastAction"]["href"]
+        task = current_labthing().actions.get(action_href.rsplit("/", 1)[-1])
+        task.join()
+        assert task.output == 4
+
+        response = c.post(
+            "/schedules", json={"action": "scheduled", "args": {}, "period": 10}
+        )
+        assert response.status_code == 422
+        response = c.post("/schedules", json={"action": "missing", "period": 10})
+        assert response.status_code == 404
+        # Clients can't schedule actions to run almost continuously
+        response = c.post(
+            "/schedules", json={"action": "scheduled", "args": {"n": 1}, "period": 0.01}
+        )
+        assert response.status_code == 422
+
+        response = c.post(
+            "/schedules", json={"action": "scheduled", "args": {"n": 1}, "period": 10}
+        )
+        periodic_href = response.json["href"]
+        assert c.delete(periodic_href).json["active"] is False
+        assert c.get(periodic_href).status_code == 404
+    thing.scheduler.stop()
+
+
+def test_schedule_ticks_reuse_schema(thing, thing_client, monkeypatch):
+    class ScheduledAction(ActionView):
+        args = {"n": fields.Int(required=True)}
+
+        def post(self, args):
+            return args["n"]
+
+    thing.add_view(ScheduledAction, "/scheduled", endpoint="scheduled")
+
+    from_dict = Schema.from_dict
+    built = []
+    monkeypatch.setattr(
+        Schema, "from_dict", lambda *a, **kw: built.append(1) or from_dict(*a, **kw)
+    )
+    schedule = thing.schedule("scheduled", {"n": 1}, period=0.01, count=3)
+    deadline = time.monotonic() + 2
+    while schedule.runs < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    thing.scheduler.stop()
+    assert schedule.runs == 3
+    # Arguments are loaded with the view's schema, rather than one per tick
+    assert built == []
+
+
+def test_pipeline_steps_concurrency_limited(thing, thing_client):
+    release = threading.Event()
+
+    class ExclusiveAction(ActionView):
+        max_concurrent = 1
+        on_busy = "reject"
+        wait_for = 0
+
+        def post(self):
+            release.wait(5)
+            return "done"
+
+    thing.add_view(ExclusiveAction, "/exclusive", endpoint="exclusive")
+
+    with thing_client as c:
+        assert c.post("/exclusive").status_code == 201
+        # Steps are refused like requests while the action is busy
+        task = thing.run_pipeline([{"action": "exclusive"}])
+        task.join()
+        assert task.data["exclusive"]["status"] == "error"
+        assert "already running" in task.data["exclusive"]["error"]
+
+        release.set()
+        current_labthing().actions.join()
+        task = thing.run_pipeline([{"action": "exclusive"}])
+        task.join()
+        assert task.output == {"exclusive": "done"}
+
+
+def test_pipelines(thing, thing_client):
+    class MoveAction(ActionView):
+        args = {"z": fields.Int(required=True)}
+        schema = {"z": fields.Int()}
+
+        def post(self, args):
+            current_labthing()  # Runs in the app context
+            return {"z": args["z"] + 1}
+
+    class CaptureAction(ActionView):
+        args = {"z": fields.Int(required=True), "exposure": fields.Int()}
+
+        def post(self, args):
+            return args["z"] * args["exposure"]
+
+    thing.add_view(MoveAction, "/move", endpoint="move")
+    thing.add_view(CaptureAction, "/capture", endpoint="capture")
+
+    steps = [
+        {"action": "move", "args": {"z": 1}},
+        {"action": "capture", "args": {"exposure": 10}, "inputs": {"z": "move.z"}},
+    ]
+    with thing_client as c:
+        response = c.post("/pipelines", json={"steps": steps})
+        assert response.status_code == 201
+        task = current_labthing().actions.get(response.json["id"])
+        task.join()
+        assert task.output == {"move": {"z": 2}, "capture": 20}
+        assert [t["id"] for t in c.get("/pipelines").json] == [str(task.id)]
+
+        response = c.post("/pipelines", json={"steps": [{"action": "missing"}]})
+        assert response.status_code == 404
+        response = c.post(
+            "/pipelines", json={"steps": [{"action": "move", "after": ["missing"]}]}
+        )
+        assert response.status_code == 400
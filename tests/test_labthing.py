@@ -1,10 +1,15 @@
+import time
+
 import pytest
 
-from labthings import LabThing
+from labthings import LabThing, RetentionPolicy
+from labthings.actions import ResultStore
+from labthings.actions.record import ActionRecord
+from labthings.deque import Deque
 from labthings.extensions import BaseExtension
 from labthings.names import EXTENSION_NAME
 from labthings.representations import LabThingsJSONEncoder
-from labthings.views import View
+from labthings.views import EventView, View
 
 
 def test_init_types():
@@ -13,6 +18,13 @@ def test_init_types():
     assert thing.types == types
 
 
+def test_init_result_store(tmp_path):
+    # An empty store is falsy, but must still be used
+    store = ResultStore(inline_limit=16, directory=str(tmp_path))
+    thing = LabThing(result_store=store)
+    assert thing.actions.results is store
+
+
 def test_init_app(app):
     thing = LabThing()
     thing.init_app(app)
@@ -233,3 +245,65 @@ def test_version(thing):
     thing.version = "x.x.x"
     assert thing.version == "x.x.x"
     assert thing.spec.version == "x.x.x"
+
+
+def test_reap(app, action_view_cls, client):
+    class EventViewClass(EventView):
+        _deque = Deque()
+
+    thing = LabThing(
+        app,
+        action_retention=RetentionPolicy(max_count=1),
+        event_retention=RetentionPolicy(max_count=1),
+        reap_interval=3600,
+    )
+    thing.add_view(action_view_cls, "/action", endpoint="action")
+    thing.add_view(EventViewClass, "/event", endpoint="event")
+    # Retention limits are applied in the background
+    assert thing.reaper._thread.is_alive()
+
+    with client as c:
+        ids = [c.post("/action").json["id"] for _ in range(2)]
+    thing.actions.join()
+    for i in range(3):
+        thing.emit("event", {"i": i})
+
+    thing.reap()
+    assert [str(t.id) for t in thing.actions.tasks()] == ids[1:]
+    assert [str(t.id) for t in action_view_cls._deque] == ids[1:]
+    assert [e["data"] for e in EventViewClass._deque] == [{"i": 2}]
+    thing.reaper.stop()
+
+
+def test_reap_event_view_retention(app):
+    class EventViewClass(EventView):
+        _deque = Deque()
+        retention = RetentionPolicy(max_count=1)
+
+    # No retention limits for the LabThing itself
+    thing = LabThing(app, reap_interval=0.01)
+    assert thing.reaper._thread is None
+    thing.add_view(EventViewClass, "/event", endpoint="event")
+    try:
+        for i in range(3):
+            thing.emit("event", {"i": i})
+        deadline = time.monotonic() + 5
+        while len(EventViewClass._deque) > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [e["data"] for e in EventViewClass._deque] == [{"i": 2}]
+    finally:
+        thing.reaper.stop()
+
+
+def test_compact_actions(app, action_view_cls, client):
+    thing = LabThing(app, compact_actions=True)
+    thing.add_view(action_view_cls, "/action", endpoint="action")
+
+    with client as c:
+        action_id = c.post("/action").json["id"]
+        thing.actions.join()
+        record = thing.actions.get(action_id)
+        assert isinstance(record, ActionRecord)
+        assert list(action_view_cls._deque) == [record]
+        assert c.get("/action").json[0]["output"] == "POST"
+        assert c.get(f"/actions/{action_id}").json["status"] == "completed"
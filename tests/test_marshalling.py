@@ -1,6 +1,13 @@
+import datetime
+
+import pytest
+from marshmallow import post_dump
+from werkzeug.exceptions import BadRequest
+
 from labthings import fields
 from labthings.marshalling import marshalling as ms
-from labthings.schema import Schema
+from labthings.marshalling.compiled import compile_field, compile_schema
+from labthings.schema import FieldSchema, Schema
 
 
 def test_schema_to_converter_schema():
@@ -9,7 +16,7 @@ def test_schema_to_converter_schema():
 
     test_schema = TestSchema()
     converter = ms.schema_to_converter(test_schema)
-    assert converter == test_schema.dump
+    assert converter.schema is test_schema
     assert converter({"foo": 5}) == {"foo": "5"}
 
 
@@ -27,3 +34,160 @@ def test_schema_to_converter_field():
 
 def test_schema_to_converter_none():
     assert ms.schema_to_converter(object()) is None
+
+
+class SparseSchema(Schema):
+    foo = fields.String()
+    bar_baz = fields.Integer(data_key="barBaz")
+    qux = fields.String()
+
+
+def test_sparse_schema(app):
+    schema = SparseSchema()
+    data = {"foo": "a", "bar_baz": 1, "qux": "b"}
+
+    with app.test_request_context("/?fields=foo,barBaz"):
+        restricted = ms.sparse_schema(schema)
+        assert restricted.dump(data) == {"foo": "a", "barBaz": 1}
+        # Restricted schemas are cached
+        assert ms.sparse_schema(schema) is restricted
+
+    with app.test_request_context("/?exclude=qux"):
+        assert ms.sparse_schema(schema).dump(data) == {"foo": "a", "barBaz": 1}
+
+    with app.test_request_context("/"):
+        assert ms.sparse_schema(schema) is schema
+
+
+def test_sparse_schema_unknown_field(app):
+    with app.test_request_context("/?fields=foo,missing"):
+        with pytest.raises(BadRequest):
+            ms.sparse_schema(SparseSchema())
+
+
+def test_marshal_with_fields(app):
+    @ms.marshal_with(SparseSchema(), sparse=True)
+    def func():
+        return {"foo": "a", "bar_baz": 1, "qux": "b"}
+
+    with app.test_request_context("/?fields=qux"):
+        assert func() == {"qux": "b"}
+    assert func() == {"foo": "a", "barBaz": 1, "qux": "b"}
+
+
+def test_marshal_with_fields_off_by_default(app):
+    @ms.marshal_with(SparseSchema())
+    def func():
+        return {"foo": "a", "bar_baz": 1, "qux": "b"}
+
+    # Views may use the fields parameter for something else
+    with app.test_request_context("/?fields=qux"):
+        assert func() == {"foo": "a", "barBaz": 1, "qux": "b"}
+
+
+class Point:
+    def __init__(self, x, y=None):
+        self.x = x
+        self.y = y
+
+
+class PointSchema(Schema):
+    x = fields.Float()
+    y = fields.Float(allow_none=True)
+
+
+class Measurement(Schema):
+    name = fields.String()
+    count = fields.Integer(data_key="n")
+    count_text = fields.Integer(attribute="total", as_string=True)
+    ratio = fields.Float()
+    ok = fields.Boolean()
+    taken = fields.DateTime()
+    taken_iso = fields.DateTime(attribute="finished", format="%Y/%m/%d")
+    blob = fields.Bytes()
+    raw = fields.Raw()
+    tags = fields.List(fields.String())
+    origin = fields.Nested(PointSchema)
+    points = fields.Nested(PointSchema, many=True)
+    grid = fields.List(fields.List(fields.Integer()))
+    extra = fields.Dict()
+    defaulted = fields.String(dump_default="default")
+    computed = fields.Method("compute")
+
+    def compute(self, obj):
+        return len(obj["tags"])
+
+
+MEASUREMENTS = [
+    {
+        "name": b"camera",
+        "count": "3",
+        "total": 4.0,
+        "ratio": 1,
+        "ok": "yes",
+        "taken": datetime.datetime(2020, 1, 2, 3, 4, 5),
+        "finished": datetime.datetime(2020, 1, 3),
+        "blob": b"\x00\x01",
+        "raw": {"a": [1]},
+        "tags": ["a", 2],
+        "origin": Point(1, 2),
+        "points": [Point(1), {"x": 2, "y": 3}],
+        "grid": [[1, "2"], []],
+        "extra": {"k": "v"},
+    },
+    {"name": None, "count": None, "tags": [], "origin": None, "points": None},
+]
+
+
+@pytest.mark.parametrize(
+    "schema",
+    [Measurement(), Measurement(many=True), Measurement(only=("name", "origin"))],
+)
+def test_compile_schema_matches_dump(schema):
+    dump = compile_schema(schema)
+    if schema.many:
+        assert dump(MEASUREMENTS) == schema.dump(MEASUREMENTS)
+    else:
+        for measurement in MEASUREMENTS:
+            assert dump(measurement) == schema.dump(measurement)
+        assert dump(MEASUREMENTS, many=True) == schema.dump(MEASUREMENTS, many=True)
+    assert compile_schema(schema) is dump
+
+
+def test_compile_schema_falls_back():
+    class Hooked(Schema):
+        value = fields.Integer()
+
+        @post_dump
+        def double(self, data, **_):
+            data["value"] *= 2
+            return data
+
+    hooked = Hooked()
+    assert compile_schema(hooked)({"value": 2}) == {"value": 4}
+
+    class Recursive(Schema):
+        name = fields.String()
+        child = fields.Nested(lambda: Recursive(), allow_none=True)
+
+    tree = {"name": 1, "child": {"name": 2, "child": None}}
+    assert compile_schema(Recursive())(tree) == Recursive().dump(tree)
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        (fields.Integer(), "5"),
+        (fields.Float(), 2),
+        (fields.String(), 5),
+        (fields.Boolean(), "false"),
+        (fields.DateTime(), datetime.datetime(2020, 1, 2)),
+        (fields.List(fields.Float()), [1, "2.5"]),
+        (fields.Nested(PointSchema), Point(3, 4)),
+        (fields.Bytes(), b"abc"),
+        (fields.Dict(), {"a": 1}),
+        (fields.Integer(), None),
+    ],
+)
+def test_compile_field_matches_dump(field, value):
+    assert compile_field(field)(value) == FieldSchema(field).dump(value)
@@ -1,5 +1,7 @@
+import json
+
 from labthings import fields, views
-from labthings.marshalling.args import use_args, use_body
+from labthings.marshalling.args import request_json, use_args, use_body
 from labthings.schema import Schema
 
 
@@ -95,3 +97,40 @@ def test_use_args_schema(app, client):
     with client:
         res = client.post("/", json={"foo": "bar"}, content_type="application/json")
         assert res.json == {"foo": "bar"}
+
+
+def test_use_args_decodes_body_once(app, client, monkeypatch):
+    class Index(views.MethodView):
+        @use_args({"foo": fields.String(required=True)})
+        def post(self, args):
+            assert request_json() == {"foo": "bar"}
+            return args
+
+    app.add_url_rule("/", view_func=Index.as_view("index"))
+
+    decoded = []
+    loads = json.loads
+
+    def counting_loads(s, *args, **kwargs):
+        decoded.append(s)
+        return loads(s, *args, **kwargs)
+
+    with client:
+        monkeypatch.setattr(json, "loads", counting_loads)
+        res = client.post("/", data='{"foo": "bar"}', content_type="application/json")
+        monkeypatch.undo()
+        assert res.json == {"foo": "bar"}
+    assert [loads(s) for s in decoded] == [{"foo": "bar"}]
+
+
+def test_use_args_invalid_json(app, client):
+    class Index(views.MethodView):
+        @use_args({"foo": fields.String(required=True)})
+        def post(self, args):
+            return args
+
+    app.add_url_rule("/", view_func=Index.as_view("index"))
+
+    with client:
+        res = client.post("/", data="{not json", content_type="application/json")
+        assert res.status_code == 400
@@ -0,0 +1,59 @@
+import datetime
+import threading
+
+from labthings.retention import Reaper, RetentionPolicy
+
+NOW = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+
+def entries(*ages_and_sizes):
+    return [
+        (i, NOW - datetime.timedelta(seconds=age), size)
+        for i, (age, size) in enumerate(ages_and_sizes)
+    ]
+
+
+def test_policy_unlimited():
+    policy = RetentionPolicy()
+    assert policy.select(entries((100, 10), (50, 10)), now=NOW) == []
+
+
+def test_policy_max_count():
+    policy = RetentionPolicy(max_count=2)
+    assert policy.select(entries((3, 0), (2, 0), (1, 0), (0, 0)), now=NOW) == [0, 1]
+
+
+def test_policy_max_age():
+    policy = RetentionPolicy(max_age=60)
+    assert policy.select(entries((120, 0), (30, 0)), now=NOW) == [0]
+    # Entries without a timestamp aren't aged
+    assert policy.select([("a", None, 0)], now=NOW) == []
+
+
+def test_policy_max_bytes():
+    policy = RetentionPolicy(max_bytes=100)
+    assert policy.select(entries((3, 60), (2, 30), (1, 50)), now=NOW) == [0]
+
+
+def test_reaper_runs_functions():
+    called = threading.Event()
+    reaper = Reaper(interval=0.01)
+    reaper.add(called.set)
+    reaper.start()
+    try:
+        assert called.wait(1)
+    finally:
+        reaper.stop(timeout=1)
+
+
+def test_reaper_holds_methods_weakly():
+    class Target:
+        def reap(self):
+            pass
+
+    target = Target()
+    reaper = Reaper()
+    reaper.add(target.reap)
+    assert reaper.run_once()
+    del target
+    assert not reaper.run_once()
@@ -66,6 +66,22 @@ def test_build_action_schema_typeerror():
         action_schema = schema.build_action_schema(input_schema, output_schema)
 
 
+def test_action_schema_for():
+    class Action:
+        schema = fields.Integer()
+        args = {"n": fields.Integer()}
+
+    action_schema = schema.action_schema_for(Action)
+    assert isinstance(action_schema, schema.ActionSchema)
+    assert "output" in action_schema.fields and "input" in action_schema.fields
+    assert schema.action_schema_for(Action) is action_schema
+    assert schema.action_schema_for(Action, many=True).many
+
+    # Replacing the view's schemas builds a new schema
+    Action.schema = fields.String()
+    assert schema.action_schema_for(Action) is not action_schema
+
+
 def test_nest_if_needed():
     nested_schema = schema.nest_if_needed(schema.ActionSchema())
     assert isinstance(nested_schema, fields.Field)
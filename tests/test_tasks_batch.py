@@ -0,0 +1,22 @@
+import pytest
+
+from labthings.actions import cancel_token, current_action
+from labthings.actions.batch import run_batch
+
+
+def test_run_batch_outside_action():
+    def item_func(item):
+        assert not cancel_token().cancelled
+        return item * 2
+
+    assert run_batch(item_func, [1, 2]) == [2, 4]
+
+
+def test_batch_item_outside_action():
+    def item_func(item):
+        with pytest.raises(AttributeError, match="isn't running in an action"):
+            current_action().action
+        return item
+
+    # A failing item would be recorded as None
+    assert run_batch(item_func, [1]) == [1]
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from labthings import actions, fields
+from labthings.actions import Pool
+from labthings.views import ActionView, PropertyView
+
+
+@pytest.fixture
+def loop_pool():
+    loop_pool = Pool()
+    yield loop_pool
+    loop_pool.shutdown()
+
+
+def test_coroutine_action(loop_pool):
+    async def task_func(value):
+        actions.update_action_progress(50)
+        actions.update_action_data({"key": "value"})
+        logging.warning("Coroutine log message")
+        await asyncio.sleep(0)
+        return threading.current_thread(), value
+
+    task_obj = loop_pool.spawn("task_func", task_func, "Return value")
+    assert task_obj.is_coroutine
+    task_obj.join()
+
+    assert task_obj.status == "completed"
+    assert task_obj.output == (loop_pool.event_loop, "Return value")
+    assert task_obj.progress == 50
+    assert task_obj.data == {"key": "value"}
+    assert [r.getMessage() for r in task_obj.log] == ["Coroutine log message"]
+
+
+def test_coroutine_actions_share_loop(loop_pool):
+
+    async def task_func():
+        await asyncio.sleep(0.01)
+        return threading.current_thread()
+
+    task_objs = [loop_pool.spawn("task_func", task_func) for _ in range(50)]
+    for task_obj in task_objs:
+        task_obj.join()
+
+    assert all(task_obj.status == "completed" for task_obj in task_objs)
+    assert {task_obj.output for task_obj in task_objs} == {loop_pool.event_loop}
+
+
+@pytest.mark.filterwarnings("ignore:Exception in thread")
+def test_coroutine_action_exception(loop_pool):
+    async def task_func():
+        raise ValueError("Exception message")
+
+    task_obj = loop_pool.spawn("task_func", task_func)
+    task_obj.join()
+
+    assert task_obj.status == "error"
+    assert task_obj.output == "Exception message"
+
+
+def test_coroutine_action_stop(loop_pool):
+    async def task_func():
+        await asyncio.sleep(60)
+
+    task_obj = loop_pool.spawn("task_func", task_func)
+    task_obj.started.wait()
+    assert task_obj.status == "running"
+
+    assert task_obj.stop(timeout=5)
+    assert task_obj.status == "cancelled"
+    assert task_obj.dead
+
+
+def test_coroutine_action_started_as_thread():
+    async def task_func():
+        return actions.current_action()
+
+    task_obj = actions.ActionThread("task_func", target=task_func)
+    task_obj.start()
+    task_obj.join()
+    assert task_obj.output is task_obj
+
+
+def test_coroutine_action_view(thing, thing_client):
+    class AsyncAction(ActionView):
+        args = {"delay": fields.Float(required=True)}
+        schema = fields.String()
+
+        async def post(self, args):
+            await asyncio.sleep(args["delay"])
+            return "done"
+
+    thing.add_view(AsyncAction, "/AsyncAction")
+
+    with thing_client as c:
+        r = c.post("/AsyncAction", json={"delay": 0})
+        assert r.status_code in [200, 201]
+        assert r.get_json()["status"] == "completed"
+        assert r.get_json()["output"] == "done"
+
+        assert c.post("/AsyncAction", json={}).status_code == 422
+    thing.actions.shutdown()
+
+
+def test_coroutine_property_view(thing, thing_client):
+    state = {"value": 1}
+
+    class AsyncProperty(PropertyView):
+        schema = fields.Integer()
+
+        async def get(self):
+            await asyncio.sleep(0)
+            return state["value"]
+
+        async def put(self, value):
+            await asyncio.sleep(0)
+            state["value"] = value
+            return state["value"]
+
+    thing.add_view(AsyncProperty, "/AsyncProperty")
+
+    with thing_client as c:
+        assert c.get("/AsyncProperty").get_json() == 1
+        assert c.put("/AsyncProperty", json=5).get_json() == 5
+        assert c.get("/AsyncProperty").get_json() == 5
+    thing.actions.shutdown()
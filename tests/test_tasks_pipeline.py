@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from labthings.actions import Pool, current_action
+from labthings.actions.pipeline import PipelineStep, check_pipeline, run_pipeline
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown()
+
+
+def run(steps, executor):
+    check_pipeline(steps)
+    task = Pool().spawn("pipeline", run_pipeline, steps, executor)
+    task.join()
+    return task
+
+
+def test_check_pipeline():
+    steps = [PipelineStep("a", dict), PipelineStep("b", dict)]
+    check_pipeline(steps)
+    # Steps depend on the step before them by default
+    assert steps[1].depends == {"a"}
+
+    with pytest.raises(ValueError):
+        check_pipeline([PipelineStep("a", dict), PipelineStep("a", dict)])
+    with pytest.raises(ValueError):
+        check_pipeline([PipelineStep("a", dict, after=["missing"])])
+    with pytest.raises(ValueError):
+        check_pipeline(
+            [PipelineStep("a", dict, after=["b"]), PipelineStep("b", dict, after=["a"])]
+        )
+
+
+def test_pipeline_passes_outputs(executor):
+    steps = [
+        PipelineStep("move", lambda args: {"z": args["z"] + 1}, args={"z": 1}),
+        PipelineStep("focus", lambda args: args["z"] * 10, inputs={"z": "move.z"}),
+        PipelineStep(
+            "capture",
+            lambda args: [args["focus"], args["n"]],
+            inputs={"focus": "focus"},
+            args={"n": 3},
+        ),
+    ]
+    task = run(steps, executor)
+
+    assert task.status == "completed"
+    assert task.output == {"move": {"z": 2}, "focus": 20, "capture": [20, 3]}
+    assert task.data["capture"]["status"] == "completed"
+    assert task.progress == 100
+
+
+def test_pipeline_parallel_branches(executor):
+    barrier = threading.Barrier(2, timeout=2)
+
+    def branch(args):
+        # Both branches must be running at once to pass the barrier
+        barrier.wait()
+        return args["x"]
+
+    steps = [
+        PipelineStep("start", lambda args: 1),
+        PipelineStep("left", branch, inputs={"x": "start"}),
+        PipelineStep("right", branch, inputs={"x": "start"}, after=["start"]),
+        PipelineStep("join", lambda args: args, after=["left", "right"]),
+    ]
+    task = run(steps, executor)
+
+    assert task.status == "completed"
+    assert task.output["left"] == task.output["right"] == 1
+
+
+def test_pipeline_skips_after_error(executor):
+    def fail(args):
+        raise RuntimeError("Stage stuck")
+
+    steps = [
+        PipelineStep("move", fail),
+        PipelineStep("capture", lambda args: 1),
+        PipelineStep("other", lambda args: 2, after=[]),
+    ]
+    task = run(steps, executor)
+
+    assert task.data["move"]["status"] == "error"
+    assert task.data["move"]["error"] == "Stage stuck"
+    assert task.data["capture"]["status"] == "skipped"
+    assert task.output == {"other": 2}
+
+
+def test_pipeline_steps_start_promptly(executor):
+    steps = [PipelineStep(name, lambda args: 1) for name in "abcdef"]
+    start = time.monotonic()
+    task = run(steps, executor)
+
+    assert task.status == "completed"
+    # Each step starts as soon as the one before it finishes
+    assert time.monotonic() - start < 0.5
+
+
+def test_pipeline_cancel_while_waiting(executor):
+    steps = [PipelineStep("slow", lambda args: current_action().stopping.wait(5))]
+    check_pipeline(steps)
+    task = Pool().spawn("pipeline", run_pipeline, steps, executor)
+    task.started.wait()
+
+    start = time.monotonic()
+    task.stop(timeout=5)
+    assert time.monotonic() - start < 1
+    assert task.status == "cancelled"
+
+
+def test_pipeline_cancel_waits_for_steps(executor):
+    started = threading.Event()
+    running = []
+
+    def stubborn(args):
+        # Ignores cancellation
+        running.append(True)
+        started.set()
+        time.sleep(0.2)
+        running.remove(True)
+
+    steps = [PipelineStep("stubborn", stubborn), PipelineStep("next", dict)]
+    check_pipeline(steps)
+    task = Pool().spawn("pipeline", run_pipeline, steps, executor)
+    started.wait(5)
+
+    task.stop(timeout=5)
+    assert task.status == "cancelled"
+    assert not running
+    assert task.data["next"]["status"] == "cancelled"
+
+
+def test_pipeline_on_pool_workers():
+    pool = Pool(max_workers=1)
+    steps = [
+        PipelineStep(name, lambda args: threading.current_thread().name)
+        for name in "abc"
+    ]
+    check_pipeline(steps)
+    # The pipeline waits in its own thread, so a single worker runs every step
+    task = pool.spawn("pipeline", run_pipeline, steps, pool.step_executor, pooled=False)
+    task.join(5)
+
+    assert task.status == "completed"
+    assert all(name.startswith("ActionWorker") for name in task.output.values())
+    pool.shutdown()
+
+
+def test_pipeline_step_queue_full():
+    pool = Pool(max_workers=1, max_queue=1)
+    release = threading.Event()
+    for _ in range(2):
+        pool.spawn("blocker", release.wait, 5)
+    steps = [PipelineStep("a", lambda args: 1)]
+    check_pipeline(steps)
+    task = pool.spawn("pipeline", run_pipeline, steps, pool.step_executor, pooled=False)
+    task.join(5)
+    release.set()
+
+    assert task.status == "completed"
+    assert task.data["a"]["status"] == "error"
+    assert "queue is full" in task.data["a"]["error"]
+    pool.shutdown()
+
+
+def test_pipeline_captures_step_logs(executor):
+    def step(args):
+        logging.getLogger("pipeline_step").warning("Step %s ran", args["n"])
+        return args["n"]
+
+    steps = [PipelineStep("first", step, args={"n": 1})]
+    steps.append(PipelineStep("second", step, args={"n": 2}))
+    task = run(steps, executor)
+
+    assert task.status == "completed"
+    messages = [record.getMessage() for record in task.log]
+    assert "Step 1 ran" in messages and "Step 2 ran" in messages
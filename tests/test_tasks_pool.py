@@ -1,6 +1,16 @@
+import gc
+import logging
 import threading
+import time
+import weakref
+
+import pytest
 
 from labthings import actions
+from labthings.actions import ActionThread, Pool, executor
+from labthings.actions.record import ActionRecord
+from labthings.retention import RetentionPolicy
+from labthings.schema import ActionSchema
 
 
 def test_spawn_without_context(task_pool):
@@ -74,8 +84,6 @@ def test_discard_id(task_pool):
 
 
 def test_cleanup_task(task_pool):
-    import time
-
     def task_func():
         pass
 
@@ -88,3 +96,464 @@ def test_cleanup_task(task_pool):
     assert len(task_pool.threads) > 0
     task_pool.cleanup()
     assert len(task_pool.threads) == 0
+
+
+def test_executor_bounded_workers():
+    executor_pool = Pool(max_workers=2)
+    release = threading.Event()
+
+    def task_func():
+        release.wait()
+        return threading.current_thread().name
+
+    task_objs = [executor_pool.spawn("task_func", task_func) for _ in range(5)]
+    assert executor_pool.executor.workers <= 2
+    assert any(task_obj.status == "pending" for task_obj in task_objs)
+    assert all(not task_obj.dead for task_obj in task_objs)
+
+    release.set()
+    executor_pool.join()
+    assert all(task_obj.status == "completed" for task_obj in task_objs)
+    assert len({task_obj.output for task_obj in task_objs}) <= 2
+    executor_pool.shutdown()
+
+
+def test_executor_current_action():
+    executor_pool = Pool(max_workers=1)
+
+    def task_func():
+        actions.update_action_progress(100)
+        actions.update_action_data({"key": "value"})
+        return actions.current_action()
+
+    task_obj = executor_pool.spawn("task_func", task_func)
+    task_obj.join()
+    assert task_obj.output is task_obj
+    assert task_obj.progress == 100
+    assert task_obj.data == {"key": "value"}
+    executor_pool.shutdown()
+
+
+def test_call_executor():
+    executor_pool = Pool(max_workers=1)
+    calls = executor.CallExecutor(executor_pool.executor)
+
+    worker = calls.submit(threading.current_thread).result()
+    assert worker.name.startswith("ActionWorker")
+    with pytest.raises(ZeroDivisionError):
+        calls.submit(lambda: 1 / 0).result()
+    executor_pool.shutdown()
+
+
+def test_executor_queue_full():
+    executor_pool = Pool(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    first = executor_pool.spawn("task_func", release.wait)
+    first.started.wait()
+    executor_pool.spawn("task_func", release.wait)
+    with pytest.raises(actions.ActionQueueFull):
+        executor_pool.spawn("task_func", release.wait)
+    assert len(executor_pool.threads) == 2
+
+    release.set()
+    executor_pool.join()
+    executor_pool.shutdown()
+
+
+def test_executor_stop_pending():
+    executor_pool = Pool(max_workers=1)
+    release = threading.Event()
+    ran = []
+
+    first = executor_pool.spawn("task_func", release.wait)
+    first.started.wait()
+    queued = executor_pool.spawn("task_func", lambda: ran.append(True))
+    assert queued.status == "pending"
+
+    assert queued.stop() is True
+    assert queued.status == "cancelled"
+    assert queued.dead
+
+    release.set()
+    executor_pool.join()
+    executor_pool.shutdown()
+    assert not ran
+
+
+def test_get_task(task_pool):
+    task_obj = task_pool.spawn("task_func", lambda: None)
+    assert task_pool.get(str(task_obj.id)) is task_obj
+    assert task_pool.get(task_obj.id) is task_obj
+    assert task_pool.get("missing_id") is None
+
+
+def test_registry_maxlen():
+    small_pool = Pool(maxlen=3)
+    task_objs = [small_pool.spawn("task_func", lambda: None) for _ in range(5)]
+    small_pool.join()
+
+    assert small_pool.tasks() == task_objs[2:]
+    assert small_pool.get(task_objs[0].id) is None
+    assert list(small_pool.to_dict().keys()) == [str(t.id) for t in task_objs[2:]]
+
+
+def test_registry_concurrent_access(task_pool):
+    errors = []
+
+    def spawner():
+        for _ in range(50):
+            task_pool.spawn("task_func", lambda: None)
+
+    def reader():
+        try:
+            for _ in range(200):
+                task_pool.cleanup()
+                for task_obj in task_pool.tasks():
+                    task_pool.get(task_obj.id)
+        except RuntimeError as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=f) for f in (spawner, reader, spawner, reader)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert not errors
+
+
+def test_concurrency_queue(task_pool):
+    policy = actions.ConcurrencyPolicy(1)
+    release = threading.Event()
+
+    first = task_pool.spawn("task_func", release.wait, concurrency=policy)
+    second = task_pool.spawn("task_func", release.wait, concurrency=policy)
+    first.started.wait()
+    assert second.status == "pending"
+    assert not second.dead
+
+    release.set()
+    first.join()
+    second.join()
+    assert second.status == "completed"
+
+
+def test_concurrency_reject(task_pool):
+    policy = actions.ConcurrencyPolicy(1, on_busy="reject", retry_after=5)
+    release = threading.Event()
+
+    first = task_pool.spawn("task_func", release.wait, concurrency=policy)
+    with pytest.raises(actions.ActionBusy) as exc_info:
+        task_pool.spawn("task_func", release.wait, concurrency=policy)
+    assert ("Retry-After", "5") in exc_info.value.get_headers()
+    # Other actions are not limited
+    task_pool.spawn("other_func", lambda: None, concurrency=policy).join()
+    assert len(task_pool.tasks()) == 2
+
+    release.set()
+    first.join()
+    # The slot is free again once the first action finishes
+    task_pool.spawn("task_func", lambda: None, concurrency=policy).join()
+
+
+def test_concurrency_queue_limit(task_pool):
+    policy = actions.ConcurrencyPolicy(1, queue_limit=1)
+    release = threading.Event()
+
+    task_pool.spawn("task_func", release.wait, concurrency=policy)
+    queued = task_pool.spawn("task_func", release.wait, concurrency=policy)
+    with pytest.raises(actions.ActionQueueLimitReached):
+        task_pool.spawn("task_func", release.wait, concurrency=policy)
+
+    # Cancelling a queued invocation frees its place in the queue
+    assert queued.stop() is True
+    assert queued.status == "cancelled"
+    task_pool.spawn("task_func", release.wait, concurrency=policy)
+
+    release.set()
+    task_pool.join()
+
+
+def test_concurrency_limited_inline(task_pool):
+    policy = actions.ConcurrencyPolicy(1, queue_limit=1)
+    release = threading.Event()
+    first = task_pool.spawn("task_func", release.wait, concurrency=policy)
+    first.started.wait()
+
+    ran = threading.Event()
+
+    def run_inline():
+        with task_pool.limited("task_func", policy):
+            ran.set()
+
+    waiter = threading.Thread(target=run_inline)
+    waiter.start()
+    # Waits for the running invocation to finish, taking a place in the queue
+    assert not ran.wait(0.1)
+    with pytest.raises(actions.ActionQueueLimitReached):
+        task_pool.spawn("task_func", release.wait, concurrency=policy)
+
+    release.set()
+    waiter.join(2)
+    assert ran.is_set()
+
+    reject = actions.ConcurrencyPolicy(1, on_busy="reject")
+    with task_pool.limited("task_func", reject):
+        with pytest.raises(actions.ActionBusy):
+            with task_pool.limited("task_func", reject):
+                pass
+    # Slots are released afterwards
+    with task_pool.limited("task_func", reject):
+        pass
+
+
+def test_concurrency_limited_cancel(task_pool):
+    policy = actions.ConcurrencyPolicy(1)
+    release = threading.Event()
+    task_pool.spawn("task_func", release.wait, concurrency=policy).started.wait()
+
+    cancel = actions.CancelToken()
+    errors = []
+
+    def run_inline():
+        try:
+            with task_pool.limited("task_func", policy, cancel=cancel):
+                pass
+        except actions.ActionKilledException as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=run_inline)
+    waiter.start()
+    cancel.set()
+    waiter.join(2)
+    assert not waiter.is_alive()
+    assert len(errors) == 1
+    release.set()
+
+
+def test_concurrency_with_executor():
+    executor_pool = Pool(max_workers=2)
+    policy = actions.ConcurrencyPolicy(1)
+    running = []
+    overlaps = []
+
+    def task_func():
+        running.append(True)
+        overlaps.append(len(running))
+        time.sleep(0.01)
+        running.pop()
+
+    task_objs = [
+        executor_pool.spawn("task_func", task_func, concurrency=policy)
+        for _ in range(4)
+    ]
+    for task_obj in task_objs:
+        task_obj.join()
+    assert all(task_obj.status == "completed" for task_obj in task_objs)
+    assert max(overlaps) == 1
+    executor_pool.shutdown()
+
+
+def test_priority_queue_order():
+    queue = executor.ActionPriorityQueue(aging_rate=0)
+    low = ActionThread("low", priority=0)
+    high = ActionThread("high", priority=10)
+    also_low = ActionThread("also_low", priority=0)
+    for task_obj in (low, high, also_low):
+        queue.put(task_obj)
+    queue.put(None)
+
+    assert [queue.get().action for _ in range(3)] == ["high", "low", "also_low"]
+    assert queue.get() is None
+
+
+def test_priority_queue_aging(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(executor.time, "monotonic", lambda: clock[0])
+
+    queue = executor.ActionPriorityQueue(aging_rate=1.0)
+    queue.put(ActionThread("old_low", priority=0))
+    clock[0] = 20.0
+    queue.put(ActionThread("new_high", priority=10))
+
+    # The low priority action has waited long enough to overtake
+    assert queue.get().action == "old_low"
+
+
+def test_executor_priority():
+    executor_pool = Pool(max_workers=1, aging_rate=0)
+    release = threading.Event()
+    order = []
+
+    blocker = executor_pool.spawn("blocker", release.wait)
+    blocker.started.wait()
+    for name, priority in (("scan", 0), ("stop_stage", 100), ("other_scan", 0)):
+        executor_pool.spawn(name, order.append, name, priority=priority)
+
+    time.sleep(0.05)
+    release.set()
+    executor_pool.join()
+    executor_pool.shutdown()
+    assert order == ["stop_stage", "scan", "other_scan"]
+    assert blocker.queue_wait < 0.05
+    assert all(task_obj.queue_wait >= 0.05 for task_obj in executor_pool.tasks()[1:])
+
+
+def test_kill_parallel_deadline():
+    task_pool = Pool()
+
+    def stubborn_task():
+        while True:
+            time.sleep(0.05)
+
+    threads = [task_pool.spawn("stubborn", stubborn_task) for _ in range(4)]
+    for t in threads:
+        t.started.wait()
+
+    start = time.monotonic()
+    task_pool.kill(timeout=0.5)
+    # Actions share one deadline, rather than waiting 0.5s each
+    assert time.monotonic() - start < 1.5
+    assert all(not t.is_alive() for t in threads)
+    assert all(t.status == "cancelled" for t in threads)
+
+
+def test_shared_cache_expiry_and_size(monkeypatch):
+    task_pool = Pool(max_cached=1)
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    first = task_pool.spawn("task", lambda: 1, share_key="a", cache_ttl=10)
+    first.join()
+    assert task_pool.spawn("task", lambda: 1, share_key="a", cache_ttl=10) is first
+
+    # Caching another result evicts the first
+    second = task_pool.spawn("task", lambda: 2, share_key="b", cache_ttl=10)
+    second.join()
+    assert task_pool.spawn("task", lambda: 1, share_key="a", cache_ttl=10) is not first
+
+    # Results expire after their TTL
+    now[0] = 20.0
+    assert task_pool.spawn("task", lambda: 2, share_key="b", cache_ttl=10) is not second
+
+
+def test_query_indexes():
+    task_pool = Pool(maxlen=4)
+    release = threading.Event()
+    done = [task_pool.spawn("quick", lambda: None) for _ in range(2)]
+    for t in done:
+        t.join()
+    waiting = [task_pool.spawn("slow", release.wait) for _ in range(2)]
+    for t in waiting:
+        t.started.wait()
+
+    assert task_pool.query(status=["running"])[0] == waiting
+    assert task_pool.query(status=["completed"])[0] == done
+    assert task_pool.query(action="slow", status=["completed"])[0] == []
+    assert task_pool.query(action="quick")[0] == done
+
+    # Status changes move actions between indexes
+    version = task_pool.version
+    release.set()
+    for t in waiting:
+        t.join()
+    assert task_pool.version != version
+    assert task_pool.query(status=["completed"])[0] == done + waiting
+
+    # Evicted actions leave the indexes
+    newest = task_pool.spawn("quick", lambda: None)
+    newest.join()
+    assert task_pool.query(action="quick")[0] == done[1:] + [newest]
+
+
+def test_query_pages():
+    task_pool = Pool()
+    task_objs = [task_pool.spawn("task", lambda: None) for _ in range(5)]
+    task_pool.join()
+
+    page, cursor = task_pool.query(limit=2)
+    assert page == task_objs[:2]
+    page, cursor = task_pool.query(limit=2, cursor=cursor)
+    assert page == task_objs[2:4]
+    page, cursor = task_pool.query(limit=2, cursor=cursor)
+    assert page == task_objs[4:]
+    assert cursor is None
+
+
+def test_reap_retention():
+    task_pool = Pool(retention=RetentionPolicy(max_count=2))
+    release = threading.Event()
+    running = task_pool.spawn("slow", release.wait)
+    finished = [task_pool.spawn("quick", lambda: None) for _ in range(3)]
+    for t in finished:
+        t.join()
+
+    assert task_pool.reap() == 1
+    # Running actions are never reaped
+    assert task_pool.tasks() == [running] + finished[1:]
+    assert task_pool.query(action="quick")[0] == finished[1:]
+    release.set()
+    running.join()
+
+
+def test_reap_max_bytes():
+    task_pool = Pool(retention=RetentionPolicy(max_bytes=150))
+    task_objs = [task_pool.spawn("task", lambda: b"x" * 100) for _ in range(2)]
+    task_pool.join()
+
+    assert task_pool.reap() == 1
+    assert task_pool.tasks() == task_objs[1:]
+
+
+def test_reap_without_retention(task_pool):
+    task_pool.spawn("task", lambda: None).join()
+    assert task_pool.reap() == 0
+
+
+def test_compact_finished_actions():
+    task_pool = Pool(compact=True)
+
+    def task_func(n):
+        logging.warning("Step %s of %s", 1, n)
+        actions.update_action_data({"step": 1})
+        return n
+
+    task_obj = task_pool.spawn("task", task_func, 2)
+    task_obj.join()
+
+    record = task_pool.get(task_obj.id)
+    assert isinstance(record, ActionRecord)
+    assert task_pool.tasks() == [record]
+    assert task_pool.query(status=["completed"])[0] == [record]
+    assert record.status == "completed" and record.output == 2
+    assert [entry.getMessage() for entry in record.log] == ["Step 1 of 2"]
+    assert record.data_since(record.data_seq) == {"seq": 1, "updates": []}
+    # Records serialise just like the finished thread
+    schema = ActionSchema(exclude=("href", "links"))
+    assert schema.dump(record) == schema.dump(task_obj)
+    # Nothing keeps the thread alive
+    thread_ref = weakref.ref(task_obj)
+    del task_obj
+    gc.collect()
+    assert thread_ref() is None
+
+
+def test_compact_error_and_stop():
+    task_pool = Pool(compact=True)
+
+    def task_func():
+        raise ValueError("Failed")
+
+    failed = task_pool.spawn("task", task_func)
+    failed.join()
+    record = task_pool.get(failed.id)
+    assert record.status == "error"
+    assert record.exception.__traceback__ is None
+
+    finished = task_pool.spawn("task", lambda: None)
+    finished.join()
+    version = task_pool.version
+    task_pool.get(finished.id).stop()
+    assert task_pool.version != version
+    assert task_pool.query(status=["cancelled"])[0] == [task_pool.get(finished.id)]
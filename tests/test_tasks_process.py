@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+
+import pytest
+
+from labthings import LabThing, actions, fields
+from labthings.actions import Pool, process
+from labthings.views import ActionView
+
+
+def cpu_task(n):
+    actions.update_action_progress(50)
+    actions.update_action_data({"pid": os.getpid()})
+    logging.warning("Summing %s numbers", n)
+    return sum(range(n))
+
+
+def failing_task():
+    raise ValueError("This task is meant to fail")
+
+
+def cancellable_task():
+    while not actions.current_action().stopping.is_set():
+        time.sleep(0.01)
+    return "stopped"
+
+
+class SumAction(ActionView):
+    executor = "process"
+    args = {"n": fields.Integer(required=True)}
+    schema = fields.Integer()
+
+    def post(self, args):
+        return cpu_task(args["n"])
+
+
+@pytest.fixture
+def process_pool():
+    process_pool = Pool(process_workers=1)
+    yield process_pool
+    process_pool.shutdown()
+
+
+def test_run_in_process(process_pool):
+    task_obj = process_pool.spawn("cpu_task", process_pool.run_in_process, cpu_task, 10)
+    task_obj.join()
+
+    assert task_obj.status == "completed"
+    assert task_obj.output == 45
+    assert task_obj.progress == 50
+    assert task_obj.data["pid"] != os.getpid()
+    assert any(r.getMessage() == "Summing 10 numbers" for r in task_obj.log)
+    # The callback passing cancellation on to the worker is removed
+    assert task_obj.stopping._callbacks == []
+
+
+@pytest.mark.filterwarnings("ignore:Exception in thread")
+def test_run_in_process_exception(process_pool):
+    task_obj = process_pool.spawn(
+        "failing_task", process_pool.run_in_process, failing_task
+    )
+    task_obj.join()
+
+    assert task_obj.status == "error"
+    assert isinstance(task_obj.exception, ValueError)
+
+
+def test_run_in_process_stop(process_pool):
+    task_obj = process_pool.spawn(
+        "cancellable_task", process_pool.run_in_process, cancellable_task
+    )
+    task_obj.started.wait()
+    task_obj.stop(timeout=5)
+
+    assert task_obj.status == "cancelled"
+
+
+def test_process_executor_py36(monkeypatch):
+    calls = []
+    monkeypatch.setattr(process.sys, "version_info", (3, 6, 15))
+    monkeypatch.setattr(
+        process, "ProcessPoolExecutor", lambda **kwargs: calls.append(kwargs)
+    )
+
+    executor = process.ProcessExecutor(max_workers=1)
+    monkeypatch.setattr(executor.mp_context, "Manager", lambda: None)
+    executor._start()
+
+    # ProcessPoolExecutor only takes mp_context from Python 3.7
+    assert calls == [{"max_workers": 1}]
+
+
+def test_process_action_view(app, client):
+    thing = LabThing(app)
+    thing.add_view(SumAction, "/SumAction")
+
+    try:
+        r = client.post("/SumAction", json={"n": 100})
+        assert r.status_code in [200, 201]
+        assert r.get_json()["status"] == "completed"
+        assert r.get_json()["output"] == 4950
+
+        # Arguments are validated before reaching the worker process
+        assert client.post("/SumAction", json={}).status_code == 422
+    finally:
+        thing.actions.shutdown()
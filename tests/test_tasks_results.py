@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from labthings.actions import Pool, ResultStore
+
+
+def test_small_result_inline(tmp_path):
+    store = ResultStore(inline_limit=10, directory=str(tmp_path))
+    result = store.put("a", b"12345")
+    assert not result.spilled
+    assert result.load() == b"12345"
+    assert store.memory_used == 5
+
+
+def test_large_result_spilled(tmp_path):
+    store = ResultStore(inline_limit=10, directory=str(tmp_path))
+    result = store.put("a", "x" * 100)
+    assert result.spilled
+    assert os.path.exists(result.path)
+    assert result.load() == "x" * 100
+    assert store.memory_used == 0
+    assert store.disk_used == 100
+
+    store.discard("a")
+    assert not os.path.exists(result.path)
+    assert result.load() is None
+
+
+def test_large_array_spilled_raw(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    store = ResultStore(inline_limit=10, directory=str(tmp_path))
+    array = numpy.arange(20, dtype="float64").reshape(4, 5)[:, ::2]
+    result = store.put("a", array)
+    assert result.spilled
+    # The file holds just the C-ordered data, so it can be served as it is
+    with open(result.path, "rb") as f:
+        assert f.read() == numpy.ascontiguousarray(array).tobytes()
+    loaded = result.load()
+    assert isinstance(loaded, numpy.memmap)
+    assert numpy.array_equal(loaded, array)
+
+
+def test_unmeasured_result_not_stored(tmp_path):
+    store = ResultStore(directory=str(tmp_path))
+    assert store.put("a", {"key": "value"}) is None
+    assert "a" not in store
+
+
+def test_memory_budget_spills_least_recently_used(tmp_path):
+    store = ResultStore(inline_limit=10, memory_budget=20, directory=str(tmp_path))
+    first = store.put("a", b"a" * 10)
+    second = store.put("b", b"b" * 10)
+    # Using the first result makes the second the least recently used
+    first.load()
+    third = store.put("c", b"c" * 10)
+    assert second.spilled
+    assert not first.spilled and not third.spilled
+    assert store.memory_used == 20
+    assert second.load() == b"b" * 10
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    store = ResultStore(inline_limit=0, disk_budget=15, directory=str(tmp_path))
+    first = store.put("a", b"a" * 10)
+    second = store.put("b", b"b" * 10)
+    assert first.expired
+    assert first.load() is None
+    assert second.load() == b"b" * 10
+    assert store.disk_used == 10
+
+
+def test_pool_stores_output(tmp_path):
+    store = ResultStore(inline_limit=10, directory=str(tmp_path))
+    task_pool = Pool(result_store=store)
+
+    task = task_pool.spawn("task", lambda: b"x" * 100)
+    task.join()
+    assert task.stored_output.spilled
+    assert task._return_value is None
+    assert task.output == b"x" * 100
+    assert task.get() == b"x" * 100
+
+    task_pool.cleanup()
+    assert str(task.id) not in store
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from labthings.actions import Pool, Scheduler
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_periodic_schedule(scheduler):
+    task_pool = Pool()
+    times = []
+
+    def start():
+        times.append(time.monotonic())
+        return task_pool.spawn("tick", lambda: None)
+
+    schedule = scheduler.add(start, period=0.05, count=4)
+
+    assert wait_until(lambda: schedule.runs == 4)
+    # Ticks are timed from the first tick, so errors don't accumulate
+    assert times[-1] - times[0] == pytest.approx(0.15, abs=0.04)
+    assert scheduler.get(schedule.id) is schedule
+
+
+def test_delayed_schedule(scheduler):
+    task_pool = Pool()
+    started = threading.Event()
+
+    def start():
+        started.set()
+        return task_pool.spawn("once", lambda: None)
+
+    begin = time.monotonic()
+    schedule = scheduler.add(start, delay=0.1)
+    assert started.wait(1)
+    assert time.monotonic() - begin >= 0.09
+    assert wait_until(lambda: schedule.runs == 1)
+    assert schedule.next_due is None
+
+
+def test_invalid_schedule(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.add(lambda: None, period=0)
+    with pytest.raises(ValueError):
+        scheduler.add(lambda: None, period=1, overrun="nonsense")
+
+
+@pytest.mark.parametrize(
+    "overrun,runs,skipped", [("skip", 1, 3), ("queue", 4, 0), ("coalesce", 2, 0)]
+)
+def test_overrun(scheduler, overrun, runs, skipped):
+    task_pool = Pool()
+    release = threading.Event()
+    schedule_ticks = []
+
+    def start():
+        schedule_ticks.append(None)
+        return task_pool.spawn("slow", release.wait)
+
+    schedule = scheduler.add(start, delay=10, period=1, count=4, overrun=overrun)
+    # Simulate the scheduler waking up for every tick while the first run is going
+    for _ in range(4):
+        schedule._fire(schedule.next_due)
+    release.set()
+    assert wait_until(lambda: schedule.runs == runs and not schedule.busy)
+
+    assert schedule.runs == runs
+    assert schedule.skipped == skipped
+
+
+def test_cancel(scheduler):
+    schedule = scheduler.add(lambda: None, delay=10, period=1)
+    assert scheduler.cancel(schedule.id) is schedule
+    assert not schedule.active
+    assert schedule.next_due is None
+    assert scheduler.get(schedule.id) is None
+    assert scheduler.cancel(schedule.id) is None
+
+
+def test_finished_schedules_pruned():
+    task_pool = Pool()
+    scheduler = Scheduler(max_finished=2)
+    start = lambda: task_pool.spawn("once", lambda: None)
+    schedules = [scheduler.add(start) for _ in range(4)]
+    assert wait_until(lambda: all(s.next_due is None for s in schedules))
+    assert wait_until(lambda: len(scheduler.schedules()) == 2)
+    # Only the most recently finished are kept
+    assert set(scheduler.schedules()) < set(schedules)
+    scheduler.stop()
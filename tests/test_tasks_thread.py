@@ -1,3 +1,4 @@
+import logging
 import threading
 import time
 
@@ -68,6 +69,33 @@ def test_task_update_data():
     assert task_obj.data == {"key": "value"}
 
 
+def test_task_data_since():
+    task_obj = thread.ActionThread("task_func", data_log_len=2)
+    assert task_obj.data_since() == {"seq": 0, "data": {}}
+
+    old_data = task_obj.data
+    task_obj.update_data({"a": 1})
+    task_obj.update_data({"b": 2})
+    # Updates replace the dictionary, rather than mutating it
+    assert old_data == {}
+    assert task_obj.data == {"a": 1, "b": 2}
+    assert task_obj.data_seq == 2
+
+    assert task_obj.data_since(1) == {
+        "seq": 2,
+        "updates": [{"seq": 2, "data": {"b": 2}}],
+    }
+    assert task_obj.data_since(2) == {"seq": 2, "updates": []}
+
+    # The first update has been dropped, so return the complete data
+    task_obj.update_data({"a": 3})
+    assert task_obj.data_since(0) == {"seq": 3, "data": {"a": 3, "b": 2}}
+    assert task_obj.data_since(1)["updates"] == [
+        {"seq": 2, "data": {"b": 2}},
+        {"seq": 3, "data": {"a": 3}},
+    ]
+
+
 def test_task_start():
     def task_func():
         return "Return value"
@@ -160,6 +188,81 @@ def test_task_stop_timeout():
     assert task_obj._return_value is None
 
 
+def test_task_stop_cancel_token():
+    def task_func():
+        # Blocks until cancelled, rather than polling
+        pool.cancel_token().wait()
+
+    task_obj = thread.ActionThread("task_func", target=task_func)
+    task_obj.start()
+    task_obj.started.wait()
+    start = time.monotonic()
+    assert task_obj.stop(timeout=5) is True
+    assert time.monotonic() - start < 1
+    assert task_obj._status == "cancelled"
+
+
+def test_cancel_token_callbacks():
+    token = thread.CancelToken()
+    called = []
+    token.add_callback(lambda: called.append(1))
+    assert not token.cancelled
+    token.raise_if_cancelled()
+
+    token.set()
+    assert token.cancelled
+    assert called == [1]
+    with pytest.raises(thread.ActionKilledException):
+        token.raise_if_cancelled()
+
+    # Callbacks added after cancellation run immediately
+    token.add_callback(lambda: called.append(2))
+    assert called == [1, 2]
+
+
+def test_cancel_token_remove_callback():
+    token = thread.CancelToken()
+    called = []
+
+    def callback():
+        called.append(1)
+
+    token.add_callback(callback)
+    token.remove_callback(callback)
+    # Removing a callback that isn't registered does nothing
+    token.remove_callback(callback)
+
+    token.set()
+    assert called == []
+
+
+def test_cancel_token_outside_action():
+    assert pool.cancel_token().cancelled is False
+
+
+def test_task_wait_for_change():
+    def task_func():
+        pool.cancel_token().wait()
+
+    task_obj = thread.ActionThread("task_func", target=task_func)
+    version = task_obj.version
+    task_obj.start()
+    task_obj.started.wait()
+    # Starting the task changed its status
+    assert task_obj.wait_for_change(since=version, timeout=1) > version
+
+    # Nothing changes while the task waits, so this times out
+    version = task_obj.version
+    assert task_obj.wait_for_change(timeout=0.05) == version
+
+    threading.Timer(0.05, task_obj.update_progress, args=(50,)).start()
+    start = time.monotonic()
+    assert task_obj.wait_for_change(since=version, timeout=5) > version
+    assert time.monotonic() - start < 1
+    assert task_obj.progress == 50
+    task_obj.stop()
+
+
 def test_task_terminate():
     def task_func():
         while True:
@@ -193,3 +296,30 @@ def test_task_log_with_incorrect_thread():
     # Should always return False if called from outside the log handlers thread
     assert task_log_handler.thread == task_obj
     assert not task_log_handler.check_thread()
+
+
+def test_task_log_dispatcher_routes_records(caplog):
+    caplog.set_level(logging.INFO)
+    barrier = threading.Barrier(10)
+
+    def task_func(n):
+        barrier.wait()
+        logging.info("message %s", n)
+
+    tasks = [
+        thread.ActionThread("task_func", target=task_func, args=(n,)) for n in range(10)
+    ]
+    for task_obj in tasks:
+        task_obj.start()
+    for task_obj in tasks:
+        task_obj.join()
+
+    for n, task_obj in enumerate(tasks):
+        assert [record.getMessage() for record in task_obj.log] == [f"message {n}"]
+    # One handler captures logs for every action
+    dispatchers = [
+        handler
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, thread.ActionLogDispatcher)
+    ]
+    assert dispatchers == [thread.action_log_dispatcher()]
@@ -6,7 +6,8 @@ from flask import make_response
 from werkzeug.http import parse_set_header
 from werkzeug.wrappers import Response as ResponseBase
 
-from labthings import views
+from labthings import fields, views
+from labthings.schema import Schema
 
 
 def common_test(app):
@@ -178,3 +179,71 @@ def test_action_view_stop(app):
     assert action_thread.default_stop_timeout == 0
     action_thread.stop()
     assert action_thread.status == "cancelled"
+
+
+def test_property_view_dispatch_chain(app, monkeypatch):
+    class Index(views.PropertyView):
+        schema = {"value": fields.Integer()}
+
+        def get(self):
+            return {"value": 1, "other": 2}
+
+        def put(self, args):
+            return args
+
+    class Other(Index):
+        pass
+
+    Index.build_dispatch_chains()
+    chain = Index.dispatch_chain("PUT")
+    assert chain.parser is not None and chain.marshaller is not None
+    assert Index.dispatch_chain("GET").parser is None
+    assert Index.dispatch_chain("PUT") is chain
+    assert Other.dispatch_chain("PUT") is not chain
+
+    # Requests reuse the chain, rather than building schemas again
+    from_dict = Schema.from_dict
+    built = []
+    monkeypatch.setattr(
+        Schema, "from_dict", lambda *a, **kw: built.append(1) or from_dict(*a, **kw)
+    )
+    app.add_url_rule("/", view_func=Index.as_view("index"))
+    c = app.test_client()
+    assert c.get("/").json == {"value": 1}
+    assert c.put("/", json={"value": 3}).json == {"value": 3}
+    assert c.put("/", json={"value": "x"}).status_code == 422
+    assert built == []
+
+
+def test_property_view_sparse_fields(app):
+    class Index(views.PropertyView):
+        schema = {"value": fields.Integer(), "other": fields.Integer()}
+
+        def get(self):
+            return {"value": 1, "other": 2}
+
+    app.add_url_rule("/", view_func=Index.as_view("index"))
+    c = app.test_client()
+    assert c.get("/?fields=other").json == {"other": 2}
+    assert c.get("/?exclude=other").json == {"value": 1}
+    # Plain views don't select fields unless they ask to
+    assert views.DispatchChain(schema=Index.schema).marshaller.sparse is False
+
+
+def test_dispatch_chain_rebuilt_when_schema_replaced(app):
+    class Index(views.PropertyView):
+        schema = {"value": fields.Integer()}
+
+        def get(self):
+            return {"value": 1, "other": 2}
+
+    app.add_url_rule("/", view_func=Index.as_view("index"))
+    Index.build_dispatch_chains()
+    chain = Index.dispatch_chain("GET")
+    c = app.test_client()
+    assert c.get("/").json == {"value": 1}
+
+    # Replacing the schema after registration takes effect
+    Index.schema = {"other": fields.Integer()}
+    assert c.get("/").json == {"other": 2}
+    assert Index.dispatch_chain("GET") is not chain